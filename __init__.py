@@ -30,6 +30,7 @@ from bpy_extras.io_utils import ImportHelper, ExportHelper, axis_conversion
 from bpy.props import (StringProperty, IntProperty, BoolProperty, EnumProperty,
                        FloatProperty)
 from bpy.types import Operator
+from math import radians
 
 bl_info = {
     "name": "WCP/SO Mesh File",
@@ -156,6 +157,13 @@ class ExportIFF(Operator, ExportHelper):
         options={"HIDDEN"}
     )
 
+    generate_lods = BoolProperty(
+        name="Generate LODs",
+        description="Generate the missing LODs of each model by simplifying "
+        "LOD 0",
+        default=False
+    )
+
     axis_forward = EnumProperty(
         name="Forward Axis",
         items=(('X', "X Forward", ""),
@@ -204,6 +212,99 @@ class ExportIFF(Operator, ExportHelper):
         default=500.0
     )
 
+    compute_dranges = BoolProperty(
+        name="Compute LOD ranges",
+        description="Compute the LOD ranges the user did not supply from "
+        "how far each LOD is from LOD 0, instead of using the LOD range "
+        "increment",
+        default=False
+    )
+
+    drang_pixel_error = FloatProperty(
+        name="Max. pixel error",
+        description="How many pixels the surface of a LOD can be away from "
+        "LOD 0 on screen when the LOD is used",
+        min=0.01,
+        max=100.0,
+        default=1.0
+    )
+
+    drang_fov = FloatProperty(
+        name="Field of view",
+        description="Vertical field of view of the camera in-game",
+        subtype="ANGLE",
+        min=radians(1.0),
+        max=radians(179.0),
+        default=radians(60.0)
+    )
+
+    drang_resolution = IntProperty(
+        name="Screen height",
+        description="Vertical screen resolution in-game, in pixels",
+        min=1,
+        max=10000,
+        default=480
+    )
+
+    optimize_lods = BoolProperty(
+        name="Optimize LODs",
+        description="Reorder the faces and vertices of each LOD so that it "
+        "is faster to draw",
+        default=False
+    )
+
+    weld_lods = BoolProperty(
+        name="Weld vertices",
+        description="Merge vertices of each LOD which are very close to each "
+        "other, and let faces share their face vertices",
+        default=False
+    )
+
+    weld_distance = FloatProperty(
+        name="Weld distance",
+        description="Vertices which are at most this far apart are merged",
+        subtype="UNSIGNED",
+        unit="LENGTH",
+        min=0.0,
+        max=1.0,
+        precision=5,
+        default=0.0001
+    )
+
+    normal_tolerance = FloatProperty(
+        name="Normal tolerance",
+        description="Normals which point in directions this close to each "
+        "other are merged",
+        subtype="ANGLE",
+        min=0.0,
+        max=radians(10.0),
+        default=0.0
+    )
+
+    parallel_export = BoolProperty(
+        name="Export in parallel",
+        description="Convert and write the models of a hierarchy in "
+        "several processes at once",
+        default=False
+    )
+
+    skip_unchanged = BoolProperty(
+        name="Skip unchanged models",
+        description="Don't write models which have not changed since they "
+        "were last exported to the same folder",
+        default=False
+    )
+
+    texnum_registry = StringProperty(
+        name="Texture number registry",
+        description="File which keeps the texture numbers of images across "
+        "exports. Every export which uses the same file gives each image "
+        "the same texture number. Leave blank to number the images for each "
+        "export separately",
+        subtype="FILE_PATH",
+        default=""
+    )
+
     test_run = BoolProperty(
         name="Test run",
         description="Do a test run; don't actually export anything. "
@@ -243,11 +344,26 @@ class ExportIFF(Operator, ExportHelper):
 
         # self.output_version = "12"
 
+        weld_distance = self.weld_distance if self.weld_lods else None
+        # A path relative to an unsaved blend file can't be resolved.
+        texnum_registry = self.texnum_registry or None
+        if texnum_registry is not None:
+            if bpy.data.filepath or not texnum_registry.startswith("//"):
+                texnum_registry = bpy.path.abspath(texnum_registry)
+            else:
+                texnum_registry = None
+        drang_sse = None
+        if self.compute_dranges:
+            drang_sse = (self.drang_pixel_error, self.drang_fov,
+                         self.drang_resolution)
+
         exporter = getattr(export_iff, self.backend_class_name)(
             self.filepath, self.texnum, self.apply_modifiers,
             self.active_as_lod0, self.use_facetex, wc_orientation_matrix,
             self.include_far_chunk, self.drang_increment, self.generate_bsp,
-            self.test_run
+            self.generate_lods, drang_sse, self.optimize_lods, weld_distance,
+            self.normal_tolerance, self.parallel_export, self.skip_unchanged,
+            texnum_registry, self.test_run
         )
 
         exporter.export()
@@ -0,0 +1,541 @@
+# -*- coding: utf8 -*-
+# Blender WCP IFF mesh import/export script by Kevin Caccamo
+# Copyright © 2013-2016 Kevin Caccamo
+# E-mail: kevin@ciinet.org
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# <pep8-80 compliant>
+
+# BSP trees for collision meshes
+# NOTE: The layouts of the BSP and REGN forms have not been checked against
+# the game's own files yet, so the exporter does not use this module.
+from . import iff
+from . import mesh_opt
+from math import sqrt
+
+
+class BSPTree:
+    """A BSP tree for the collision mesh of a model.
+
+    Each node of the tree has a splitting plane, the polygons which lie on
+    that plane, and the nodes in front of, and behind that plane. Polygons
+    which cross a splitting plane are split in two."""
+
+    # Node record: Plane normal X, Y, Z, D-Plane, front node index, back node
+    # index, first polygon index, number of polygons. A child node index of
+    # -1 means there is no node on that side of the plane.
+    NODE_FMT = "ffffiiii"
+    # Polygon record: First vertex index (in PIDX), number of vertices, index
+    # of the polygon in the source mesh.
+    POLY_FMT = "iii"
+
+    # Cost heuristic for choosing a splitting plane. Each polygon which is
+    # split by a plane costs SPLIT_WEIGHT, and each polygon of difference
+    # between the number of polygons in front of and behind the plane costs
+    # BALANCE_WEIGHT.
+    SPLIT_WEIGHT = 4
+    BALANCE_WEIGHT = 1
+    # Number of splitting planes to try for each node, and the maximum number
+    # of polygons to test them against.
+    NUM_CANDIDATES = 8
+    SAMPLE_SIZE = 64
+    # Below this number of polygons, the first polygon plane which splits none
+    # of the others is used as the splitting plane, since estimating the cost
+    # of each plane would take longer than it saves.
+    MIN_SEARCH_FRAGS = 16
+
+    # Vertices closer than this to a plane are considered to be on the plane.
+    PLANE_EPSILON = 1e-4
+
+    # Polygon classifications
+    COPLANAR = 0
+    FRONT = 1
+    BACK = 2
+    SPANNING = 3
+
+    def __init__(self, verts, polys):
+        """Build a BSP tree for a mesh.
+
+        verts is a sequence of (x, y, z) vertex coordinates, and polys is a
+        sequence of polygons, each being a sequence of vertex indices. The
+        polygons must be convex. Degenerate polygons are ignored."""
+        self.verts = [tuple(map(float, vert)) for vert in verts]
+        self.nodes = []  # Node records (see NODE_FMT)
+        self.polys = []  # Polygon records (see POLY_FMT)
+        self.poly_verts = []  # Vertex indices of the polygons
+        self._split_verts = {}  # (node, vertex, vertex) -> split vertex
+
+        frags = []
+        for poly_idx, poly in enumerate(polys):
+            poly = tuple(poly)
+            frag = self._make_frag(poly, poly_idx)
+            if frag is not None:
+                frags.append(frag)
+
+        if len(frags) > 0:
+            self._build(frags)
+
+    def _make_frag(self, poly, poly_idx, plane=None):
+        """Make a polygon fragment, which is used to build the tree.
+
+        A fragment is a tuple of the vertex indices, the polygon index, the
+        plane, the bounding sphere (X, Y, Z, radius), and the vertex
+        coordinates of a polygon (or part of one). If plane is None, it is
+        calculated from the polygon."""
+        if len(poly) < 3:
+            return None
+        if plane is None:
+            plane = mesh_opt.poly_plane(self.verts, poly)
+            if plane is None:
+                return None
+        coords = tuple(map(self.verts.__getitem__, poly))
+        num_verts = len(poly)
+        xs, ys, zs = zip(*coords)
+        cx = sum(xs) / num_verts
+        cy = sum(ys) / num_verts
+        cz = sum(zs) / num_verts
+        radius = sqrt(max(
+            (x - cx) * (x - cx) + (y - cy) * (y - cy) + (z - cz) * (z - cz)
+            for x, y, z in coords))
+        return (poly, poly_idx, plane, cx, cy, cz, radius, coords)
+
+    def _classify(self, plane, frags):
+        """Classify polygon fragments against a plane.
+
+        Returns a list with a classification for each fragment. Most
+        fragments are classified by their bounding spheres, and only the ones
+        whose bounding spheres touch the plane have their vertices tested."""
+        nx, ny, nz, d = plane
+        eps = self.PLANE_EPSILON
+        FRONT, BACK = self.FRONT, self.BACK
+        classes = []
+        for _, _, _, cx, cy, cz, radius, coords in frags:
+            dist = nx * cx + ny * cy + nz * cz + d
+            radius += eps
+            if dist > radius:
+                classes.append(FRONT)
+            elif dist < -radius:
+                classes.append(BACK)
+            else:
+                front = back = False
+                for x, y, z in coords:
+                    dist = nx * x + ny * y + nz * z + d
+                    if dist > eps:
+                        front = True
+                    elif dist < -eps:
+                        back = True
+                if front and back:
+                    classes.append(self.SPANNING)
+                elif front:
+                    classes.append(FRONT)
+                elif back:
+                    classes.append(BACK)
+                else:
+                    classes.append(self.COPLANAR)
+        return classes
+
+    def _splits_any(self, plane, frags):
+        "Check whether plane splits any of the given fragments."
+        nx, ny, nz, d = plane
+        eps = self.PLANE_EPSILON
+        for _, _, _, cx, cy, cz, radius, coords in frags:
+            dist = nx * cx + ny * cy + nz * cz + d
+            if -radius - eps <= dist <= radius + eps:
+                front = back = False
+                for x, y, z in coords:
+                    dist = nx * x + ny * y + nz * z + d
+                    if dist > eps:
+                        front = True
+                    elif dist < -eps:
+                        back = True
+                if front and back:
+                    return True
+        return False
+
+    def _plane_cost(self, plane, sample):
+        """Estimate the cost of splitting a set of fragments with plane.
+
+        sample is a list of (x, y, z, radius, coords) tuples, with the
+        bounding spheres and vertex coordinates of the fragments. This is
+        the same test as _classify, but it only counts the fragments."""
+        nx, ny, nz, d = plane
+        eps = self.PLANE_EPSILON
+        num_front = num_back = num_spanning = 0
+        for cx, cy, cz, radius, coords in sample:
+            dist = nx * cx + ny * cy + nz * cz + d
+            radius += eps
+            if dist > radius:
+                num_front += 1
+            elif dist < -radius:
+                num_back += 1
+            else:
+                front = back = False
+                for x, y, z in coords:
+                    dist = nx * x + ny * y + nz * z + d
+                    if dist > eps:
+                        front = True
+                    elif dist < -eps:
+                        back = True
+                if front and back:
+                    num_spanning += 1
+                elif front:
+                    num_front += 1
+                elif back:
+                    num_back += 1
+        return (self.SPLIT_WEIGHT * num_spanning +
+                self.BALANCE_WEIGHT * abs(num_front - num_back))
+
+    def _splitters(self, frags):
+        """Get the splitting planes to try for frags, cheapest first.
+
+        Each splitting plane is a (cost, plane, fragment) tuple. Most of them
+        are the planes of some of the fragments, but there are also
+        axis-aligned planes through the middle of the fragments, which have
+        no fragment. On convex meshes, those keep the tree from turning into
+        a long list of nodes."""
+        num_frags = len(frags)
+        if num_frags <= self.MIN_SEARCH_FRAGS:
+            # Use the first plane which splits no fragments, if there is one.
+            for frag in frags:
+                if not self._splits_any(frag[2], frags):
+                    return [(0, frag[2], frag)]
+            return [(0, frags[0][2], frags[0])]
+
+        candidates = frags[::max(1, num_frags // self.NUM_CANDIDATES)]
+        sample = [frag[3:] for frag
+                  in frags[::max(1, num_frags // self.SAMPLE_SIZE)]]
+
+        splitters = [(self._plane_cost(frag[2], sample), frag[2], frag)
+                     for frag in candidates[:self.NUM_CANDIDATES]]
+        for axis in range(3):
+            # The plane goes through the vertex of the median fragment which
+            # is closest to its center, since a plane through the vertices of
+            # a mesh splits fewer of its polygons, especially on symmetrical
+            # or grid-like meshes.
+            median = sorted(sample, key=lambda frag: frag[axis])[
+                len(sample) // 2]
+            position = min((coord[axis] for coord in median[4]),
+                           key=lambda pos: abs(pos - median[axis]))
+            normal = [0.0, 0.0, 0.0]
+            normal[axis] = 1.0
+            plane = (normal[0], normal[1], normal[2], -position)
+            splitters.append((self._plane_cost(plane, sample), plane, None))
+        splitters.sort(key=lambda splitter: splitter[0])
+        return splitters
+
+    def _split_vert(self, node_idx, plane, vidx_a, vidx_b):
+        "Get the vertex where the edge from vidx_a to vidx_b crosses plane."
+        vkey = (node_idx, min(vidx_a, vidx_b), max(vidx_a, vidx_b))
+        split_vidx = self._split_verts.get(vkey)
+        if split_vidx is None:
+            nx, ny, nz, d = plane
+            ax, ay, az = self.verts[vkey[1]]
+            bx, by, bz = self.verts[vkey[2]]
+            dist_a = nx * ax + ny * ay + nz * az + d
+            dist_b = nx * bx + ny * by + nz * bz + d
+            t = dist_a / (dist_a - dist_b)
+            split_vidx = len(self.verts)
+            self.verts.append(
+                (ax + (bx - ax) * t, ay + (by - ay) * t, az + (bz - az) * t))
+            self._split_verts[vkey] = split_vidx
+        return split_vidx
+
+    def _split_frag(self, node_idx, plane, frag):
+        "Split a polygon fragment into front and back fragments."
+        nx, ny, nz, d = plane
+        eps = self.PLANE_EPSILON
+        verts = self.verts
+        front_poly = []
+        back_poly = []
+        poly = frag[0]
+
+        prev_vidx = poly[-1]
+        x, y, z = verts[prev_vidx]
+        prev_dist = nx * x + ny * y + nz * z + d
+        for vidx in poly:
+            x, y, z = verts[vidx]
+            dist = nx * x + ny * y + nz * z + d
+            if ((prev_dist > eps and dist < -eps) or
+                    (prev_dist < -eps and dist > eps)):
+                split_vidx = self._split_vert(
+                    node_idx, plane, prev_vidx, vidx)
+                front_poly.append(split_vidx)
+                back_poly.append(split_vidx)
+            if dist > eps:
+                front_poly.append(vidx)
+            elif dist < -eps:
+                back_poly.append(vidx)
+            else:
+                front_poly.append(vidx)
+                back_poly.append(vidx)
+            prev_vidx = vidx
+            prev_dist = dist
+
+        # The pieces of a polygon lie on the same plane as the polygon.
+        return (self._make_frag(tuple(front_poly), frag[1], frag[2]),
+                self._make_frag(tuple(back_poly), frag[1], frag[2]))
+
+    def _build(self, frags):
+        "Build the tree from a list of polygon fragments."
+        # Each work item is a list of fragments, and the index of the node
+        # field where the index of the node for those fragments goes.
+        work = [(frags, None, None)]
+        while len(work) > 0:
+            frags, parent_idx, child_field = work.pop()
+            node_idx = len(self.nodes)
+            if parent_idx is not None:
+                self.nodes[parent_idx][child_field] = node_idx
+
+            # An axis-aligned plane is only used if it has fragments on both
+            # sides, since the tree would never stop growing otherwise.
+            for _, plane, splitter in self._splitters(frags):
+                classes = self._classify(plane, frags)
+                if splitter is not None or (
+                        self.FRONT in classes and self.BACK in classes):
+                    break
+
+            front_frags = []
+            back_frags = []
+            first_poly = len(self.polys)
+
+            for frag, fclass in zip(frags, classes):
+                # A polygon which is not quite flat could be classified as
+                # spanning its own plane.
+                if frag is splitter:
+                    fclass = self.COPLANAR
+                if fclass == self.FRONT:
+                    front_frags.append(frag)
+                elif fclass == self.BACK:
+                    back_frags.append(frag)
+                elif fclass == self.COPLANAR:
+                    self.polys.append(
+                        (len(self.poly_verts), len(frag[0]), frag[1]))
+                    self.poly_verts.extend(frag[0])
+                else:
+                    front_frag, back_frag = self._split_frag(
+                        node_idx, plane, frag)
+                    if front_frag is not None:
+                        front_frags.append(front_frag)
+                    if back_frag is not None:
+                        back_frags.append(back_frag)
+
+            self.nodes.append([
+                plane[0], plane[1], plane[2], plane[3], -1, -1,
+                first_poly, len(self.polys) - first_poly])
+
+            if len(back_frags) > 0:
+                work.append((back_frags, node_idx, 5))
+            if len(front_frags) > 0:
+                work.append((front_frags, node_idx, 4))
+
+        del self._split_verts
+
+    def get_depth(self):
+        "Get the depth of this BSP tree."
+        depth = 0
+        work = [(0, 1)] if len(self.nodes) > 0 else []
+        while len(work) > 0:
+            node_idx, node_depth = work.pop()
+            depth = max(depth, node_depth)
+            for child_idx in self.nodes[node_idx][4:6]:
+                if child_idx >= 0:
+                    work.append((child_idx, node_depth + 1))
+        return depth
+
+    def to_form(self):
+        """Convert this BSP tree to a BSP form.
+
+        The BSP form goes in the EXTN form of a COLL form."""
+        vert_chunk = iff.IffRecordChunk("VERT", "fff", self.verts)
+        pidx_chunk = iff.IffRecordChunk(
+            "PIDX", "i", [(vidx,) for vidx in self.poly_verts])
+        poly_chunk = iff.IffRecordChunk("POLY", self.POLY_FMT, self.polys)
+        node_chunk = iff.IffRecordChunk("NODE", self.NODE_FMT, self.nodes)
+        return iff.IffForm.new_unchecked(
+            "BSP ", [vert_chunk, pidx_chunk, poly_chunk, node_chunk])
+
+    def __str__(self):
+        return "BSP tree ({} nodes, {} polygons, depth {})".format(
+            len(self.nodes), len(self.polys), self.get_depth())
+
+
+class Blockmap:
+    """A grid of cells around the collision mesh of a model.
+
+    Each cell has a list of the BSP tree polygons which touch it, so a
+    collision check only has to test the polygons in the cells it touches.
+    The cells are cubes, and the polygons are tested against them using the
+    separating axis theorem."""
+
+    # Grid record: Origin X, Y, Z, cell size, number of cells on the X, Y,
+    # and Z axes.
+    GRID_FMT = "ffffiii"
+    # Cell record: First polygon index (in CIDX), number of polygons. Cells
+    # are ordered by X, then Y, then Z.
+    CELL_FMT = "ii"
+
+    # Default cell size heuristic. Cells are sized so that the area of the
+    # polygons in each one is about that of POLYS_PER_CELL average polygons,
+    # and there are no more than MAX_CELLS_PER_AXIS cells on the longest axis
+    # of the grid.
+    POLYS_PER_CELL = 8
+    MAX_CELLS_PER_AXIS = 64
+
+    def __init__(self, bsp_tree, cell_size=None):
+        """Build a blockmap for the polygons of a BSP tree.
+
+        If cell_size is None, it is calculated from the size of the mesh and
+        the number of polygons in it."""
+        if not isinstance(bsp_tree, BSPTree):
+            raise TypeError("A blockmap must be built for a BSP tree!")
+
+        self.polys = []  # Vertex coordinates of each polygon
+        for first_vert, num_verts, _ in bsp_tree.polys:
+            self.polys.append(tuple(
+                bsp_tree.verts[vidx] for vidx in
+                bsp_tree.poly_verts[first_vert:first_vert + num_verts]))
+
+        if len(self.polys) > 0:
+            coords = [coord for poly in self.polys for coord in poly]
+            self.origin = tuple(min(axis) for axis in zip(*coords))
+            extents = [max(axis) - origin
+                       for axis, origin in zip(zip(*coords), self.origin)]
+        else:
+            self.origin = (0.0, 0.0, 0.0)
+            extents = [0.0, 0.0, 0.0]
+
+        if cell_size is None:
+            min_size = max(max(extents) / self.MAX_CELLS_PER_AXIS, 1e-3)
+            area = sum(map(mesh_opt.poly_area, self.polys))
+            cell_size = max(min_size, sqrt(
+                area * self.POLYS_PER_CELL / max(len(self.polys), 1)))
+        elif cell_size <= 0:
+            raise ValueError("Cell size must be positive!")
+
+        self.cell_size = float(cell_size)
+        self.dims = tuple(max(1, int(extent // self.cell_size) + 1)
+                          for extent in extents)
+        # Polygon indices for each cell.
+        self.cells = [[] for cell in range(
+            self.dims[0] * self.dims[1] * self.dims[2])]
+
+        for poly_idx, poly in enumerate(self.polys):
+            for cell_idx in self._poly_cells(poly):
+                self.cells[cell_idx].append(poly_idx)
+
+    def _cell_range(self, axis, low, high):
+        "Get the range of cell coordinates from low to high on axis."
+        low = int((low - self.origin[axis]) // self.cell_size)
+        high = int((high - self.origin[axis]) // self.cell_size)
+        return range(max(low, 0), min(high, self.dims[axis] - 1) + 1)
+
+    def _poly_cells(self, poly):
+        """Get the indices of the cells a convex polygon touches.
+
+        The cells which overlap the bounding box of the polygon are tested
+        against the polygon plane, and the cross products of the polygon
+        edges and the cell axes."""
+        xs, ys, zs = zip(*poly)
+        x_range = self._cell_range(0, min(xs), max(xs))
+        y_range = self._cell_range(1, min(ys), max(ys))
+        z_range = self._cell_range(2, min(zs), max(zs))
+        dim_y, dim_z = self.dims[1], self.dims[2]
+        if sorted(map(len, (x_range, y_range, z_range)))[1] == 1:
+            # If the bounding box of the polygon is inside a row of cells,
+            # the polygon touches all of them, since it crosses each
+            # boundary between them. Most polygons are like that.
+            for cx in x_range:
+                for cy in y_range:
+                    for cz in z_range:
+                        yield (cx * dim_y + cy) * dim_z + cz
+            return
+
+        half = self.cell_size / 2
+        # The cells are padded a little, so that rounding errors do not
+        # cause polygons on the boundary of a cell to miss it.
+        padded_half = half * (1 + 1e-6)
+        ox, oy, oz = (origin + half for origin in self.origin)
+
+        # Separating axes, with the projections of the polygon on them, and
+        # the projected "radius" of a cell. The polygon normal goes first,
+        # since it is the most likely to separate the polygon from a cell.
+        axes = [None]
+        nx, ny, nz = 0.0, 0.0, 0.0
+        prev_x, prev_y, prev_z = poly[-1]
+        for x, y, z in poly:
+            ex, ey, ez = x - prev_x, y - prev_y, z - prev_z
+            nx += (prev_y - y) * (prev_z + z)
+            ny += (prev_z - z) * (prev_x + x)
+            nz += (prev_x - x) * (prev_y + y)
+            # Cross products of the edge and the X, Y, and Z axes
+            axes.append((0.0, ez, -ey))
+            axes.append((-ez, 0.0, ex))
+            axes.append((ey, -ex, 0.0))
+            prev_x, prev_y, prev_z = x, y, z
+        axes[0] = (nx, ny, nz)
+
+        tests = []
+        for ax, ay, az in axes:
+            if ax == 0.0 and ay == 0.0 and az == 0.0:
+                continue
+            projs = [ax * x + ay * y + az * z for x, y, z in poly]
+            tests.append((ax, ay, az, min(projs), max(projs),
+                          padded_half * (abs(ax) + abs(ay) + abs(az))))
+
+        for cx in x_range:
+            center_x = ox + cx * self.cell_size
+            for cy in y_range:
+                center_y = oy + cy * self.cell_size
+                for cz in z_range:
+                    center_z = oz + cz * self.cell_size
+                    for ax, ay, az, pmin, pmax, radius in tests:
+                        center = ax * center_x + ay * center_y + az * center_z
+                        if pmin > center + radius or pmax < center - radius:
+                            break
+                    else:
+                        yield (cx * dim_y + cy) * dim_z + cz
+
+    def get_cell_polys(self, x, y, z):
+        """Get the indices of the BSP tree polygons in the cell at x, y, z.
+
+        Returns an empty list if x, y, z is outside of the blockmap."""
+        cell_coords = [int((coord - origin) // self.cell_size)
+                       for coord, origin in zip((x, y, z), self.origin)]
+        for coord, dim in zip(cell_coords, self.dims):
+            if coord < 0 or coord >= dim:
+                return []
+        cx, cy, cz = cell_coords
+        return self.cells[(cx * self.dims[1] + cy) * self.dims[2] + cz]
+
+    def to_form(self):
+        """Convert this blockmap to a REGN form.
+
+        The REGN form goes in the EXTN form of a COLL form, after the BSP
+        form."""
+        grid_chunk = iff.IffRecordChunk("GRID", self.GRID_FMT, [
+            self.origin + (self.cell_size,) + self.dims])
+        cell_recs = []
+        cidx_recs = []
+        for cell in self.cells:
+            cell_recs.append((len(cidx_recs), len(cell)))
+            cidx_recs.extend((poly_idx,) for poly_idx in cell)
+        cell_chunk = iff.IffRecordChunk("CELL", self.CELL_FMT, cell_recs)
+        cidx_chunk = iff.IffRecordChunk("CIDX", "i", cidx_recs)
+        return iff.IffForm.new_unchecked(
+            "REGN", [grid_chunk, cell_chunk, cidx_chunk])
+
+    def __str__(self):
+        return "Blockmap ({}x{}x{} cells of size {:.4f})".format(
+            self.dims[0], self.dims[1], self.dims[2], self.cell_size)
@@ -23,7 +23,7 @@ USAGE
 
 if [[ $# -eq 0 ]]; then usage; exit 1; fi
 
-pyfs=({__init__,{import,export}_iff,iff,iff_{mesh,read},mat_read}.py)
+pyfs=({__init__,{import,export}_iff,iff,iff_{mesh,read},mat_read,bsp,decimate,export_mesh,mesh_opt,texnum_registry}.py)
 
 vers=''
 gvers=''
@@ -0,0 +1,567 @@
+# -*- coding: utf8 -*-
+# Blender WCP IFF mesh import/export script by Kevin Caccamo
+# Copyright © 2013-2016 Kevin Caccamo
+# E-mail: kevin@ciinet.org
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# <pep8-80 compliant>
+
+# Mesh decimation and geometric error measurement for LODs
+import heapq
+from . import mesh_opt
+from math import sqrt, floor, tan
+
+
+def point_seg_dist(point, seg_a, seg_b):
+    """Get the distance between a point and the closest point on a line
+    segment from seg_a to seg_b."""
+    px, py, pz = point
+    ax, ay, az = seg_a
+    abx, aby, abz = seg_b[0] - ax, seg_b[1] - ay, seg_b[2] - az
+    seg_len = abx * abx + aby * aby + abz * abz
+    if seg_len == 0.0:
+        t = 0.0
+    else:
+        t = min(max(((px - ax) * abx + (py - ay) * aby + (pz - az) * abz) /
+                    seg_len, 0.0), 1.0)
+    return sqrt((px - ax - abx * t) ** 2 + (py - ay - aby * t) ** 2 +
+                (pz - az - abz * t) ** 2)
+
+
+def point_tri_dist(point, tri):
+    """Get the distance between a point and the closest point on a triangle.
+
+    tri is a sequence of the (x, y, z) coordinates of the corners of the
+    triangle. If the triangle is degenerate (its corners are on a line, or
+    in the same place), the distance to the closest of its edges is
+    returned instead."""
+    px, py, pz = point
+    (ax, ay, az), (bx, by, bz), (cx, cy, cz) = tri
+    abx, aby, abz = bx - ax, by - ay, bz - az
+    acx, acy, acz = cx - ax, cy - ay, cz - az
+    apx, apy, apz = px - ax, py - ay, pz - az
+    if (aby * acz - abz * acy == 0.0 and abz * acx - abx * acz == 0.0 and
+            abx * acy - aby * acx == 0.0):
+        a, b, c = tri
+        return min(point_seg_dist(point, a, b), point_seg_dist(point, b, c),
+                   point_seg_dist(point, c, a))
+
+    # Find the closest point by checking which Voronoi region of the
+    # triangle the point is in.
+    d1 = abx * apx + aby * apy + abz * apz
+    d2 = acx * apx + acy * apy + acz * apz
+    if d1 <= 0.0 and d2 <= 0.0:
+        qx, qy, qz = ax, ay, az
+    else:
+        bpx, bpy, bpz = px - bx, py - by, pz - bz
+        d3 = abx * bpx + aby * bpy + abz * bpz
+        d4 = acx * bpx + acy * bpy + acz * bpz
+        cpx, cpy, cpz = px - cx, py - cy, pz - cz
+        d5 = abx * cpx + aby * cpy + abz * cpz
+        d6 = acx * cpx + acy * cpy + acz * cpz
+        va = d3 * d6 - d5 * d4
+        vb = d5 * d2 - d1 * d6
+        vc = d1 * d4 - d3 * d2
+        if d3 >= 0.0 and d4 <= d3:
+            qx, qy, qz = bx, by, bz
+        elif d6 >= 0.0 and d5 <= d6:
+            qx, qy, qz = cx, cy, cz
+        elif vc <= 0.0 and d1 >= 0.0 and d3 <= 0.0:
+            t = d1 / (d1 - d3)
+            qx, qy, qz = ax + abx * t, ay + aby * t, az + abz * t
+        elif vb <= 0.0 and d2 >= 0.0 and d6 <= 0.0:
+            t = d2 / (d2 - d6)
+            qx, qy, qz = ax + acx * t, ay + acy * t, az + acz * t
+        elif va <= 0.0 and d4 - d3 >= 0.0 and d5 - d6 >= 0.0:
+            t = (d4 - d3) / ((d4 - d3) + (d5 - d6))
+            qx = bx + (cx - bx) * t
+            qy = by + (cy - by) * t
+            qz = bz + (cz - bz) * t
+        else:
+            denom = va + vb + vc
+            if denom == 0.0:
+                # Degenerate triangle
+                qx, qy, qz = ax, ay, az
+            else:
+                v = vb / denom
+                w = vc / denom
+                qx = ax + abx * v + acx * w
+                qy = ay + aby * v + acy * w
+                qz = az + abz * v + acz * w
+    return sqrt((px - qx) ** 2 + (py - qy) ** 2 + (pz - qz) ** 2)
+
+
+def triangulate(polys):
+    "Split polygons into triangles, as (a, b, c) vertex index tuples."
+    return [(poly[0], poly[corner], poly[corner + 1])
+            for poly in polys for corner in range(1, len(poly) - 1)]
+
+
+class TriangleGrid:
+    """A uniform grid of the triangles of a mesh, which is used to find the
+    distance between a point and the surface of the mesh."""
+
+    # Average number of triangles in each cell
+    TRIS_PER_CELL = 4
+    MAX_CELLS_PER_AXIS = 256
+
+    def __init__(self, verts, tris):
+        """Put the triangles of a mesh into the grid.
+
+        verts is a sequence of (x, y, z) vertex coordinates, and tris is a
+        sequence of (a, b, c) vertex index tuples."""
+        tri_coords = [tuple(tuple(map(float, verts[vidx])) for vidx in tri)
+                      for tri in tris]
+        self.cells = {}  # (x, y, z) cell index -> list of triangles
+        if len(tri_coords) == 0:
+            raise ValueError("The mesh must have at least one triangle!")
+
+        # Each triangle is kept with its bounding sphere (X, Y, Z, radius),
+        # so most of the triangles in a cell can be skipped quickly.
+        self.tris = []
+        for coords in tri_coords:
+            (ax, ay, az), (bx, by, bz), (cx, cy, cz) = coords
+            mx = (ax + bx + cx) / 3
+            my = (ay + by + cy) / 3
+            mz = (az + bz + cz) / 3
+            radius = sqrt(max(
+                (ax - mx) ** 2 + (ay - my) ** 2 + (az - mz) ** 2,
+                (bx - mx) ** 2 + (by - my) ** 2 + (bz - mz) ** 2,
+                (cx - mx) ** 2 + (cy - my) ** 2 + (cz - mz) ** 2))
+            self.tris.append((coords, mx, my, mz, radius))
+
+        self.min = tuple(min(corner[axis] for coords in tri_coords
+                             for corner in coords) for axis in range(3))
+        self.max = tuple(max(corner[axis] for coords in tri_coords
+                             for corner in coords) for axis in range(3))
+        extent = [hi - lo for lo, hi in zip(self.min, self.max)]
+
+        # The cells are cubic, and sized so that the surface of the mesh
+        # passes through about len(tris) / TRIS_PER_CELL of them.
+        area = sum(mesh_opt.poly_area(coords) for coords in tri_coords)
+        self.cell_size = max(
+            sqrt(area * self.TRIS_PER_CELL / len(self.tris)),
+            max(extent) / self.MAX_CELLS_PER_AXIS)
+        if self.cell_size == 0.0:
+            self.cell_size = 1.0
+        self.dims = tuple(int(size / self.cell_size) + 1 for size in extent)
+
+        min_x, min_y, min_z = self.min
+        cell_size = self.cell_size
+        cells = self.cells
+        for tri in self.tris:
+            (ax, ay, az), (bx, by, bz), (cx, cy, cz) = tri[0]
+            lo_x = int((min(ax, bx, cx) - min_x) / cell_size)
+            lo_y = int((min(ay, by, cy) - min_y) / cell_size)
+            lo_z = int((min(az, bz, cz) - min_z) / cell_size)
+            hi_x = int((max(ax, bx, cx) - min_x) / cell_size)
+            hi_y = int((max(ay, by, cy) - min_y) / cell_size)
+            hi_z = int((max(az, bz, cz) - min_z) / cell_size)
+            for x in range(lo_x, hi_x + 1):
+                for y in range(lo_y, hi_y + 1):
+                    for z in range(lo_z, hi_z + 1):
+                        cell = cells.get((x, y, z))
+                        if cell is None:
+                            cells[(x, y, z)] = [tri]
+                        else:
+                            cell.append(tri)
+
+    def _cell_of(self, point):
+        "Get the index of the cell containing a point, clamped to the grid."
+        return tuple(
+            min(max(int(floor((point[axis] - self.min[axis]) /
+                              self.cell_size)), 0), self.dims[axis] - 1)
+            for axis in range(3))
+
+    def distance(self, point, near=0.0):
+        """Get the distance between a point and the closest triangle.
+
+        The cells are searched in rings around the cell containing the
+        point, until no closer triangle can be found. If a triangle within
+        near of the point is found, its distance is returned right away,
+        even if there may be a closer one."""
+        cx, cy, cz = self._cell_of(point)
+        dx, dy, dz = self.dims
+        px, py, pz = point
+        cells = self.cells
+        best = None
+        for ring in range(max(self.dims)):
+            zs_all = range(max(cz - ring, 0), min(cz + ring, dz - 1) + 1)
+            zs_edge = [z for z in (cz - ring, cz + ring) if 0 <= z < dz]
+            for x in range(max(cx - ring, 0), min(cx + ring, dx - 1) + 1):
+                edge_x = x == cx - ring or x == cx + ring
+                for y in range(max(cy - ring, 0), min(cy + ring, dy - 1) + 1):
+                    # Only the cells on the outside of the ring are new.
+                    if edge_x or y == cy - ring or y == cy + ring:
+                        zs = zs_all
+                    else:
+                        zs = zs_edge
+                    for z in zs:
+                        for coords, tx, ty, tz, radius in cells.get(
+                                (x, y, z), ()):
+                            if best is not None and sqrt(
+                                    (px - tx) ** 2 + (py - ty) ** 2 +
+                                    (pz - tz) ** 2) - radius >= best:
+                                continue
+                            dist = point_tri_dist(point, coords)
+                            if best is None or dist < best:
+                                best = dist
+                                if best <= near:
+                                    return best
+            # Triangles in the next ring of cells are at least this far away
+            if best is not None and best <= ring * self.cell_size:
+                break
+        return best
+
+
+def mesh_distance(verts_a, tris_a, verts_b, tris_b):
+    """Get the geometric error between two meshes.
+
+    This is the greatest distance between a vertex of one mesh and the
+    surface of the other one, in either direction. It is an estimate of the
+    Hausdorff distance between the two meshes."""
+    error = 0.0
+    for verts, tris, grid_verts, grid_tris in (
+            (verts_a, tris_a, verts_b, tris_b),
+            (verts_b, tris_b, verts_a, tris_a)):
+        grid = TriangleGrid(grid_verts, grid_tris)
+        # Vertices closer than the greatest distance so far can't change it.
+        for vidx in set(vidx for tri in tris for vidx in tri):
+            error = max(error, grid.distance(verts[vidx], error))
+    return error
+
+
+def fill_lod_ranges(dranges, lod_errors, pixel_dist):
+    """Fill in the missing LOD ranges from the geometric error of the LODs.
+
+    dranges is a list of the LOD ranges, with None for the ranges which are
+    not set, and lod_errors is a list of the geometric error of each LOD.
+    Each missing range is set to its LOD error multiplied by pixel_dist, if
+    that is between the ranges of the LODs before and after it. Otherwise,
+    it is left as None."""
+    last_range = None  # The last range which is set
+    for lod, drange in enumerate(dranges):
+        if drange is None and lod < len(lod_errors):
+            drange = lod_errors[lod] * pixel_dist
+            if ((last_range is None or drange > last_range) and all(
+                    known is None or drange < known
+                    for known in dranges[lod + 1:])):
+                dranges[lod] = drange
+        if dranges[lod] is not None:
+            last_range = dranges[lod]
+
+
+def screen_error(error, distance, fov, resolution):
+    """Get the on-screen size, in pixels, of a geometric error.
+
+    error is seen from distance, with a field of view of fov radians across
+    resolution pixels."""
+    return error * resolution / (2 * tan(fov / 2) * distance)
+
+
+class Decimator:
+    """Simplifies a triangulated mesh using quadric error metrics.
+
+    Edges are collapsed one at a time, cheapest first. Each collapse moves
+    one vertex of the edge onto the other (a "half-edge" collapse), so no
+    new vertices or UV coordinates are made up, and the UV coordinates of the
+    remaining faces stay valid.
+
+    Vertices on UV seams, material boundaries, and open edges of the mesh are
+    locked, so the outline of each UV island and material region is kept.
+    Collapses which would make the mesh non-manifold, or flip a face over,
+    are rejected."""
+
+    # Faces whose normals would turn by more than this (as a cosine) are
+    # considered to be flipped.
+    MIN_FLIP_COS = 0.0
+
+    def __init__(self, verts, faces, uvs=None, face_keys=None):
+        """Set up a mesh for decimation.
+
+        verts is a sequence of (x, y, z) vertex coordinates, and faces is a
+        sequence of polygons, each being a sequence of vertex indices.
+        Polygons with more than 3 vertices are triangulated.
+
+        uvs, if given, is a sequence of the (u, v) coordinates of each
+        corner of each face. face_keys, if given, is a sequence of hashable
+        values, one for each face. Faces with different keys (for example,
+        faces with different materials) are kept apart."""
+        self.verts = [tuple(map(float, vert)) for vert in verts]
+        self.tris = []  # Vertex indices of each triangle, or None
+        self.tri_uvs = []  # UV coordinates of each corner of each triangle
+        self.tri_faces = []  # Index of the face each triangle came from
+        self.vert_tris = [set() for vert in self.verts]
+        self.num_tris = 0
+
+        for face_idx, face in enumerate(faces):
+            face_uvs = (tuple(map(tuple, uvs[face_idx][:len(face)]))
+                        if uvs is not None else ((0.0, 0.0),) * len(face))
+            for corner in range(1, len(face) - 1):
+                tri_idx = len(self.tris)
+                corners = (0, corner, corner + 1)
+                tri = [face[c] for c in corners]
+                if tri[0] == tri[1] or tri[1] == tri[2] or tri[0] == tri[2]:
+                    continue
+                self.tris.append(tri)
+                self.tri_uvs.append([face_uvs[c] for c in corners])
+                self.tri_faces.append(face_idx)
+                for vidx in tri:
+                    self.vert_tris[vidx].add(tri_idx)
+        self.num_tris = len(self.tris)
+        self.orig_tris = [tuple(tri) for tri in self.tris]
+
+        self.locked = self._find_locked(face_keys)
+        self.quadrics = self._make_quadrics()
+        # The original vertices which were collapsed into each vertex
+        self.merged = [[vidx] for vidx in range(len(self.verts))]
+        self.versions = [0] * len(self.verts)
+        self.heap = []
+
+        for vidx in range(len(self.verts)):
+            if not self.locked[vidx]:
+                for nbr in self._neighbours(vidx):
+                    self._push(vidx, nbr)
+
+    def _neighbours(self, vidx):
+        "Get the vertices which share an edge with a vertex."
+        tris = self.tris
+        nbrs = set()
+        for tri_idx in self.vert_tris[vidx]:
+            nbrs.update(tris[tri_idx])
+        nbrs.discard(vidx)
+        return nbrs
+
+    def _find_locked(self, face_keys):
+        """Find the vertices which cannot be moved.
+
+        A vertex is locked if it has different UV coordinates on different
+        faces, if it is shared by faces with different keys, or if it is on
+        an edge which is not shared by exactly two triangles."""
+        locked = [False] * len(self.verts)
+        edge_tris = {}
+
+        for vidx, vtris in enumerate(self.vert_tris):
+            vuvs = set()
+            vkeys = set()
+            for tri_idx in vtris:
+                tri = self.tris[tri_idx]
+                vuvs.add(self.tri_uvs[tri_idx][tri.index(vidx)])
+                if face_keys is not None:
+                    vkeys.add(face_keys[self.tri_faces[tri_idx]])
+            if len(vuvs) > 1 or len(vkeys) > 1:
+                locked[vidx] = True
+
+        for tri in self.tris:
+            for edge in ((tri[0], tri[1]), (tri[1], tri[2]),
+                         (tri[2], tri[0])):
+                edge = (min(edge), max(edge))
+                edge_tris[edge] = edge_tris.get(edge, 0) + 1
+
+        for (vidx_a, vidx_b), num_tris in edge_tris.items():
+            if num_tris != 2:
+                locked[vidx_a] = locked[vidx_b] = True
+
+        return locked
+
+    def _make_quadrics(self):
+        """Make the error quadric for each vertex.
+
+        Each quadric is the sum of the squared distances to the planes of
+        the triangles around the vertex, weighted by their areas. It is kept
+        as the 10 unique coefficients of the symmetric 4x4 matrix."""
+        quadrics = [[0.0] * 10 for vert in self.verts]
+        for tri in self.tris:
+            (ax, ay, az), (bx, by, bz), (cx, cy, cz) = map(
+                self.verts.__getitem__, tri)
+            ux, uy, uz = bx - ax, by - ay, bz - az
+            vx, vy, vz = cx - ax, cy - ay, cz - az
+            nx = uy * vz - uz * vy
+            ny = uz * vx - ux * vz
+            nz = ux * vy - uy * vx
+            nlen = sqrt(nx * nx + ny * ny + nz * nz)
+            if nlen == 0.0:
+                continue
+            area = nlen / 2
+            nx /= nlen
+            ny /= nlen
+            nz /= nlen
+            d = -(nx * ax + ny * ay + nz * az)
+            plane_q = (nx * nx, nx * ny, nx * nz, nx * d, ny * ny, ny * nz,
+                       ny * d, nz * nz, nz * d, d * d)
+            for vidx in tri:
+                vq = quadrics[vidx]
+                for qidx in range(10):
+                    vq[qidx] += plane_q[qidx] * area
+        return quadrics
+
+    def _cost(self, vidx_from, vidx_to):
+        "Get the error for moving vidx_from onto vidx_to."
+        qa = self.quadrics[vidx_from]
+        qb = self.quadrics[vidx_to]
+        q = [a + b for a, b in zip(qa, qb)]
+        x, y, z = self.verts[vidx_to]
+        return max(0.0, (
+            q[0] * x * x + 2 * q[1] * x * y + 2 * q[2] * x * z +
+            2 * q[3] * x + q[4] * y * y + 2 * q[5] * y * z + 2 * q[6] * y +
+            q[7] * z * z + 2 * q[8] * z + q[9]))
+
+    def _push(self, vidx_from, vidx_to):
+        "Queue up a collapse."
+        heapq.heappush(self.heap, (
+            self._cost(vidx_from, vidx_to), vidx_from, vidx_to,
+            self.versions[vidx_to]))
+
+    def _can_collapse(self, vidx_from, vidx_to, shared_tris):
+        "Check whether moving vidx_from onto vidx_to keeps the mesh valid."
+        tris = self.tris
+        verts = self.verts
+
+        # Link condition: The only vertices which are neighbours of both
+        # vertices are the ones across from the edge.
+        opposite = set()
+        for tri_idx in shared_tris:
+            opposite.update(tris[tri_idx])
+        opposite.discard(vidx_from)
+        opposite.discard(vidx_to)
+        if (self._neighbours(vidx_from) &
+                self._neighbours(vidx_to)) != opposite:
+            return False
+
+        tx, ty, tz = verts[vidx_to]
+        for tri_idx in self.vert_tris[vidx_from]:
+            if tri_idx in shared_tris:
+                continue
+            tri = tris[tri_idx]
+            corner = tri.index(vidx_from)
+            (bx, by, bz) = verts[tri[corner - 2]]
+            (cx, cy, cz) = verts[tri[corner - 1]]
+            (ax, ay, az) = verts[vidx_from]
+            # Normal before and after the collapse
+            ux, uy, uz = bx - ax, by - ay, bz - az
+            vx, vy, vz = cx - ax, cy - ay, cz - az
+            nx = uy * vz - uz * vy
+            ny = uz * vx - ux * vz
+            nz = ux * vy - uy * vx
+            ux, uy, uz = bx - tx, by - ty, bz - tz
+            vx, vy, vz = cx - tx, cy - ty, cz - tz
+            mx = uy * vz - uz * vy
+            my = uz * vx - ux * vz
+            mz = ux * vy - uy * vx
+            dot = nx * mx + ny * my + nz * mz
+            nlen = sqrt((nx * nx + ny * ny + nz * nz) *
+                        (mx * mx + my * my + mz * mz))
+            if nlen == 0.0 or dot <= nlen * self.MIN_FLIP_COS:
+                return False
+        return True
+
+    def _collapse(self, vidx_from, vidx_to, shared_tris):
+        "Move vidx_from onto vidx_to."
+        tris = self.tris
+        # The UV coordinates of vidx_to, as seen from the faces around
+        # vidx_from. Since vidx_from is not on a seam, this is the same for
+        # all of those faces.
+        tri_idx = next(iter(shared_tris))
+        to_uv = self.tri_uvs[tri_idx][tris[tri_idx].index(vidx_to)]
+
+        for tri_idx in self.vert_tris[vidx_from]:
+            tri = tris[tri_idx]
+            if tri_idx in shared_tris:
+                for vidx in tri:
+                    if vidx != vidx_from:
+                        self.vert_tris[vidx].discard(tri_idx)
+                tris[tri_idx] = None
+                self.num_tris -= 1
+            else:
+                corner = tri.index(vidx_from)
+                tri[corner] = vidx_to
+                self.tri_uvs[tri_idx][corner] = to_uv
+                self.vert_tris[vidx_to].add(tri_idx)
+        self.vert_tris[vidx_from] = set()
+
+        qa = self.quadrics[vidx_from]
+        qb = self.quadrics[vidx_to]
+        self.quadrics[vidx_to] = [a + b for a, b in zip(qa, qb)]
+        self.merged[vidx_to].extend(self.merged[vidx_from])
+        self.merged[vidx_from] = None
+
+        # Only the collapses involving vidx_to have different costs now.
+        self.versions[vidx_to] += 1
+        for nbr in self._neighbours(vidx_to):
+            if not self.locked[nbr]:
+                self._push(nbr, vidx_to)
+            if not self.locked[vidx_to]:
+                self._push(vidx_to, nbr)
+
+    def decimate(self, max_tris):
+        """Collapse edges until the mesh has at most max_tris triangles.
+
+        The mesh may end up with more triangles if there are no more edges
+        which can be collapsed. Returns the number of triangles left. This
+        can be called several times with decreasing numbers of triangles to
+        make several LODs."""
+        heap = self.heap
+        vert_tris = self.vert_tris
+        versions = self.versions
+        while self.num_tris > max_tris and len(heap) > 0:
+            cost, vidx_from, vidx_to, version = heapq.heappop(heap)
+            if (version != versions[vidx_to] or
+                    len(vert_tris[vidx_from]) == 0 or
+                    len(vert_tris[vidx_to]) == 0):
+                continue
+            shared_tris = vert_tris[vidx_from] & vert_tris[vidx_to]
+            if (len(shared_tris) == 0 or
+                    not self._can_collapse(vidx_from, vidx_to, shared_tris)):
+                continue
+            self._collapse(vidx_from, vidx_to, shared_tris)
+        return self.num_tris
+
+    def max_error(self):
+        """Get the geometric error of the decimated mesh.
+
+        This is the distance between the original and the decimated mesh,
+        as measured by mesh_distance."""
+        tris = [tri for tri in self.tris if tri is not None]
+        if len(tris) == 0:
+            return 0.0
+        return mesh_distance(self.verts, self.orig_tris, self.verts, tris)
+
+    def to_mesh(self):
+        """Get the decimated mesh.
+
+        Returns a (verts, tris, uvs, tri_faces) tuple. verts is a list of the
+        vertex coordinates which are still used, tris is a list of triangles
+        (vertex indices), uvs is a list of the UV coordinates of each corner
+        of each triangle, and tri_faces is a list of the indices of the faces
+        in the original mesh that the triangles came from."""
+        vert_map = {}
+        verts = []
+        tris = []
+        uvs = []
+        tri_faces = []
+        for tri_idx, tri in enumerate(self.tris):
+            if tri is None:
+                continue
+            new_tri = []
+            for vidx in tri:
+                new_vidx = vert_map.get(vidx)
+                if new_vidx is None:
+                    new_vidx = vert_map[vidx] = len(verts)
+                    verts.append(self.verts[vidx])
+                new_tri.append(new_vidx)
+            tris.append(tuple(new_tri))
+            uvs.append(tuple(self.tri_uvs[tri_idx]))
+            tri_faces.append(self.tri_faces[tri_idx])
+        return verts, tris, uvs, tri_faces
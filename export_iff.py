@@ -20,13 +20,17 @@
 
 import bpy
 import mathutils
+import os.path
 import warnings
 import re
-import array
 import time
 from os import sep as dirsep
 from . import iff_mesh
-from math import radians
+from . import decimate
+from . import export_mesh
+from . import mesh_opt
+from . import texnum_registry
+from math import radians, tan
 from collections import OrderedDict
 from itertools import repeat, starmap
 
@@ -88,11 +92,22 @@ class ModelManager:
     # prefix for BSP collider definition objects
     COLLMESH_PFX = "collmesh"
 
+    # Each generated LOD has this many times as many triangles as the LOD
+    # before it. LODs with fewer than GEN_LOD_MIN_TRIS triangles are not
+    # generated.
+    GEN_LOD_RATIO = 0.5
+    GEN_LOD_MIN_TRIS = 64
+
+    # If this is not None, the normals of polygons with a vertex further than
+    # this from their plane are recalculated using Newell's method.
+    NONPLANAR_EPSILON = None
+
     # Transformation to convert hardpoints to WC orientation.
     HP_WC_XFM = mathutils.Euler((radians(90), 0, radians(180)), "XYZ")
 
     def __init__(self, base_name, base_obj, use_facetex, drang_increment,
-                 far_chunk, modeldir, gen_bsp, scene_name, wc_matrix,
+                 far_chunk, modeldir, gen_bsp, gen_lods, drang_sse,
+                 opt_lods, weld_dist, nrm_tolerance, scene_name, wc_matrix,
                  test_run):
 
         if not isinstance(base_name, str):
@@ -131,11 +146,24 @@ class ModelManager:
         self.hardpoints = []  # Hardpoints
         self.hpobnames = []  # Hardpoint Blender object names
 
+        self.gen_lods = gen_lods  # Generate missing LODs from LOD 0
+
         # LOD ranges (RANG chunk)
         self.dranges = [None for x in range(MAX_NUM_LODS)]
         self.dranges[0] = 0.0
         self.drang_increment = drang_increment
+        # Screen-space error settings for computing LOD ranges, as a
+        # (pixel error, vertical field of view, vertical resolution) tuple,
+        # or None to use drang_increment instead.
+        self.drang_sse = drang_sse
+        self.lod_errors = None  # Geometric error of each LOD
         self.far_chunk = far_chunk
+        # Reorder the faces of each LOD to make them faster to draw
+        self.opt_lods = opt_lods
+        # Distance to weld vertices at, or None to leave them as they are
+        self.weld_dist = weld_dist
+        # Normals this close to each other (in radians) are merged
+        self.nrm_tolerance = nrm_tolerance
 
         # CNTR/RADI spheres for each LOD.
         self.dsphrs = [None for x in range(MAX_NUM_LODS)]
@@ -348,6 +376,23 @@ class ModelManager:
         del collider_lod
         del drange_prop
 
+        # Convert all LOD objects to meshes to populate the LOD mesh list.
+        for lidx, lod in enumerate(self.lods):
+            try:
+                lodm = bpy.data.scenes[self.scene].objects[lod].to_mesh(
+                    bpy.data.scenes[self.scene], True, "PREVIEW")
+                lodm.transform(self.wc_matrix.to_4x4())
+                self.lodms.append(lodm)
+            except RuntimeError:
+                print("Object {} is an empty.".format(lod))
+                self.lod_empty[lidx] = True
+
+        if self.gen_lods:
+            self.generate_lods()
+
+        if self.drang_sse is not None:
+            self.compute_dranges()
+
         print("dranges (b4):", self.dranges)
 
         # Fill in blank LOD ranges
@@ -392,8 +437,24 @@ class ModelManager:
 
         print("dranges (after):", self.dranges)
 
-        # Generate CNTR/RADI data for each LOD where it does not exist.
+        if self.drang_sse is not None:
+            self.print_drange_report()
+
+        # Generate CNTR/RADI data for each LOD where it does not exist. The
+        # sphere is the smallest one which encloses the vertices of the LOD.
+        lodms = iter(self.lodms)
+        lod0_sphere = None  # Smallest sphere enclosing the LOD 0 mesh
         for lod_idx in range(len(self.dsphrs)):
+            lodm = None if self.lod_empty[lod_idx] else next(lodms)
+            if lodm is not None and len(lodm.vertices) > 0 and (
+                    self.dsphrs[lod_idx] is None or lod_idx == 0):
+                lod_sphere = iff_mesh.Sphere.from_points(
+                    self.mesh_verts(lodm))
+                if lod_idx == 0:
+                    lod0_sphere = lod_sphere
+                if self.dsphrs[lod_idx] is None:
+                    self.dsphrs[lod_idx] = lod_sphere
+
             if self.dsphrs[lod_idx] is None:
                 lod_obj = (bpy.data.scenes[self.scene]
                            .objects[self.lods[lod_idx]])
@@ -424,7 +485,9 @@ class ModelManager:
             print(hp, ": ({})".format(hpob))
 
         # Generate the collider for this model if it doesn't exist.
-        if self.collider is None:
+        if self.collider is None and lod0_sphere is not None:
+            self.collider = iff_mesh.Collider("sphere", lod0_sphere)
+        elif self.collider is None:
             lod_obj = bpy.data.scenes[self.scene].objects[self.lods[0]]
             coll_vec = lod_obj.location.copy()
             coll_vec.rotate(self.wc_matrix)
@@ -438,21 +501,9 @@ class ModelManager:
 
         print("Collider:", self.collider)
 
-        # Convert all LOD objects to meshes to populate the LOD mesh list.
-        for lidx, lod in enumerate(self.lods):
-            try:
-                self.lodms.append(
-                    bpy.data.scenes[self.scene].objects[lod].to_mesh(
-                        bpy.data.scenes[self.scene], True, "PREVIEW")
-                )
-            except RuntimeError:
-                print("Object {} is an empty.".format(lod))
-                self.lod_empty[lidx] = True
-
         # Get the textures used by all LODs for this model
         used_materials = []
         for lodm in self.lodms:
-            lodm.transform(self.wc_matrix.to_4x4())
             lodm.calc_normals()
             lodm.calc_tessface()
             # tf_mtl = None  # The material for this tessface
@@ -510,6 +561,138 @@ class ModelManager:
 
         self.setup_complete = True
 
+    def generate_lods(self):
+        """Generate the missing LODs of this model by decimating LOD 0.
+
+        Each generated LOD has GEN_LOD_RATIO times as many triangles as the
+        LOD before it. UV seams, and boundaries between faces with different
+        materials, face textures, or shading are kept intact. No LODs are
+        generated after an empty LOD."""
+        if self.lod_empty[0] or self.lod_empty[-1]:
+            return
+
+        lod0_mesh = self.lodms[0]
+        lod0_mesh.calc_tessface()
+        lod0_uvs = lod0_mesh.tessface_uv_textures.active.data
+        faces = [tuple(tf.vertices) for tf in lod0_mesh.tessfaces]
+        uvs = [tuple(tfuv.uv) for tfuv in lod0_uvs]
+        face_keys = [
+            (tf.material_index, tf.use_smooth,
+             None if tfuv.image is None else tfuv.image.filepath)
+            for tf, tfuv in zip(lod0_mesh.tessfaces, lod0_uvs)]
+
+        last_mesh = self.lodms[-1]
+        last_mesh.calc_tessface()
+        num_tris = sum(len(tf.vertices) - 2 for tf in last_mesh.tessfaces)
+
+        decimator = decimate.Decimator(
+            [tuple(vert.co) for vert in lod0_mesh.vertices], faces, uvs,
+            face_keys)
+
+        for lod in range(len(self.lods), MAX_NUM_LODS):
+            max_tris = int(num_tris * self.GEN_LOD_RATIO)
+            if max_tris < self.GEN_LOD_MIN_TRIS:
+                break
+            gen_start = time.perf_counter()
+            tris_left = decimator.decimate(max_tris)
+            if tris_left >= num_tris:
+                # The mesh can't be decimated any further.
+                break
+            num_tris = tris_left
+
+            verts, tris, tri_uvs, tri_faces = decimator.to_mesh()
+            lod_name = "{}{}{}".format(self.base_prefix, lod, self.base_suffix)
+            lodm = bpy.data.meshes.new(lod_name)
+            lodm.from_pydata(verts, [], tris)
+            for mtl in lod0_mesh.materials:
+                lodm.materials.append(mtl)
+            lodm.polygons.foreach_set("material_index", [
+                lod0_mesh.tessfaces[face_idx].material_index
+                for face_idx in tri_faces])
+            lodm.polygons.foreach_set("use_smooth", [
+                lod0_mesh.tessfaces[face_idx].use_smooth
+                for face_idx in tri_faces])
+            uv_tex = lodm.uv_textures.new()
+            lodm.uv_layers.active.data.foreach_set("uv", [
+                uv_coord for tri_uv in tri_uvs for uv in tri_uv
+                for uv_coord in uv])
+            for poly_tex, face_idx in zip(uv_tex.data, tri_faces):
+                poly_tex.image = lod0_uvs[face_idx].image
+            lodm.update()
+
+            self.lods.append(lod_name)
+            self.lodms.append(lodm)
+            self.dranges.append(None)
+            self.dsphrs.append(None)
+            self.lod_empty.append(False)
+            print("Generated LOD {} ({} triangles, max. error {:.4f}) in "
+                  "{:.3f} seconds".format(
+                      lod, num_tris, decimator.max_error(),
+                      time.perf_counter() - gen_start))
+
+    def lod_pixel_dist(self):
+        """Get the distance at which a geometric error of one unit is
+        drang_sse[0] pixels tall on screen."""
+        pixel_error, fov, resolution = self.drang_sse
+        return resolution / (2 * tan(fov / 2) * pixel_error)
+
+    def compute_dranges(self):
+        """Compute the missing LOD ranges from the geometric error of the LODs.
+
+        The error of each LOD is its distance from LOD 0 (see
+        decimate.mesh_distance), and each LOD is used once its error would
+        be at most drang_sse[0] pixels on screen. Empty LODs make the whole
+        model disappear, so their error is the radius of LOD 0. LOD ranges
+        set by the user are left as they are."""
+        if self.lod_empty[0]:
+            return
+
+        lodms = iter(self.lodms)
+        lod0_mesh = next(lodms)
+        lod0_verts = [tuple(vert.co) for vert in lod0_mesh.vertices]
+        lod0_tris = decimate.triangulate(
+            [tuple(poly.vertices) for poly in lod0_mesh.polygons])
+        if len(lod0_tris) == 0:
+            return
+        lod0_radius = max(max(coords) - min(coords)
+                          for coords in zip(*lod0_verts)) / 2
+
+        pixel_dist = self.lod_pixel_dist()
+        self.lod_errors = [0.0]
+        max_error = 0.0  # The error of a LOD can't be less than the last one
+        for lod in range(1, len(self.lods)):
+            if self.lod_empty[lod]:
+                lod_error = lod0_radius
+            else:
+                lodm = next(lodms)
+                lod_tris = decimate.triangulate(
+                    [tuple(poly.vertices) for poly in lodm.polygons])
+                if len(lod_tris) == 0:
+                    lod_error = lod0_radius
+                else:
+                    lod_error = decimate.mesh_distance(
+                        lod0_verts, lod0_tris,
+                        [tuple(vert.co) for vert in lodm.vertices], lod_tris)
+            max_error = max(max_error, lod_error)
+            self.lod_errors.append(max_error)
+
+        decimate.fill_lod_ranges(self.dranges, self.lod_errors, pixel_dist)
+
+    def print_drange_report(self):
+        "Print the error, range, and on-screen error of each LOD."
+        pixel_error, fov, resolution = self.drang_sse
+        print("LOD  Error       Range       Error at range (pixels)")
+        for lod, drange in enumerate(self.dranges):
+            if self.lod_errors is None or lod >= len(self.lod_errors):
+                print("{:<4} {:<11} {:<11.2f}".format(lod, "?", drange))
+                continue
+            lod_error = self.lod_errors[lod]
+            print("{:<4} {:<11.4f} {:<11.2f} {}".format(
+                lod, lod_error, drange,
+                "{:.2f}".format(decimate.screen_error(
+                    lod_error, drange, fov, resolution))
+                if drange > 0.0 else "-"))
+
     def get_materials(self):
         if not self.setup_complete:
             raise ValueError("You must set the model up first!")
@@ -543,18 +726,12 @@ class ModelManager:
                     print("Assigning {} to {}...".format(txnm, img))
                     self.image_txns[img] = txnm
 
-    def calc_dplane(self, vert, facenrm):
-        """Calculate the D-Plane of the face.
-
-        vert refers to the first vertex of the face
-        facenrm refers to the face normal
-        The D-Plane is used by the VISION engine for backface culling
-        Thanks to gr1mre4per from CIC for the algorithm!
-        """
-        dplane = -((facenrm[0] * vert[0]) +
-                   (facenrm[1] * vert[1]) +
-                   (facenrm[2] * vert[2]))
-        return dplane
+    def mesh_verts(self, mesh):
+        "Get the coordinates of the vertices of a mesh, as they are exported."
+        coords = export_mesh.foreach_array(
+            mesh.vertices, "co", "f", len(mesh.vertices) * 3)
+        return [(-coords[idx], coords[idx + 1], coords[idx + 2])
+                for idx in range(0, len(coords), 3)]
 
     @property
     def exp_fname(self):
@@ -576,106 +753,40 @@ class ModelManager:
     def exp_fname(self):
         self._exp_fname = self.modelname
 
-    def export(self):
-        modelfile = iff_mesh.ModelIff(self.modeldir + dirsep + self._exp_fname,
-                                      self.far_chunk)
-
-        modelfile.set_collider(self.collider)
-        for hardpt in self.hardpoints:
-            modelfile.add_hardpt(hardpt)
+    def export_model(self):
+        """Extract the data of this model from Blender.
+
+        Returns an export_mesh.ExportModel, which can be written without
+        Blender."""
+        # Hardpoint matrices and locations are converted to tuples, since
+        # mathutils types can't be sent to another process.
+        hardpoints = [
+            iff_mesh.Hardpoint(tuple(map(tuple, hardpt.rot_matrix)),
+                               tuple(hardpt.location), hardpt.name)
+            for hardpt in self.hardpoints]
+        model = export_mesh.ExportModel(
+            self.modeldir + dirsep + self._exp_fname, self.far_chunk,
+            self.collider, hardpoints)
 
         for drange, lodi in zip(self.dranges, range(len(self.lods))):
             if self.lod_empty[lodi] is False:
-                ilodm = iff_mesh.MeshLODForm(lodi)
-                ilodm.set_name(self.modelname)
-                ilodm.set_cntradi(self.dsphrs[lodi])
-
-                cur_lodm = self.lodms[lodi]
-
-                for vert in cur_lodm.vertices:
-                    ilodm.add_vertex(vert.co.x * -1, vert.co.y, vert.co.z)
-
-                unique_normals = {}
-                norm_idx = 0
-                fvrt_idx = 0
-                for tf, tfuv in zip(
-                        cur_lodm.tessfaces,
-                        cur_lodm.tessface_uv_textures.active.data):
-
-                    # Get vertex normals. This depends on whether or not the
-                    # faces are smooth or flat shaded.
-                    if tf.use_smooth:
-                        # Smooth - use individual vertex normals
-                        for vert in tf.vertices:
-                            nx, ny, nz = cur_lodm.vertices[vert].normal
-                            nx *= -1
-                            vnrm = array.array("f", (nx, ny, nz)).tobytes()
-                            if vnrm not in unique_normals:
-                                unique_normals[vnrm] = norm_idx
-                                ilodm.add_vert_normal(nx, ny, nz)
-                                norm_idx += 1
-
-                    # Flat - use face normal. This normal will be added anyway,
-                    # since it is referenced by the FACE chunk.
-                    nx, ny, nz = tf.normal
-                    nx *= -1
-                    fnrm = array.array("f", (nx, ny, nz)).tobytes()
-                    if fnrm not in unique_normals:
-                        unique_normals[fnrm] = norm_idx
-                        ilodm.add_face_normal(nx, ny, nz)
-                        norm_idx += 1
-
-                    # Add the FVRTs for the face
-                    uv_idx = len(tf.vertices) - 1
-                    for fvrt in reversed(tf.vertices):
-                        vtnm_idx = None
-                        if tf.use_smooth:
-                            nx, ny, nz = cur_lodm.vertices[fvrt].normal
-                            nx *= -1
-                            vnrm = array.array("f", (nx, ny, nz)).tobytes()
-                            vtnm_idx = unique_normals[vnrm]
-                        else:
-                            nx, ny, nz = tf.normal
-                            nx *= -1
-                            vnrm = array.array("f", (nx, ny, nz)).tobytes()
-                            vtnm_idx = unique_normals[vnrm]
-                        ilodm.add_fvrt(fvrt, vtnm_idx, tfuv.uv[uv_idx][0],
-                                       1 - tfuv.uv[uv_idx][1])
-                        uv_idx -= 1
-                    del uv_idx
-
-                    # Get the texnum and light flags
-                    if self.use_mtltex:
-                        texnum = self.mtltexs[
-                            cur_lodm.materials[tf.material_index].name][2]
-                    else:
-                        if tfuv.image is not None:
-                            texnum = self.image_txns[tfuv.image.filepath]
-                        else:
-                            # This should be a flat colour
-                            texnum = self.mtltexs[
-                                cur_lodm.materials[tf.material_index].name][2]
-                    light_flags = self.mtltexs[
-                        cur_lodm.materials[tf.material_index].name][0]
-
-                    first_vert = cur_lodm.vertices[tf.vertices[-1]].co.copy()
-                    first_vert.x *= -1
-
-                    face_nrm = tf.normal.copy()
-                    face_nrm.x *= -1
-
-                    # Add the face
-                    ilodm.add_face(
-                        unique_normals[fnrm],
-                        self.calc_dplane(first_vert, face_nrm),
-                        texnum, fvrt_idx, len(tf.vertices), light_flags)
-                    fvrt_idx += len(tf.vertices)
+                emesh = export_mesh.ExportMesh.from_bpy(
+                    self.lodms[lodi], not self.use_mtltex)
+                texnums, light_flags = emesh.face_texnums(
+                    self.mtltexs,
+                    None if self.use_mtltex else self.image_txns)
+                model.add_lod(
+                    drange, emesh, name=self.modelname,
+                    cntradi=self.dsphrs[lodi], texnums=texnums,
+                    light_flags=light_flags, nrm_tolerance=self.nrm_tolerance,
+                    planar_eps=self.NONPLANAR_EPSILON,
+                    weld_dist=self.weld_dist, optimize=self.opt_lods)
             else:
-                ilodm = iff_mesh.EmptyLODForm(lodi)
+                model.add_lod(drange)
+        return model
 
-            modelfile.add_lod(ilodm, drange)
-        if not self.test_run:
-            modelfile.write_file_bin()
+    def export(self):
+        export_mesh.write_model(self.export_model(), self.test_run)
 
 
 class ExportBackend:
@@ -690,6 +801,14 @@ class ExportBackend:
                  include_far_chunk=True,
                  drang_increment=500.0,
                  generate_bsp=False,
+                 generate_lods=False,
+                 drang_sse=None,
+                 optimize_lods=False,
+                 weld_distance=None,
+                 normal_tolerance=0.0,
+                 parallel_export=False,
+                 skip_unchanged=False,
+                 texnum_registry=None,
                  test_run=False):
         self.filepath = filepath
         self.start_texnum = start_texnum
@@ -700,38 +819,58 @@ class ExportBackend:
         self.include_far_chunk = include_far_chunk
         self.drang_incval = drang_increment
         self.generate_bsp = generate_bsp
+        self.generate_lods = generate_lods
+        self.drang_sse = drang_sse
+        self.optimize_lods = optimize_lods
+        self.weld_distance = weld_distance
+        self.normal_tolerance = normal_tolerance
+        self.parallel_export = parallel_export
+        self.skip_unchanged = skip_unchanged
+        self.texnum_registry = texnum_registry
         self.test_run = test_run
         self.modelname = ""
 
-    def get_texnums(self, textures):
+    @staticmethod
+    def texnum_key(txfname):
+        "Get the absolute path of a texture, for the texture number registry."
+        return os.path.normpath(bpy.path.abspath(txfname))
+
+    def get_texnums(self, textures, registry=None):
         """Convert all of the named textures to texture numbers.
 
+        Textures which are not numeric get their texture numbers from
+        registry, a texnum_registry.TexnumRegistry, which allocates them
+        beginning at the user's specified starting texture number. If
+        registry is None, an empty one is used.
+
         Returns a mapping from texture filenames to texture numbers."""
         RE_NUMERIC_TX = re.compile(r"\b(\d{1,8})(?:\.\w+)?$")
 
-        # Keep track of which textures are numeric, and which ones are not.
-        numeric_txs = [None for x in range(len(textures))]
-
-        # Associate each texture filename with a texture number,
-        # beginning at the user's specified starting texture number.
-        texnums = OrderedDict()
-        last_txnum = self.start_texnum
+        if registry is None:
+            registry = texnum_registry.TexnumRegistry()
 
-        # See which numeric textures are being used.
-        for idx, txfname in enumerate(textures):
+        # Reserve the texture numbers of the numeric textures first, so that
+        # they are not given to any other texture.
+        numeric_txs = {}
+        for txfname in textures:
             numtx_match = RE_NUMERIC_TX.search(txfname)
             if numtx_match:
-                numeric_txs[idx] = int(numtx_match.group(1))
-
-        for idx, txfname in enumerate(textures):
-            if numeric_txs[idx] is not None:
-                texnums[txfname] = numeric_txs[idx]
+                numeric_txs[txfname] = int(numtx_match.group(1))
+                displaced = registry.reserve(numeric_txs[txfname])
+                if displaced is not None:
+                    print("{} now uses texture number {}. {} will get a new "
+                          "texture number.".format(
+                              txfname, numeric_txs[txfname], displaced))
+
+        # Associate each texture filename with a texture number.
+        texnums = OrderedDict()
+        for txfname in textures:
+            if txfname in numeric_txs:
+                texnums[txfname] = numeric_txs[txfname]
             else:
-                curr_txnum = last_txnum
-                while curr_txnum in numeric_txs:
-                    curr_txnum += 1
-                texnums[txfname] = curr_txnum
-                last_txnum = curr_txnum + 1
+                texnums[txfname] = registry.texnum_for(
+                    registry.image_key(self.texnum_key(txfname)),
+                    self.start_texnum)
 
         return texnums
 
@@ -759,8 +898,9 @@ class HierarchyManager:
     """A valid object, and its valid children."""
 
     def __init__(self, root_obj, modelname, modeldir, use_facetex, far_chunk,
-                 drang_increment, generate_bsp, scene_name, wc_matrix,
-                 test_run):
+                 drang_increment, generate_bsp, generate_lods, drang_sse,
+                 optimize_lods, weld_distance, normal_tolerance, scene_name,
+                 wc_matrix, test_run):
 
         self.root_obj = root_obj
         self.root_lods = self.lods_of(root_obj.name)
@@ -771,6 +911,11 @@ class HierarchyManager:
         self.far_chunk = far_chunk
         self.drang_incval = drang_increment
         self.generate_bsp = generate_bsp
+        self.generate_lods = generate_lods
+        self.drang_sse = drang_sse
+        self.optimize_lods = optimize_lods
+        self.weld_distance = weld_distance
+        self.normal_tolerance = normal_tolerance
         self.scene_name = scene_name
         self.wc_matrix = wc_matrix
         self.test_run = test_run
@@ -966,8 +1111,9 @@ class HierarchyManager:
             cur_manager = ModelManager(
                 self.modelname, hobj.name, self.use_facetex,
                 self.drang_incval, self.far_chunk, self.modeldir,
-                self.generate_bsp, self.scene_name, self.wc_matrix,
-                self.test_run)
+                self.generate_bsp, self.generate_lods, self.drang_sse,
+                self.optimize_lods, self.weld_distance, self.normal_tolerance,
+                self.scene_name, self.wc_matrix, self.test_run)
             cur_manager.exp_fname = self.hierarchy_str_for(hobj)
             print("Export filename for {}: {}.iff".format(
                 hobj.name, cur_manager.exp_fname))
@@ -993,6 +1139,10 @@ class HierarchyManager:
         for manager in self.managers:
             manager.assign_mtltxns(mtltxns)
 
+    def export_models(self):
+        "Get an export_mesh.ExportModel for each model in the hierarchy."
+        return [manager.export_model() for manager in self.managers]
+
     def export(self):
         for manager in self.managers:
             manager.export()
@@ -1031,8 +1181,9 @@ class IFFExporter(ExportBackend):
             managers.append(HierarchyManager(
                 bpy.context.active_object, modelname, modeldir,
                 self.use_facetex, self.include_far_chunk, self.drang_incval,
-                self.generate_bsp, bpy.context.scene.name,
-                self.wc_matrix, self.test_run))
+                self.generate_bsp, self.generate_lods, self.drang_sse,
+                self.optimize_lods, self.weld_distance, self.normal_tolerance,
+                bpy.context.scene.name, self.wc_matrix, self.test_run))
 
         else:
             for obj in bpy.context.scene.objects:
@@ -1041,8 +1192,11 @@ class IFFExporter(ExportBackend):
                         managers.append(HierarchyManager(
                             obj, modelname, modeldir, self.use_facetex,
                             self.include_far_chunk, self.drang_increment,
-                            self.generate_bsp, bpy.context.scene.name,
-                            self.wc_matrix, self.test_run
+                            self.generate_bsp, self.generate_lods,
+                            self.drang_sse, self.optimize_lods,
+                            self.weld_distance, self.normal_tolerance,
+                            bpy.context.scene.name, self.wc_matrix,
+                            self.test_run
                         ))
                         warnings.warn("detail-x LOD naming scheme is "
                                       "deprecated.", DeprecationWarning)
@@ -1052,8 +1206,11 @@ class IFFExporter(ExportBackend):
                             managers.append(HierarchyManager(
                                 obj, modelname, modeldir, self.use_facetex,
                                 self.include_far_chunk, self.drang_increment,
-                                self.generate_bsp, bpy.context.scene.name,
-                                self.wc_matrix, self.test_run
+                                self.generate_bsp, self.generate_lods,
+                                self.drang_sse, self.optimize_lods,
+                                self.weld_distance, self.normal_tolerance,
+                                bpy.context.scene.name, self.wc_matrix,
+                                self.test_run
                             ))
                             used_names.add(obj_match.group(1))
 
@@ -1065,14 +1222,39 @@ class IFFExporter(ExportBackend):
         print(banner("Texture images for all models that will be exported:"))
         print(used_materials)
 
-        mtltexnums = self.get_texnums(used_materials)
+        registry = texnum_registry.TexnumRegistry(self.texnum_registry)
+        if registry.filename is not None:
+            # Deleted textures give their texture numbers back. Textures in
+            # missing folders keep theirs, since the folder might be on a
+            # drive that isn't connected.
+            used_keys = set(registry.image_key(self.texnum_key(txfname))
+                            for txfname in used_materials)
+
+            def is_used(img):
+                img_path = registry.image_path(img)
+                return (img in used_keys or os.path.isfile(img_path) or
+                        not os.path.isdir(os.path.dirname(img_path)))
+
+            registry.release_unused(is_used)
+
+        mtltexnums = self.get_texnums(used_materials, registry)
+        if registry.filename is not None and not self.test_run:
+            registry.save()
 
         print(banner("Texture numbers:", 70))
         print(mtltexnums)
 
+        # The models are extracted from Blender one at a time, but they can
+        # be converted and written in parallel.
+        models = []
         for manager in managers:
             manager.assign_mtltxns(mtltexnums)
-            manager.export()
+            models.extend(manager.export_models())
+        manifest = None
+        if self.skip_unchanged:
+            manifest = export_mesh.ExportManifest(modeldir)
+        export_mesh.write_models(models, self.test_run, self.parallel_export,
+                                 manifest)
 
         print("Export took {} seconds.".format(
             time.perf_counter() - export_start))
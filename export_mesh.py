@@ -0,0 +1,501 @@
+# -*- coding: utf8 -*-
+# Blender WCP IFF mesh import/export script by Kevin Caccamo
+# Copyright © 2013-2016 Kevin Caccamo
+# E-mail: kevin@ciinet.org
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# <pep8-80 compliant>
+
+# Blender-independent mesh data for the exporter.
+#
+# ExportMesh holds everything the exporter needs from a LOD mesh, so that it
+# can be converted to a MeshLODForm without Blender. ExportModel does the same
+# for a whole model, so that it can be written in another process.
+# ExportManifest keeps track of the models which were already written, so
+# that unchanged models are not written again.
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+from array import array
+from . import iff_mesh
+from . import mesh_opt
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate, compress, repeat
+
+# Increase this whenever the exporter writes the same model differently, so
+# that models written by older versions are written again.
+MANIFEST_VERSION = 1
+
+
+def foreach_array(collection, attr, typecode, length):
+    """Get an attribute of every item in a bpy collection with foreach_get.
+
+    The values are returned as a flat array with the given type code, which
+    must match the type of the attribute. length is the total number of
+    values, so it is the length of the collection times the number of values
+    per item."""
+    values = array(typecode, bytes(array(typecode).itemsize * length))
+    collection.foreach_get(attr, values)
+    return values
+
+
+class ExportMesh:
+    """A LOD mesh, as extracted from Blender.
+
+    The mesh data is kept in flat arrays, in Blender's coordinate system.
+    coords and vert_normals have three items per vertex, loop_verts has one
+    item per face corner, and loop_uvs has two. The face arrays have one item
+    per face, except for face_normals, which has three. The corners of face i
+    are loop_start[i] to loop_start[i] + loop_total[i] - 1, in Blender's
+    winding order.
+
+    face_mtls are indices in materials, which is a list of material names, and
+    face_images is a list of the image filenames of the faces, or None for
+    faces without an image."""
+
+    def __init__(self):
+        self.coords = array("f")
+        self.vert_normals = array("f")
+        self.loop_verts = array("i")
+        self.loop_uvs = array("f")
+        self.loop_start = array("i")
+        self.loop_total = array("i")
+        self.face_normals = array("f")
+        self.face_mtls = array("i")
+        self.face_smooth = array("b")
+        self.face_images = []
+        self.materials = []
+
+    @property
+    def num_verts(self):
+        return len(self.coords) // 3
+
+    @property
+    def num_faces(self):
+        return len(self.loop_start)
+
+    def add_vert(self, co, normal):
+        "Add a vertex, and return its index."
+        self.coords.extend(co[:3])
+        self.vert_normals.extend(normal[:3])
+        return self.num_verts - 1
+
+    def add_face(self, verts, uvs, normal, material=0, smooth=False,
+                 image=None):
+        "Add a face, and return its index."
+        if len(verts) < 3:
+            raise ValueError("A face must have at least three vertices!")
+        if len(uvs) != len(verts):
+            raise ValueError("A face must have one UV coordinate per vertex!")
+        for vert in verts:
+            if vert < 0 or vert >= self.num_verts:
+                raise ValueError("Vertex index {} is out of range!"
+                                 .format(vert))
+        self.loop_start.append(len(self.loop_verts))
+        self.loop_total.append(len(verts))
+        self.loop_verts.extend(verts)
+        for uv in uvs:
+            self.loop_uvs.extend(uv[:2])
+        self.face_normals.extend(normal[:3])
+        self.face_mtls.append(material)
+        self.face_smooth.append(bool(smooth))
+        self.face_images.append(image)
+        return self.num_faces - 1
+
+    @classmethod
+    def from_bpy(cls, mesh, images=True):
+        """Extract the data of a Blender mesh.
+
+        The tessellated faces of the mesh must have been calculated, and it
+        must have an active UV texture. The data is read with a few bulk
+        foreach_get calls, rather than one attribute at a time. The images
+        of the faces can only be read one face at a time, so they are only
+        read if images is True."""
+        emesh = cls()
+        emesh.materials = [mtl.name if mtl is not None else None
+                           for mtl in mesh.materials]
+
+        num_verts = len(mesh.vertices)
+        emesh.coords = foreach_array(mesh.vertices, "co", "f", num_verts * 3)
+        emesh.vert_normals = foreach_array(
+            mesh.vertices, "normal", "f", num_verts * 3)
+
+        tfaces = mesh.tessfaces
+        tfuvs = mesh.tessface_uv_textures.active.data
+        num_faces = len(tfaces)
+        face_verts = foreach_array(tfaces, "vertices_raw", "i", num_faces * 4)
+        face_uvs = foreach_array(tfuvs, "uv_raw", "f", num_faces * 8)
+        emesh.face_normals = foreach_array(
+            tfaces, "normal", "f", num_faces * 3)
+        emesh.face_mtls = foreach_array(
+            tfaces, "material_index", "i", num_faces)
+        emesh.face_smooth = foreach_array(tfaces, "use_smooth", "b", num_faces)
+
+        # Every tessellated face has room for four vertices and UVs. The
+        # fourth vertex of a triangle is 0, and Blender makes sure that the
+        # fourth vertex of a quad is never 0.
+        quads = array("b", (vert != 0 for vert in face_verts[3::4]))
+        vert_mask = array("b", repeat(1, num_faces * 4))
+        vert_mask[3::4] = quads
+        uv_mask = array("b", repeat(1, num_faces * 8))
+        uv_mask[6::8] = quads
+        uv_mask[7::8] = quads
+        emesh.loop_verts = array("i", compress(face_verts, vert_mask))
+        emesh.loop_uvs = array("f", compress(face_uvs, uv_mask))
+        emesh.loop_total = array("i", (3 + quad for quad in quads))
+        emesh.loop_start = array("i", repeat(0, num_faces))
+        emesh.loop_start[1:] = array(
+            "i", accumulate(emesh.loop_total[:-1]))
+
+        if images:
+            emesh.face_images = [
+                tfuv.image.filepath if tfuv.image is not None else None
+                for tfuv in tfuvs]
+        else:
+            emesh.face_images = [None] * num_faces
+        return emesh
+
+    def face_texnums(self, mtltexs, image_txns=None):
+        """Get the texture number and light flags of each face.
+
+        mtltexs maps material names to their light flags and texture
+        numbers, like ModelManager.mtltexs. If image_txns is given, it maps
+        image filenames to texture numbers, and the faces with an image use
+        its texture number instead of the one for their material.
+
+        Returns a tuple of two lists: the texture numbers and the light
+        flags."""
+        texnums = []
+        light_flags = []
+        for mtl_idx, image in zip(self.face_mtls, self.face_images):
+            mtldata = mtltexs[self.materials[mtl_idx]]
+            if image_txns is not None and image is not None:
+                texnums.append(image_txns[image])
+            else:
+                texnums.append(mtldata[2])
+            light_flags.append(mtldata[0])
+        return texnums, light_flags
+
+    def lod_records(self, texnums, light_flags, nrm_tolerance=0.0,
+                    planar_eps=None):
+        """Get the VERT, VTNM, FVRT, and FACE records of this mesh.
+
+        The records are in the WC coordinate system, and the format used by
+        iff_mesh.MeshLODForm and mesh_opt. texnums and light_flags are the
+        texture numbers and light flags of each face. Normals within
+        nrm_tolerance radians of each other are merged, and the normals of
+        polygons with a vertex further than planar_eps from their plane are
+        recalculated, if planar_eps is not None."""
+        if len(texnums) != self.num_faces:
+            raise ValueError("There must be one texture number per face!")
+        if len(light_flags) != self.num_faces:
+            raise ValueError("There must be one set of light flags per face!")
+
+        def wc_vectors(values):
+            return [(-values[idx], values[idx + 1], values[idx + 2])
+                    for idx in range(0, len(values), 3)]
+
+        verts = wc_vectors(self.coords)
+        vert_normals = wc_vectors(self.vert_normals)
+        faces_loops = list(zip(self.loop_start, self.loop_total))
+
+        # The FVRTs of each face are in reverse order.
+        fvrt_loops = [loop for start, total in faces_loops
+                      for loop in range(start + total - 1, start - 1, -1)]
+        fvrt_verts = [self.loop_verts[loop] for loop in fvrt_loops]
+        first_fvrts = [fvrt_end - total for fvrt_end, total
+                       in zip(accumulate(self.loop_total), self.loop_total)]
+        face_normals, dplanes = mesh_opt.face_planes(
+            verts, fvrt_verts, first_fvrts, self.loop_total,
+            wc_vectors(self.face_normals), planar_eps)
+
+        # Gather the normals of the faces and their vertices, and merge the
+        # duplicates all at once. face_nrms and fvrt_nrms are indices in
+        # lod_normals.
+        lod_normals = []
+        face_nrms = []
+        fvrt_nrms = []
+        for face_idx, (start, total) in enumerate(faces_loops):
+            first_nrm = len(lod_normals)
+            # Get vertex normals. This depends on whether or not the faces
+            # are smooth or flat shaded.
+            if self.face_smooth[face_idx]:
+                # Smooth - use individual vertex normals
+                lod_normals.extend(
+                    vert_normals[vert]
+                    for vert in self.loop_verts[start:start + total])
+                fvrt_nrms.extend(range(first_nrm + total - 1,
+                                       first_nrm - 1, -1))
+                first_nrm += total
+            else:
+                # Flat - use face normal.
+                fvrt_nrms.extend(repeat(first_nrm, total))
+            # The face normal is added anyway, since it is referenced by the
+            # FACE chunk.
+            lod_normals.append(face_normals[face_idx])
+            face_nrms.append(first_nrm)
+
+        normals, face_nrms, fvrt_nrms = mesh_opt.pool_normals(
+            lod_normals, nrm_tolerance, face_nrms, fvrt_nrms)
+        del lod_normals
+
+        uvs = self.loop_uvs
+        fvrts = [(vert, vtnm, uvs[loop * 2], 1 - uvs[loop * 2 + 1])
+                 for vert, vtnm, loop
+                 in zip(fvrt_verts, fvrt_nrms, fvrt_loops)]
+        faces = [(vtnm, dplane, texnum, fvrt_idx, total, face_lf,
+                  iff_mesh.MeshLODForm.DEFAULT_ALT_MAT)
+                 for vtnm, dplane, texnum, fvrt_idx, total, face_lf
+                 in zip(face_nrms, dplanes, texnums, first_fvrts,
+                        self.loop_total, light_flags)]
+        return verts, normals, fvrts, faces
+
+    def to_lod_form(self, lod_lev, name, cntradi, texnums, light_flags,
+                    nrm_tolerance=0.0, planar_eps=None, weld_dist=None,
+                    optimize=False):
+        """Convert this mesh to a MeshLODForm.
+
+        The LOD is given the LOD level lod_lev, and the name and centre and
+        radius (an iff_mesh.Sphere) given. See lod_records for texnums,
+        light_flags, nrm_tolerance, and planar_eps. If weld_dist is not
+        None, the vertices within weld_dist of each other are welded, and
+        the faces share their FVRTs where possible. If optimize is True, the
+        faces are reordered for the vertex cache."""
+        verts, normals, fvrts, faces = self.lod_records(
+            texnums, light_flags, nrm_tolerance, planar_eps)
+
+        num_records = (len(verts), len(normals), len(fvrts))
+        if weld_dist is not None:
+            verts, normals, fvrts, faces = mesh_opt.weld_lod(
+                verts, normals, fvrts, faces, weld_dist)
+
+        if optimize:
+            acmr = mesh_opt.acmr(mesh_opt.face_verts(fvrts, faces))
+            tx_switches = mesh_opt.texture_switches(faces)
+            verts, normals, fvrts, faces = mesh_opt.reorder_lod(
+                verts, normals, fvrts, faces)
+            print("LOD {}: ACMR {:.3f} -> {:.3f}, texture switches {} -> {}"
+                  .format(lod_lev, acmr,
+                          mesh_opt.acmr(mesh_opt.face_verts(fvrts, faces)),
+                          tx_switches, mesh_opt.texture_switches(faces)))
+
+        if weld_dist is not None:
+            # This must be done last, since the faces can't be reordered
+            # once they share FVRTs.
+            fvrts, faces = mesh_opt.share_fvrts(verts, normals, fvrts, faces)
+            print("LOD {}: {} -> {} VERTs, {} -> {} VTNMs, {} -> {} FVRTs"
+                  .format(lod_lev, num_records[0], len(verts),
+                          num_records[1], len(normals),
+                          num_records[2], len(fvrts)))
+
+        ilodm = iff_mesh.MeshLODForm(lod_lev)
+        ilodm.set_name(name)
+        ilodm.set_cntradi(cntradi)
+        ilodm.add_vertices(verts)
+        # MeshLODForm version 12 keeps face and vertex normals in the same
+        # chunk.
+        ilodm.add_vert_normals(normals)
+        ilodm.add_fvrts(fvrts)
+        ilodm.add_faces(faces)
+        return ilodm
+
+
+class ExportModel:
+    """A model to be written to an IFF file, independent of Blender.
+
+    The collider and hardpoints must not refer to any Blender data, so that
+    the model can be sent to another process."""
+
+    def __init__(self, filename, far_chunk, collider, hardpoints):
+        self.filename = filename
+        self.far_chunk = far_chunk
+        self.collider = collider
+        self.hardpoints = hardpoints
+        self.lods = []
+
+    def add_lod(self, drange, mesh=None, **lod_args):
+        """Add a LOD, with the given LOD range.
+
+        If mesh is None, the LOD is empty. Otherwise, it is an ExportMesh,
+        and lod_args are passed to its to_lod_form method."""
+        self.lods.append((drange, mesh, lod_args))
+
+    def content_hash(self):
+        """Get a hash of everything that affects the IFF data of this model.
+
+        This is a SHA-256 hex digest of the geometry, texture numbers, light
+        flags, collider, hardpoints, LOD ranges, and conversion options of
+        this model."""
+        digest = hashlib.sha256()
+
+        def add_value(value):
+            if isinstance(value, array):
+                digest.update(repr((value.typecode, len(value))).encode())
+                digest.update(value.tobytes())
+            elif isinstance(value, ExportMesh):
+                for attr, attr_value in sorted(vars(value).items()):
+                    add_value(attr)
+                    add_value(attr_value)
+            elif isinstance(value, iff_mesh.Sphere):
+                add_value(value.to_tuple())
+            elif isinstance(value, (list, tuple)):
+                digest.update(repr((type(value).__name__, len(value)))
+                              .encode())
+                for item in value:
+                    add_value(item)
+            else:
+                digest.update(repr(value).encode())
+
+        add_value((MANIFEST_VERSION, os.path.basename(self.filename),
+                   self.far_chunk))
+        digest.update(self.collider.to_coll_form().to_bytes())
+        for hardpt in self.hardpoints:
+            digest.update(hardpt.to_chunk().to_bytes())
+        for drange, mesh, lod_args in self.lods:
+            add_value((drange, mesh, sorted(lod_args.items())))
+        return digest.hexdigest()
+
+    def to_model_iff(self):
+        "Convert this model to an iff_mesh.ModelIff."
+        modelfile = iff_mesh.ModelIff(self.filename, self.far_chunk)
+        modelfile.set_collider(self.collider)
+        for hardpt in self.hardpoints:
+            modelfile.add_hardpt(hardpt)
+
+        for lod_lev, (drange, mesh, lod_args) in enumerate(self.lods):
+            if mesh is not None:
+                ilodm = mesh.to_lod_form(lod_lev, **lod_args)
+            else:
+                ilodm = iff_mesh.EmptyLODForm(lod_lev)
+            modelfile.add_lod(ilodm, drange)
+        return modelfile
+
+
+def write_model(model, test_run=False):
+    """Convert an ExportModel to IFF data, and write it to its file.
+
+    Nothing is written if test_run is True."""
+    modelfile = model.to_model_iff()
+    if not test_run:
+        modelfile.write_file_bin()
+    return model.filename
+
+
+class ExportManifest:
+    """The content hashes of the models written to a directory.
+
+    The manifest is kept in a JSON file in the directory. For each IFF file,
+    it has the content hash of the model, and the size of the file, so that
+    a file which was modified or deleted after it was written is not
+    mistaken for an unchanged one."""
+
+    FILENAME = "export_manifest.json"
+
+    def __init__(self, directory):
+        self.filename = os.path.join(directory, self.FILENAME)
+        self.models = {}
+        try:
+            with open(self.filename, "r", encoding="utf-8") as fd:
+                manifest = json.load(fd)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            print("Could not read {}! All models will be written."
+                  .format(self.filename))
+            return
+        if (isinstance(manifest, dict) and
+                manifest.get("version") == MANIFEST_VERSION):
+            self.models = manifest.get("models", {})
+
+    @staticmethod
+    def _iff_fname(model):
+        return model.filename + ".iff"
+
+    def is_current(self, model, content_hash):
+        "Check whether the IFF file for model was written from content_hash."
+        iff_fname = self._iff_fname(model)
+        entry = self.models.get(os.path.basename(iff_fname))
+        return (entry is not None and entry[0] == content_hash and
+                os.path.isfile(iff_fname) and
+                os.path.getsize(iff_fname) == entry[1])
+
+    def update(self, model, content_hash):
+        "Record that the IFF file for model was written from content_hash."
+        iff_fname = self._iff_fname(model)
+        self.models[os.path.basename(iff_fname)] = [
+            content_hash, os.path.getsize(iff_fname)]
+
+    def save(self):
+        "Write the manifest to its file."
+        tmp_fname = "{}.{}.tmp".format(self.filename, os.getpid())
+        try:
+            with open(tmp_fname, "w", encoding="utf-8") as fd:
+                json.dump({"version": MANIFEST_VERSION, "models": self.models},
+                          fd, indent=1, sort_keys=True)
+                fd.flush()
+                os.fsync(fd.fileno())
+            os.replace(tmp_fname, self.filename)
+        except BaseException:
+            if os.path.exists(tmp_fname):
+                os.remove(tmp_fname)
+            raise
+
+
+def write_models(models, test_run=False, parallel=False, manifest=None):
+    """Write several ExportModels, with write_model.
+
+    If manifest is an ExportManifest, the models which are unchanged since
+    they were last written are skipped, and the manifest is updated and saved
+    once the others have been written, unless test_run is True. Only the
+    filenames of the models which were written are returned.
+
+    If parallel is True, and processes can be forked safely on this
+    platform, each model is written by a separate task in a pool of
+    processes. Forking is required, because Blender can't be used to start a
+    fresh Python interpreter. It is not safe on macOS, where a forked child
+    of a process using system frameworks can crash. The filenames are
+    returned in the same order as the models, and the first error, if any,
+    is raised after all of the models before it have been written."""
+    if manifest is not None:
+        num_models = len(models)
+        hashes = [model.content_hash() for model in models]
+        changed = [not manifest.is_current(model, content_hash)
+                   for model, content_hash in zip(models, hashes)]
+        models = list(compress(models, changed))
+        hashes = list(compress(hashes, changed))
+        print("{} of {} models are unchanged, and will not be written."
+              .format(num_models - len(models), num_models))
+
+    if (parallel and len(models) > 1 and sys.platform != "darwin" and
+            "fork" in multiprocessing.get_all_start_methods()):
+        try:
+            executor = ProcessPoolExecutor(
+                mp_context=multiprocessing.get_context("fork"))
+        except TypeError:
+            # Python versions older than 3.7 have no mp_context argument, and
+            # always fork if they can.
+            executor = ProcessPoolExecutor()
+        with executor:
+            fnames = list(executor.map(write_model, models, repeat(test_run)))
+    else:
+        fnames = [write_model(model, test_run) for model in models]
+
+    if manifest is not None and not test_run:
+        for model, content_hash in zip(models, hashes):
+            manifest.update(model, content_hash)
+        manifest.save()
+    return fnames
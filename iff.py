@@ -21,12 +21,20 @@
 # Classes for IFF data structures
 # See the EA IFF 85 specification here:
 # https://github.com/1fish2/IFF/tree/master/IFF docs with Commodore revisions/
-from struct import pack
-from io import StringIO
+from struct import pack, Struct, error as StructError
+from io import StringIO, BytesIO
+from itertools import starmap
+import os
 
 
 class IffForm:
-    # A FORM is an IFF data structure that can hold CHUNKs or other FORMs
+    # A FORM is an IFF data structure that can hold CHUNKs or other FORMs.
+    # The length of each FORM is cached, and kept up to date whenever its
+    # members change. A FORM or CHUNK should only be a member of one FORM at
+    # a time, since changes to its length are only passed on to its parent.
+    # FORMs and CHUNKs use __slots__, since a model can have a lot of them.
+    __slots__ = ("_name", "_members", "_parent", "_length")
+
     def __init__(self, name, members=None):
         name = name.strip()
         if len(name) == 4:  # The name of the FORM must be 4 letters long
@@ -59,6 +67,21 @@ class IffForm:
         # different members. If this is not done, all IffForm objects will have
         # the same members
         self._members = [] if members is None else members
+        self._parent = None
+        self._init_length()
+
+    @classmethod
+    def new_unchecked(cls, name, members=None):
+        """Create a FORM or CHUNK without validating its name or members.
+
+        For internal use only. name must already be a valid 4-character IFF
+        ID, and members must be a list of valid members."""
+        form = cls.__new__(cls)
+        form._name = name
+        form._members = [] if members is None else members
+        form._parent = None
+        form._init_length_unchecked()
+        return form
 
     def __str__(self):
         return "{} {!r}".format(type(self).__name__, self._name)
@@ -70,6 +93,36 @@ class IffForm:
         else:
             return 0
 
+    def _init_length(self):
+        "Calculate the length of this FORM from its initial members."
+        self._length = 4  # Account for form header/name
+        for x in self._members:
+            x._parent = self
+            self._length += x._get_size()
+
+    def _init_length_unchecked(self):
+        """Calculate the length of this FORM, assuming valid members.
+
+        _init_length does not validate the members of a FORM anyway."""
+        self._init_length()
+
+    def _get_size(self):
+        """Get the number of bytes this FORM takes up inside its parent.
+
+        This includes the header, and the padding byte, if any."""
+        return 8 + self._length + self._length % 2
+
+    def _update_length(self, delta):
+        """Change the cached length of this FORM by delta bytes.
+
+        The change in size is passed on to the parent of this FORM."""
+        old_size = self._get_size()
+        self._length += delta
+        if self._parent is not None:
+            size_delta = self._get_size() - old_size
+            if size_delta != 0:
+                self._parent._update_length(size_delta)
+
     def add_member(self, member_to_add):
         """Add a member to this FORM
 
@@ -78,18 +131,24 @@ class IffForm:
         # Only add a member if it is a CHUNK or a FORM
         if self.is_member_valid(member_to_add):
             self._members.append(member_to_add)
+            member_to_add._parent = self
+            self._update_length(member_to_add._get_size())
         else:
             raise TypeError
 
     def insert_member(self, member_to_add, pos):
         if self.is_member_valid(member_to_add):
             self._members.insert(pos, member_to_add)
+            member_to_add._parent = self
+            self._update_length(member_to_add._get_size())
         else:
             raise TypeError
 
     def remove_member(self, member_to_remove):
         """Remove a member from this FORM"""
         self._members.remove(member_to_remove)
+        member_to_remove._parent = None
+        self._update_length(-member_to_remove._get_size())
 
     def replace_member(self, member_to_replace, new_member):
         """Replace a member in this FORM with another one."""
@@ -98,33 +157,52 @@ class IffForm:
             membidx = member_to_replace
         else:
             membidx = self._members.index(member_to_replace)
+        old_member = self._members[membidx]
         self._members[membidx] = new_member
+        old_member._parent = None
+        new_member._parent = self
+        self._update_length(new_member._get_size() - old_member._get_size())
 
     def to_xmf(self):
         """Convert this FORM to an XMF (IFF Source) string"""
         xmf_string = StringIO()
-        xmf_string.write('\nFORM "%s"\n{\n' % self._name)
-        for x in self._members:
-            xmf_string.write(x.to_xmf())  # All members of a FORM are CHUNKs.
-        xmf_string.write("\n}\n")
+        self.write_xmf(xmf_string)
         return xmf_string.getvalue()
 
+    def write_xmf(self, stream):
+        """Write this FORM as XMF (IFF Source) to a text stream.
+
+        The members are written straight to the stream, one after another."""
+        stream.write('\nFORM "%s"\n{\n' % self._name)
+        for x in self._members:
+            x.write_xmf(stream)
+        stream.write("\n}\n")
+
     def to_bytes(self):
-        iffbytes = bytearray()
-        form_length = 4  # Account for form header/name
+        iffbytes = BytesIO()
+        self.write(iffbytes)
+        return iffbytes.getvalue()
+
+    def write(self, fd):
+        """Write this FORM to a seekable binary file object.
+
+        The members are written straight to the file, and the length of the
+        FORM is patched into its header afterwards, so no intermediate copies
+        of the member data are made."""
+        form_start = fd.tell()
+        fd.write(b"FORM\x00\x00\x00\x00")  # Length is patched in later
+        fd.write(self._name.encode("ascii", "replace"))
         for x in self._members:
-            iffbytes.extend(x.to_bytes())
-            form_length += 8 + x.get_length()
+            x.write(fd)
             # If the chunk contains an odd number of bytes,
             # add an extra 0-byte for padding.
-            if form_length % 2 == 1:
-                iffbytes.append(0)
-                form_length += 1
+            if (fd.tell() - form_start) % 2 == 1:
+                fd.write(b"\x00")
 
-        iffbytes = (b"FORM" + pack(">l", form_length) +
-                    self._name.encode("ascii", "replace") +
-                    iffbytes)
-        return iffbytes
+        form_end = fd.tell()
+        fd.seek(form_start + 4)
+        fd.write(pack(">l", form_end - form_start - 8))
+        fd.seek(form_end)
 
     def get_num_members(self):
         return len(self._members)
@@ -134,36 +212,38 @@ class IffForm:
 
     def clear_members(self):
         """Remove all members from this FORM"""
+        for x in self._members:
+            x._parent = None
         self._members = []
-        self._length = 4
+        self._update_length(4 - self._length)
 
     def get_length(self):
-        form_length = 4
-        for x in self._members:
-            form_length += 8 + x.get_length()
-            # If the chunk contains an odd number of bytes,
-            # add an extra 0-byte for padding.
-            if form_length % 2 == 1:
-                form_length += 1
-        return form_length
+        return self._length
 
 
 class IffChunk(IffForm):
     # A CHUNK is an IFF data structure that holds binary data,
     # such as integers, floats, or strings.
+    __slots__ = ()
 
-    def __init__(self, name, members=None):
-        super().__init__(name, members)
+    def _init_length(self):
+        "Calculate the length of this CHUNK from its initial members."
         memblength = 0
-        if members is not None and len(members) > 0:
-            for m in members:
-                membtype = self.is_member_valid(m)
-                if membtype == 1:
-                    memblength += 4  # Number
-                elif membtype == 2:
-                    memblength += len(m)  # String
+        for m in self._members:
+            membtype = self.is_member_valid(m)
+            if membtype == 1:
+                memblength += 4  # Number
+            elif membtype == 2:
+                memblength += len(m) + 1  # Null-terminated string
         self._length = memblength
 
+    def _init_length_unchecked(self):
+        """Calculate the length of this CHUNK, assuming valid members.
+
+        Numbers are 4 bytes long, and strings are null-terminated."""
+        self._length = sum(len(m) + 1 if isinstance(m, str) else 4
+                           for m in self._members)
+
     def is_member_valid(self, member):
         if (isinstance(member, int) or
                 isinstance(member, float)):
@@ -182,9 +262,9 @@ class IffChunk(IffForm):
         if membtype > 0:
             self._members.append(member_to_add)
             if membtype == 1:  # Numeric (int/float)
-                self._length += 4
+                self._update_length(4)
             elif membtype == 2:  # String
-                self._length += len(member_to_add) + 1  # Null-terminated
+                self._update_length(len(member_to_add) + 1)  # Null-terminated
         else:
             raise TypeError("Tried to add an invalid piece of data!")
 
@@ -196,10 +276,10 @@ class IffChunk(IffForm):
             self._members.insert(pos, member_to_add)
             if membtype == 1:
                 if omembtype == 2:
-                    self._length += 1
-                self._length += 4
+                    self._update_length(1)
+                self._update_length(4)
             elif membtype == 2:
-                self._length += len(member_to_add)
+                self._update_length(len(member_to_add))
         else:
             raise TypeError
 
@@ -207,9 +287,9 @@ class IffChunk(IffForm):
         """Remove a member from this FORM"""
         if (isinstance(member_to_remove, int) or
                 isinstance(member_to_remove, float)):
-            self._length -= 4
+            self._update_length(-4)
         else:
-            self._length -= len(member_to_remove)
+            self._update_length(-len(member_to_remove))
         self._members.remove(member_to_remove)
 
     def replace_member(self, member_to_replace, new_member):
@@ -232,30 +312,34 @@ class IffChunk(IffForm):
         elif old_member_type == 2:
             old_member_length = len(self._members[member_to_replace]) + 1
 
-        self._length += (new_member_length - old_member_length)
+        self._update_length(new_member_length - old_member_length)
         self._members[member_to_replace] = new_member
 
     def clear_members(self):
         """Remove all members from this FORM"""
         self._members = []
-        self._length = 0
+        self._update_length(-self._length)
 
     def to_xmf(self):
         """
         Returns an XMF string.
         """
         xmf_string = StringIO()
-        xmf_string.write('CHUNK "%s"\n{\n' % self._name)
+        self.write_xmf(xmf_string)
+        return xmf_string.getvalue()
+
+    def write_xmf(self, stream):
+        """Write this CHUNK as XMF to a text stream."""
+        xmf_lines = ['CHUNK "%s"\n{\n' % self._name]
         for x in self._members:
             if isinstance(x, int):
-                xmf_string.write("long %i" % x)
-            if isinstance(x, float):
-                xmf_string.write("float %f" % x)
-            if isinstance(x, str):
-                xmf_string.write('cstring "%s"' % x)
-            xmf_string.write("\n")
-        xmf_string.write("}")
-        return xmf_string.getvalue()
+                xmf_lines.append("long %i\n" % x)
+            elif isinstance(x, float):
+                xmf_lines.append("float %f\n" % x)
+            elif isinstance(x, str):
+                xmf_lines.append('cstring "%s"\n' % x)
+        xmf_lines.append("}")
+        stream.write("".join(xmf_lines))
 
     def to_bytes(self):
         iffbytes = bytearray()
@@ -272,11 +356,150 @@ class IffChunk(IffForm):
                     pack(">l", self._length) + iffbytes)
         return iffbytes
 
+    def write(self, fd):
+        """Write this CHUNK to a binary file object."""
+        fd.write(self.to_bytes())
+
     def get_length(self):
         return self._length
 
 
+class IffRecordChunk(IffChunk):
+    # A CHUNK made up of fixed-size records of numbers, like the VERT, FVRT,
+    # or FACE CHUNKs of a mesh. The records are packed into a bytearray as
+    # soon as they are added, rather than being kept as Python objects.
+    __slots__ = ("_struct", "_float_fields", "_data")
+
+    def __init__(self, name, record_fmt, records=None):
+        """Create a CHUNK whose members are records.
+
+        record_fmt is a struct format string (without the byte order) for a
+        single record. For example, the format of a VERT record is "fff"."""
+        self._struct = Struct("<" + record_fmt)
+        self._float_fields = tuple(
+            fmt_char in "efd" for fmt_char in record_fmt if fmt_char.isalpha())
+        self._data = bytearray()
+        super().__init__(name)
+        if records is not None:
+            self.extend(records)
+
+    def _init_length(self):
+        self._length = len(self._data)
+
+    def _pack(self, record):
+        try:
+            return self._struct.pack(*record)
+        except StructError:
+            raise TypeError("Record %r does not match the format of this "
+                            "CHUNK!" % (record,))
+
+    def is_member_valid(self, member):
+        if (isinstance(member, tuple) or isinstance(member, list)) and (
+                len(member) == len(self._float_fields)):
+            return 1
+        else:
+            return 0
+
+    def add_member(self, member_to_add):
+        """Add a record to this CHUNK"""
+        record = self._pack(member_to_add)
+        self._data.extend(record)
+        self._update_length(len(record))
+
+    def extend(self, records):
+        """Add several records to this CHUNK at once."""
+        try:
+            recdata = b"".join(starmap(self._struct.pack, records))
+        except StructError:
+            raise TypeError("The records do not match the format of this "
+                            "CHUNK!")
+        self._data.extend(recdata)
+        self._update_length(len(recdata))
+
+    def frombytes(self, recdata):
+        """Add several records, which are already packed, to this CHUNK.
+
+        recdata can be a bytes-like object, such as an array.array. The
+        numbers in recdata must be in little-endian byte order."""
+        recdata = memoryview(recdata).cast("B")
+        if len(recdata) % self._struct.size != 0:
+            raise ValueError("Length of the data must be a multiple of the "
+                             "record size!")
+        self._data.extend(recdata)
+        self._update_length(len(recdata))
+
+    def insert_member(self, member_to_add, pos):
+        """Insert a record into this CHUNK at the given record index."""
+        record = self._pack(member_to_add)
+        ofs = pos * self._struct.size
+        self._data[ofs:ofs] = record
+        self._update_length(len(record))
+
+    def remove_member(self, member_to_remove):
+        """Remove the first record with the given values from this CHUNK."""
+        member_to_remove = tuple(member_to_remove)
+        for recidx, record in enumerate(self.records()):
+            if record == member_to_remove:
+                ofs = recidx * self._struct.size
+                del self._data[ofs:ofs + self._struct.size]
+                self._update_length(-self._struct.size)
+                return
+        raise ValueError("Record %r is not in this CHUNK!" %
+                         (member_to_remove,))
+
+    def replace_member(self, member_to_replace, new_member):
+        """Replace the record at the given index with another one."""
+        if member_to_replace >= self.get_num_members():
+            raise ValueError("Record index cannot be larger than the number "
+                             "of records!")
+        ofs = member_to_replace * self._struct.size
+        self._data[ofs:ofs + self._struct.size] = self._pack(new_member)
+
+    def clear_members(self):
+        """Remove all records from this CHUNK"""
+        self._data = bytearray()
+        self._update_length(-self._length)
+
+    def get_num_members(self):
+        return len(self._data) // self._struct.size
+
+    def has_members(self):
+        return len(self._data) > 0
+
+    def get_record(self, recidx):
+        """Get the record at the given index as a tuple."""
+        return self._struct.unpack_from(self._data,
+                                        recidx * self._struct.size)
+
+    def records(self):
+        """Iterate over the records in this CHUNK as tuples."""
+        return self._struct.iter_unpack(self._data)
+
+    def write_xmf(self, stream):
+        """Write this CHUNK as XMF to a text stream.
+
+        All of the records are formatted with a single format string."""
+        record_xmf = "".join(
+            "float %f\n" if is_float else "long %i\n"
+            for is_float in self._float_fields)
+        stream.write('CHUNK "%s"\n{\n' % self._name)
+        stream.write("".join(map(record_xmf.__mod__, self.records())))
+        stream.write("}")
+
+    def to_bytes(self):
+        return (self._name.encode("ascii", "replace") +
+                pack(">l", self._length) + self._data)
+
+    def write(self, fd):
+        """Write this CHUNK to a binary file object."""
+        fd.write(self._name.encode("ascii", "replace"))
+        fd.write(pack(">l", self._length))
+        fd.write(self._data)
+
+
 class IffFile:
+    WRITE_BUFSIZE = 1 << 20  # Buffer size for write_file_bin/xmf
+
     def __init__(self, root_form=IffForm("NONE"),
                  filename="untitled"):
         if isinstance(root_form, IffForm):
@@ -297,15 +520,26 @@ class IffFile:
 
     def to_xmf(self):
         xmf_string = StringIO()
-        xmf_string.write('IFF "')
-        xmf_string.write(self.filename)
-        xmf_string.write('"\n{')
-        xmf_string.write(self.root_form.to_xmf())
-        xmf_string.write("}\n")
+        self.write_xmf(xmf_string)
         return xmf_string.getvalue()
 
+    def write_xmf(self, stream):
+        """Write this IFF file as XMF to a text stream."""
+        stream.write('IFF "')
+        stream.write(self.filename)
+        stream.write('"\n{')
+        self.root_form.write_xmf(stream)
+        stream.write("}\n")
+
     def to_bytes(self):
-        return self.root_form.to_bytes() + self.comment
+        iffbytes = BytesIO()
+        self.write(iffbytes)
+        return iffbytes.getvalue()
+
+    def write(self, fd):
+        """Write this IFF file to a seekable binary file object."""
+        self.root_form.write(fd)
+        fd.write(self.comment)
 
     def set_root_form(self, root_form):
         if isinstance(root_form, IffForm):
@@ -322,24 +556,28 @@ class IffFile:
         if isinstance(self.comment, str):
             self.comment = self.comment.encode()
 
-    def write_file_xmf(self):
-        fname = self.filename + ".xmf"
-        try:
-            fd = open(fname, "x")
-            fd.close()
-        except FileExistsError:
+    def _write_file_atomic(self, fname, mode, write_func):
+        """Write this IFF file to a temporary file, and then move it to fname.
+
+        An interrupted write leaves any existing file at fname untouched."""
+        if os.path.exists(fname):
             print("File already exists! Overwriting...")
-        fd = open(fname, "w")
-        fd.write(self.to_xmf())
-        fd.close()
+        tmp_fname = "{}.{}.tmp".format(fname, os.getpid())
+        try:
+            with open(tmp_fname, mode, buffering=self.WRITE_BUFSIZE) as fd:
+                write_func(fd)
+                # Make sure the data is on disk before the rename, so that a
+                # crash cannot leave an empty or truncated file at fname.
+                fd.flush()
+                os.fsync(fd.fileno())
+            os.replace(tmp_fname, fname)
+        except BaseException:
+            if os.path.exists(tmp_fname):
+                os.remove(tmp_fname)
+            raise
+
+    def write_file_xmf(self):
+        self._write_file_atomic(self.filename + ".xmf", "w", self.write_xmf)
 
     def write_file_bin(self):
-        fname = self.filename + ".iff"
-        try:
-            fd = open(fname, "x")
-            fd.close()
-        except FileExistsError:
-            print("File already exists! Overwriting...")
-        fd = open(fname, "wb")
-        fd.write(self.to_bytes())
-        fd.close()
+        self._write_file_atomic(self.filename + ".iff", "wb", self.write)
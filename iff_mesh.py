@@ -91,16 +91,8 @@ class Collider:
         if not isinstance(data[0], Sphere):
             raise TypeError("A collider must have a boundary sphere!")
 
-        # if ((col_type == "bsp" or col_type == "bsp+region") and
-        #         not isinstance(data[1], bsp.BSPTree)):
-        #     raise TypeError("Collider data for a BSP collider must have a "
-        #                     "sphere and a BSP tree!")
-        #
-        # if (col_type == "bsp+region" and
-        #         not isinstance(data[2], bsp.Blockmap)):
-        #     raise TypeError("Collider data for a BSP collider must have a "
-        #                     "sphere and a BSP tree!")
-
+        # NOTE: The BSP tree and blockmap layouts in bsp.py have not been
+        # checked against the game's own files yet.
         if col_type == "bsp" or col_type == "bsp+region":
             raise TypeError("BSP trees are not yet supported!")
 
@@ -137,6 +129,8 @@ class Sphere:
     Position data is represented internally in WCSO format
     (vertical Y, front/back Z)."""
 
+    __slots__ = ("x", "y", "z", "r")
+
     def __init__(self, x, y, z, r):
         self.x = float(x)
         self.y = float(y)
@@ -151,30 +145,19 @@ class Sphere:
         """Make a CNTR chunk using the data for this sphere.
 
         The RADI chunk is used in LOD meshes."""
-        cntr_chunk = iff.IffChunk("CNTR")
-        cntr_chunk.add_member(self.x)
-        cntr_chunk.add_member(self.y)
-        cntr_chunk.add_member(self.z)
-        return cntr_chunk
+        return iff.IffChunk.new_unchecked("CNTR", [self.x, self.y, self.z])
 
     def to_radi_chunk(self):
         """Make a RADI chunk using the data for this sphere.
 
         The RADI chunk is used in LOD meshes."""
-        radi_chunk = iff.IffChunk("RADI")
-        radi_chunk.add_member(self.r)
-        return radi_chunk
+        return iff.IffChunk.new_unchecked("RADI", [self.r])
 
     def to_collsphr_chunk(self):
         """Make a SPHR chunk using the data for this sphere.
 
         The SPHR chunk is used to define a Collider's boundaries."""
-        collsphr_chunk = iff.IffChunk("SPHR")
-        collsphr_chunk.add_member(self.x)
-        collsphr_chunk.add_member(self.y)
-        collsphr_chunk.add_member(self.z)
-        collsphr_chunk.add_member(self.r)
-        return collsphr_chunk
+        return iff.IffChunk.new_unchecked("SPHR", list(self.to_tuple()))
 
     def to_chunks(self):
         "Get the CNTR and RADI chunks for this Sphere."
@@ -193,6 +176,130 @@ class Sphere:
 
         return bl_obj
 
+    @staticmethod
+    def _boundary_sphere(boundary):
+        """Get the smallest sphere with all of the given points on its surface.
+
+        Returns the center and squared radius of the sphere. boundary can
+        have from 1 to 4 points."""
+        px, py, pz = boundary[0]
+        if len(boundary) == 1:
+            return (px, py, pz), 0.0
+
+        if len(boundary) == 2:
+            qx, qy, qz = boundary[1]
+            cx, cy, cz = (px + qx) / 2, (py + qy) / 2, (pz + qz) / 2
+            return (cx, cy, cz), (
+                (px - cx) ** 2 + (py - cy) ** 2 + (pz - cz) ** 2)
+
+        def cross(u, v):
+            return (u[1] * v[2] - u[2] * v[1],
+                    u[2] * v[0] - u[0] * v[2],
+                    u[0] * v[1] - u[1] * v[0])
+
+        def dot(u, v):
+            return u[0] * v[0] + u[1] * v[1] + u[2] * v[2]
+
+        def relative(point):
+            return (point[0] - px, point[1] - py, point[2] - pz)
+
+        def sphere_at(rel_center):
+            center = (rel_center[0] + px, rel_center[1] + py,
+                      rel_center[2] + pz)
+            return center, dot(rel_center, rel_center)
+
+        def smallest_enclosing(spheres):
+            # Used when the boundary points are degenerate (collinear or
+            # coplanar). Get the smallest sphere enclosing all of them.
+            enclosing = [
+                sphere for sphere in spheres
+                if all(Sphere._sphere_contains(sphere, point)
+                       for point in boundary)]
+            return min(enclosing, key=lambda sphere: sphere[1])
+
+        a = relative(boundary[1])
+        b = relative(boundary[2])
+        if len(boundary) == 3:
+            axb = cross(a, b)
+            denom = 2 * dot(axb, axb)
+            if denom <= 1e-12 * dot(a, a) * dot(b, b):
+                return smallest_enclosing([
+                    Sphere._boundary_sphere(pair) for pair in (
+                        boundary[0:2], boundary[1:3], boundary[0:3:2])])
+            numer = cross(
+                [dot(a, a) * bc - dot(b, b) * ac for ac, bc in zip(a, b)],
+                axb)
+            return sphere_at([n / denom for n in numer])
+
+        c = relative(boundary[3])
+        bxc = cross(b, c)
+        denom = 2 * dot(a, bxc)
+        if abs(denom) <= 1e-12 * (dot(a, a) * dot(b, b) * dot(c, c)) ** 0.5:
+            return smallest_enclosing([
+                Sphere._boundary_sphere([boundary[i] for i in triple])
+                for triple in ((0, 1, 2), (0, 1, 3), (0, 2, 3), (1, 2, 3))])
+        cxa = cross(c, a)
+        axb = cross(a, b)
+        aa, bb, cc = dot(a, a), dot(b, b), dot(c, c)
+        return sphere_at([
+            (aa * bxc[i] + bb * cxa[i] + cc * axb[i]) / denom
+            for i in range(3)])
+
+    @staticmethod
+    def _sphere_contains(sphere, point):
+        "Check whether a (center, squared radius) sphere contains point."
+        (cx, cy, cz), r2 = sphere
+        x, y, z = point
+        # Allow for rounding errors
+        return ((x - cx) ** 2 + (y - cy) ** 2 + (z - cz) ** 2 <=
+                r2 * (1 + 1e-9) + 1e-12)
+
+    @staticmethod
+    def from_points(points):
+        """Get the smallest Sphere which encloses all of the given points.
+
+        This uses the iterative form of Welzl's algorithm, which takes
+        expected linear time, since the points are shuffled first."""
+        import random
+
+        points = list(set(
+            (float(x), float(y), float(z)) for x, y, z in points))
+        if len(points) == 0:
+            raise ValueError("Cannot make a sphere without any points!")
+        # Always shuffle the points in the same way, so that the result is
+        # the same every time.
+        random.Random(0).shuffle(points)
+        # Starting with the extreme points on each axis gives a sphere which
+        # is close to the final one, so the outer loop restarts less often.
+        extremes = set()
+        for axis in range(3):
+            extremes.add(min(points, key=lambda point: point[axis]))
+            extremes.add(max(points, key=lambda point: point[axis]))
+        points = list(extremes) + [
+            point for point in points if point not in extremes]
+
+        def enclose(num_points, boundary):
+            """Get the smallest sphere enclosing the first num_points points
+            which has the boundary points on its surface."""
+            sphere = Sphere._boundary_sphere(boundary or points[:1])
+            (cx, cy, cz), r2 = sphere
+            max_d2 = r2 * (1 + 1e-9) + 1e-12  # Allow for rounding errors
+            for i in range(num_points):
+                x, y, z = points[i]
+                if (x - cx) ** 2 + (y - cy) ** 2 + (z - cz) ** 2 > max_d2:
+                    if len(boundary) == 3:
+                        sphere = Sphere._boundary_sphere(
+                            boundary + [points[i]])
+                    else:
+                        sphere = enclose(i, boundary + [points[i]])
+                    (cx, cy, cz), r2 = sphere
+                    max_d2 = r2 * (1 + 1e-9) + 1e-12
+            return sphere
+
+        sphere = enclose(len(points), [])
+        (x, y, z), r2 = sphere
+        return Sphere(x, y, z, r2 ** 0.5)
+
     @staticmethod
     def from_cntradi_chunks(cntr_data, radi_data):
         "Convert CNTR and RADI data to a Sphere."
@@ -223,6 +330,8 @@ class Hardpoint:
     Position data is represented internally in WCSO format
     (vertical Y, front/back Z)."""
 
+    __slots__ = ("rot_matrix", "location", "name")
+
     def __init__(self, rot_matrix, location, name):
         # rot_matrix should be a mathutils.Matrix(3x3) or compatible value
         # location should be a mathutils.Vector or compatible value
@@ -233,19 +342,14 @@ class Hardpoint:
 
     def to_chunk(self):
         "Convert this hardpoint to a HARD chunk."
-        hard_chunk = iff.IffChunk("HARD")
-        hard_chunk.add_member(self.rot_matrix[0][0])
-        hard_chunk.add_member(self.rot_matrix[0][1])
-        hard_chunk.add_member(self.rot_matrix[0][2])
-        hard_chunk.add_member(self.location[0])
-        hard_chunk.add_member(self.rot_matrix[1][0])
-        hard_chunk.add_member(self.rot_matrix[1][1])
-        hard_chunk.add_member(self.rot_matrix[1][2])
-        hard_chunk.add_member(self.location[1])
-        hard_chunk.add_member(self.rot_matrix[2][0])
-        hard_chunk.add_member(self.rot_matrix[2][1])
-        hard_chunk.add_member(self.rot_matrix[2][2])
-        hard_chunk.add_member(self.location[2])
+        hard_chunk = iff.IffChunk.new_unchecked("HARD", list(map(float, [
+            self.rot_matrix[0][0], self.rot_matrix[0][1],
+            self.rot_matrix[0][2], self.location[0],
+            self.rot_matrix[1][0], self.rot_matrix[1][1],
+            self.rot_matrix[1][2], self.location[1],
+            self.rot_matrix[2][0], self.rot_matrix[2][1],
+            self.rot_matrix[2][2], self.location[2]])))
+        # add_member accounts for the null terminator of the name
         hard_chunk.add_member(self.name)
         return hard_chunk
 
@@ -311,19 +415,30 @@ class Hardpoint:
 class MeshLODForm(iff.IffForm):
     "A LOD mesh."
 
+    # Record formats for the geometry CHUNKs
+    VERT_FMT = "fff"  # X, Y, Z (also used for VTNM and NORM)
+    FVRT_FMT = "iiff"  # Vertex index, normal index, U, V
+    FACE_FMT = "ifiiiii"  # See add_face
+
+    DEFAULT_ALT_MAT = 0x7F0096FF  # Default alternate/flat colour MAT
+
+    __slots__ = ("_version", "_mesh_form", "_geom_form", "_name_chunk",
+                 "_vert_chunk", "_norm_chunk", "_vtnm_chunk", "_fvrt_chunk",
+                 "_face_chunk", "_cntr_chunk", "_radi_chunk", "lod_lev")
+
     def __init__(self, lod_lev, version=12):
         self._version = int(version)
-        self._mesh_form = iff.IffForm("MESH")
+        self._mesh_form = iff.IffForm.new_unchecked("MESH")
         self._geom_form = iff.IffForm("{!s:0>4}".format(version))
-        self._name_chunk = iff.IffChunk("NAME")
-        self._vert_chunk = iff.IffChunk("VERT")
+        self._name_chunk = iff.IffChunk.new_unchecked("NAME")
+        self._vert_chunk = iff.IffRecordChunk("VERT", self.VERT_FMT)
         if self._version <= 11:
-            self._norm_chunk = iff.IffChunk("NORM")
-        self._vtnm_chunk = iff.IffChunk("VTNM")
-        self._fvrt_chunk = iff.IffChunk("FVRT")
-        self._face_chunk = iff.IffChunk("FACE")
-        self._cntr_chunk = iff.IffChunk("CNTR")
-        self._radi_chunk = iff.IffChunk("RADI")
+            self._norm_chunk = iff.IffRecordChunk("NORM", self.VERT_FMT)
+        self._vtnm_chunk = iff.IffRecordChunk("VTNM", self.VERT_FMT)
+        self._fvrt_chunk = iff.IffRecordChunk("FVRT", self.FVRT_FMT)
+        self._face_chunk = iff.IffRecordChunk("FACE", self.FACE_FMT)
+        self._cntr_chunk = iff.IffChunk.new_unchecked("CNTR")
+        self._radi_chunk = iff.IffChunk.new_unchecked("RADI")
         self._geom_form.add_member(self._name_chunk)
         self._geom_form.add_member(self._vert_chunk)
         self._geom_form.add_member(self._vtnm_chunk)
@@ -349,24 +464,18 @@ class MeshLODForm(iff.IffForm):
 
     def add_vertex(self, vx, vy, vz):
         "Add a vertex to this LOD mesh."
-        self._vert_chunk.add_member(float(vx))
-        self._vert_chunk.add_member(float(vy))
-        self._vert_chunk.add_member(float(vz))
+        self._vert_chunk.add_member((float(vx), float(vy), float(vz)))
 
     def add_vert_normal(self, nx, ny, nz):
         "Add a vertex normal to this LOD mesh."
-        self._vtnm_chunk.add_member(float(nx))
-        self._vtnm_chunk.add_member(float(ny))
-        self._vtnm_chunk.add_member(float(nz))
+        self._vtnm_chunk.add_member((float(nx), float(ny), float(nz)))
 
     def add_face_normal(self, nx, ny, nz):
         "Add a face normal to this LOD mesh."
         if self._version >= 12:
             self.add_vert_normal(nx, ny, nz)
         else:
-            self._norm_chunk.add_member(float(nx))
-            self._norm_chunk.add_member(float(ny))
-            self._norm_chunk.add_member(float(nz))
+            self._norm_chunk.add_member((float(nx), float(ny), float(nz)))
 
     def add_fvrt(self, vert_idx, vtnm_idx, uv_x, uv_y):
         """Add a "face vertex" to this LOD mesh.
@@ -379,13 +488,11 @@ class MeshLODForm(iff.IffForm):
         if vtnm_idx < 0:
             raise ValueError("Vertex normal index must not be negative!")
 
-        self._fvrt_chunk.add_member(int(vert_idx))
-        self._fvrt_chunk.add_member(int(vtnm_idx))
-        self._fvrt_chunk.add_member(float(uv_x))
-        self._fvrt_chunk.add_member(float(uv_y))
+        self._fvrt_chunk.add_member(
+            (int(vert_idx), int(vtnm_idx), float(uv_x), float(uv_y)))
 
     def add_face(self, norm_idx, dplane, texnum,
-                 fvrt_idx, num_verts, light_flags, alt_mat=0x7F0096FF):
+                 fvrt_idx, num_verts, light_flags, alt_mat=DEFAULT_ALT_MAT):
         """Add a face to this LOD mesh."""
         if norm_idx < 0:
             raise ValueError("Face normal index must not be negative!")
@@ -394,13 +501,123 @@ class MeshLODForm(iff.IffForm):
         if num_verts < 0:
             raise ValueError("Number of vertices must not be negative!")
 
-        self._face_chunk.add_member(int(norm_idx))
-        self._face_chunk.add_member(float(dplane))  # D-Plane
-        self._face_chunk.add_member(int(texnum))  # Texture number
-        self._face_chunk.add_member(int(fvrt_idx))  # Index of first FVRT
-        self._face_chunk.add_member(int(num_verts))  # Number of vertices/edges
-        self._face_chunk.add_member(int(light_flags))  # Lighting flags
-        self._face_chunk.add_member(int(alt_mat))  # Alternate/flat colour MAT
+        self._face_chunk.add_member((
+            int(norm_idx),
+            float(dplane),  # D-Plane
+            int(texnum),  # Texture number
+            int(fvrt_idx),  # Index of first FVRT
+            int(num_verts),  # Number of vertices/edges
+            int(light_flags),  # Lighting flags
+            int(alt_mat)  # Alternate/flat colour MAT
+        ))
+
+    @staticmethod
+    def _record_view(records):
+        """Get a memoryview of packed records, or None for other records.
+
+        Every field of a mesh record is 4 bytes long, so the items of a
+        bytes-like object must be bytes or 4-byte numbers. This rejects, for
+        example, a float64 NumPy array, which would otherwise be read as
+        garbage records."""
+        try:
+            recdata = memoryview(records)
+        except TypeError:  # Not a bytes-like object
+            return None
+        if recdata.itemsize != 1 and recdata.itemsize != 4:
+            raise TypeError("Packed records must consist of bytes or 4-byte "
+                            "numbers!")
+        if not recdata.c_contiguous:  # A strided array slice, for example
+            recdata = memoryview(recdata.tobytes())
+        return recdata.cast("B")
+
+    @classmethod
+    def _add_records(cls, chunk, records):
+        "Add records, or a bytes-like object of packed records, to chunk."
+        recdata = cls._record_view(records)
+        if recdata is None:
+            chunk.extend(records)
+        else:
+            chunk.frombytes(recdata)
+
+    @classmethod
+    def _record_seq(cls, records):
+        """Get records in a form which can be read more than once.
+
+        Bytes-like objects are returned as a memoryview of their bytes, and
+        anything else, like a generator, is converted to a list."""
+        recdata = cls._record_view(records)
+        return list(records) if recdata is None else recdata
+
+    @classmethod
+    def _min_fields(cls, records, num_fields, fields):
+        """Get the smallest value of each of the given integer fields.
+
+        records is either a sequence of records, or a bytes-like object of
+        packed records, where each field is 4 bytes long."""
+        recdata = cls._record_view(records)
+        if recdata is None:
+            return [min((record[field] for record in records), default=0)
+                    for field in fields]
+        if len(recdata) % (num_fields * 4) != 0:
+            raise ValueError("Length of the data must be a multiple of the "
+                             "record size!")
+        recdata = recdata.cast("i")
+        return [min(recdata[field::num_fields], default=0)
+                for field in fields]
+
+    def add_vertices(self, verts):
+        """Add several vertices to this LOD mesh at once.
+
+        verts can be a sequence of (x, y, z) tuples, or a bytes-like object,
+        like an array.array("f"), with the coordinates of each vertex."""
+        self._add_records(self._vert_chunk, verts)
+
+    def add_vert_normals(self, norms):
+        """Add several vertex normals to this LOD mesh at once.
+
+        norms can be in any of the formats accepted by add_vertices."""
+        self._add_records(self._vtnm_chunk, norms)
+
+    def add_face_normals(self, norms):
+        """Add several face normals to this LOD mesh at once.
+
+        norms can be in any of the formats accepted by add_vertices."""
+        if self._version >= 12:
+            self.add_vert_normals(norms)
+        else:
+            self._add_records(self._norm_chunk, norms)
+
+    def add_fvrts(self, fvrts):
+        """Add several "face vertices" to this LOD mesh at once.
+
+        fvrts can be a sequence of (vert_idx, vtnm_idx, uv_x, uv_y) tuples, or
+        a bytes-like object with the packed little-endian FVRT records."""
+        fvrts = self._record_seq(fvrts)
+        min_vert_idx, min_vtnm_idx = self._min_fields(fvrts, 4, (0, 1))
+        if min_vert_idx < 0:
+            raise ValueError("Vertex index must not be negative!")
+        if min_vtnm_idx < 0:
+            raise ValueError("Vertex normal index must not be negative!")
+
+        self._add_records(self._fvrt_chunk, fvrts)
+
+    def add_faces(self, faces):
+        """Add several faces to this LOD mesh at once.
+
+        faces can be a sequence of tuples with the arguments to add_face
+        (including alt_mat), or a bytes-like object with the packed
+        little-endian FACE records."""
+        faces = self._record_seq(faces)
+        min_norm_idx, min_fvrt_idx, min_num_verts = self._min_fields(
+            faces, 7, (0, 3, 4))
+        if min_norm_idx < 0:
+            raise ValueError("Face normal index must not be negative!")
+        if min_fvrt_idx < 0:
+            raise ValueError("FVRT index must not be negative!")
+        if min_num_verts < 0:
+            raise ValueError("Number of vertices must not be negative!")
+
+        self._add_records(self._face_chunk, faces)
 
     def set_cntradi(self, sphere):
         "Set the center and radius of this LOD mesh."
@@ -421,10 +638,12 @@ class MeshLODForm(iff.IffForm):
 class EmptyLODForm(iff.IffForm):
     "An empty LOD. (no geometry)"
 
+    __slots__ = ("lod_lev",)
+
     def __init__(self, lod_lev):
         self.lod_lev = lod_lev
 
-        empty_form = iff.IffForm("EMPT")
+        empty_form = iff.IffForm.new_unchecked("EMPT")
         form_name = "{!s:0>4}".format(lod_lev)
         super().__init__(form_name, [empty_form])
 
@@ -22,17 +22,34 @@
 from os.path import exists as fexists
 from struct import unpack
 from io import BytesIO
+import mmap
 
 
 class IffReader:
 
     _iff_heads = (b"FORM", b"CAT ", b"LIST")
 
-    def __init__(self, iff_file):
+    def __init__(self, iff_file, use_mmap=False):
+        """Read an IFF file, or IFF data in a bytes or bytearray object.
+
+        If use_mmap is True, the file is memory-mapped, and the data of each
+        CHUNK is returned as a memoryview into the mapping instead of being
+        copied into a new bytes object. These memoryviews can be used until
+        the reader is closed."""
+        self._iff_fd = None  # File object backing the memory map
+        self._iff_view = None  # memoryview of the entire file or data
         if isinstance(iff_file, str):
-            self._iff_file = open(iff_file, "rb")
+            if use_mmap:
+                self._iff_fd = open(iff_file, "rb")
+                self._iff_file = mmap.mmap(
+                    self._iff_fd.fileno(), 0, access=mmap.ACCESS_READ)
+                self._iff_view = memoryview(self._iff_file)
+            else:
+                self._iff_file = open(iff_file, "rb")
         elif isinstance(iff_file, bytes) or isinstance(iff_file, bytearray):
             self._iff_file = BytesIO(iff_file)
+            if use_mmap:
+                self._iff_view = memoryview(iff_file)
 
     def id_isvalid(self, iffid):
         if len(iffid) != 4:
@@ -120,7 +137,7 @@ class IffReader:
         elif self.id_isvalid(head):
             name = head
             length = unpack(">i", self._iff_file.read(4))[0]
-            data = self._iff_file.read(length)
+            data = self._read_chunk_data(self._iff_file.tell(), length)
 
             # IFF Chunks and FORMs are aligned at even offsets
             if self._iff_file.tell() % 2 == 1:
@@ -140,5 +157,185 @@ class IffReader:
             raise TypeError("Tried to read an invalid IFF file!")
         return None  # Shouldn't be reachable
 
+    def _read_chunk_data(self, offset, length):
+        "Read length bytes of CHUNK data at the given offset."
+        if self._iff_view is not None:
+            data = self._iff_view[offset:offset + length]
+            self._iff_file.seek(offset + len(data))
+        else:
+            self._iff_file.seek(offset)
+            data = self._iff_file.read(length)
+        return data
+
+    def walk(self):
+        """Walk through the FORMs and CHUNKs of this IFF file.
+
+        This is a generator which yields an IffEvent when it enters a FORM,
+        finds a CHUNK, or leaves a FORM. CHUNK data is only read if the
+        data() or read() method of the CHUNK event is called, and the members
+        of a FORM are skipped if the skip() method of its "enter" event is
+        called."""
+        self._iff_file.seek(0, 2)
+        file_end = self._iff_file.tell()
+        self._iff_file.seek(0)
+        forms = []  # "enter" events of the enclosing FORMs
+        started = False
+
+        while True:
+            pos = self._iff_file.tell()
+            while len(forms) > 0 and pos >= forms[-1].end:
+                yield forms.pop().exit_event()
+            if len(forms) == 0 and started:
+                break  # Anything after the root FORM is not IFF data.
+            started = True
+            if pos + 8 > file_end:
+                # A FORM or CHUNK header was cut off.
+                raise TypeError("Tried to read an invalid IFF file!")
+
+            head = self._iff_file.read(4)
+            length = unpack(">i", self._iff_file.read(4))[0]
+            parent_path = forms[-1].path + "/" if len(forms) > 0 else ""
+
+            if head in self._iff_heads:
+                name = self._iff_file.read(4)
+                event = IffEvent(self, "enter", name, length, pos,
+                                 len(forms), parent_path)
+                yield event
+                if event.skipped:
+                    self._iff_file.seek(event.end)
+                else:
+                    self._iff_file.seek(pos + 12)
+                forms.append(event)
+            elif self.id_isvalid(head):
+                event = IffEvent(self, "chunk", head, length, pos,
+                                 len(forms), parent_path)
+                yield event
+                self._iff_file.seek(event.end)
+            else:
+                raise TypeError("Tried to read an invalid IFF file!")
+
+        while len(forms) > 0:
+            yield forms.pop().exit_event()
+
+    def build_index(self):
+        """Index every FORM and CHUNK in this IFF file in one pass.
+
+        The CHUNK data is skipped rather than read. Returns an IffIndex."""
+        index = IffIndex()
+        for event in self.walk():
+            if event.kind == "enter":
+                index.add_entry("form", event.name, event.length,
+                                event.offset, event.path)
+            elif event.kind == "chunk":
+                index.add_entry("chunk", event.name, event.length,
+                                event.offset, event.path)
+        self._iff_file.seek(0)
+        return index
+
+    def read_entry(self, entry):
+        """Read the FORM or CHUNK at the position given by an index entry.
+
+        Returns the same data as read_data."""
+        self._iff_file.seek(entry["offset"])
+        return self.read_data()
+
     def close(self):
-        self._iff_file.close()
+        if self._iff_view is not None:
+            self._iff_view.release()
+            self._iff_view = None
+        try:
+            self._iff_file.close()
+        except BufferError:
+            # Some of the CHUNK data is still in use. The memory map will be
+            # closed once it is no longer referenced.
+            pass
+        if self._iff_fd is not None:
+            self._iff_fd.close()
+
+
+class IffIndex:
+    """The offset, length, and type of every FORM and CHUNK in an IFF file.
+
+    Each FORM or CHUNK has a path made of the names of the FORMs it is in,
+    followed by its own name, separated by slashes. Trailing spaces are
+    removed from the names. For example, the FACE CHUNK of LOD 0 of a mesh
+    has the path "DETA/MESH/0000/MESH/0012/FACE"."""
+
+    def __init__(self):
+        self.entries = []  # All FORMs and CHUNKs, in file order.
+        self._paths = {}  # Path -> entries with that path.
+        self._children = {}  # Path -> entries inside the FORM(s) at path.
+
+    def add_entry(self, iff_type, name, length, offset, path):
+        """Add a FORM or CHUNK with the given path to this index."""
+        entry = {
+            "type": iff_type,
+            "length": length,
+            "name": name,
+            "offset": offset,
+            "path": path
+        }
+        self.entries.append(entry)
+        self._paths.setdefault(path, []).append(entry)
+        parent_path = path.rpartition("/")[0]
+        self._children.setdefault(parent_path, []).append(entry)
+        return entry
+
+    def find(self, path):
+        """Get the first FORM or CHUNK with the given path, or None."""
+        entries = self._paths.get(path.strip("/"))
+        return entries[0] if entries else None
+
+    def find_all(self, path):
+        """Get every FORM or CHUNK with the given path."""
+        return self._paths.get(path.strip("/"), [])
+
+    def children(self, path):
+        """Get the members of the FORM(s) with the given path."""
+        return self._children.get(path.strip("/"), [])
+
+
+class IffEvent:
+    """A FORM or CHUNK found by IffReader.walk().
+
+    kind is "enter" or "exit" for a FORM, and "chunk" for a CHUNK. depth is
+    the number of FORMs the FORM or CHUNK is in, and path is the same as the
+    path used by IffIndex."""
+
+    def __init__(self, reader, kind, name, length, offset, depth,
+                 parent_path=""):
+        self._reader = reader
+        self.kind = kind
+        self.name = name
+        self.length = length  # Length, not including header and padding
+        self.offset = offset  # Offset of the header
+        self.depth = depth
+        self.path = parent_path + name.decode("ascii", "replace").rstrip(" ")
+        # Offset of the next FORM or CHUNK
+        self.end = offset + 8 + length + length % 2
+        self.skipped = False
+
+    def exit_event(self):
+        "Get the corresponding \"exit\" event for an \"enter\" event."
+        event = IffEvent(self._reader, "exit", self.name, self.length,
+                         self.offset, self.depth)
+        event.path = self.path
+        event.skipped = self.skipped
+        return event
+
+    def data(self):
+        "Read the data of this CHUNK, not including the padding byte."
+        if self.kind != "chunk":
+            raise TypeError("Only CHUNKs have data!")
+        return self._reader._read_chunk_data(self.offset + 8, self.length)
+
+    def read(self):
+        "Read this FORM or CHUNK, and return the same data as read_data."
+        self._reader._iff_file.seek(self.offset)
+        return self._reader.read_data()
+
+    def skip(self):
+        "Skip the members of this FORM."
+        if self.kind != "enter":
+            raise TypeError("Only FORMs can be skipped!")
+        self.skipped = True
@@ -534,7 +534,7 @@ class IFFImporter(ImportBackend):
         return cstring.decode("iso-8859-1")
 
     def load(self):
-        self.iff_reader = iff_read.IffReader(self.mfilepath)
+        self.iff_reader = iff_read.IffReader(self.mfilepath, True)
         root_form = self.iff_reader.read_data()
         if root_form["type"] == "form":
             print("Root form is:", root_form["name"])
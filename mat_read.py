@@ -32,7 +32,7 @@ class MATReader:
 
     def __init__(self, matfpath):
         self.matfpath = matfpath
-        self.iff_reader = iff_read.IffReader(matfpath)
+        self.iff_reader = iff_read.IffReader(matfpath, True)
         self.palette = None  # To be initialized in read_palette
         self.pixels = None  # To be initialized in read_info
 
@@ -70,7 +70,8 @@ class MATReader:
             self.palette = array.array("B", cmap_chunk["data"])
             return self.palette
         elif cmap_chunk["name"] == b"NAME":
-            palname = cmap_chunk["data"].decode("ascii").strip(" \x00\t")
+            palname = bytes(cmap_chunk["data"]).decode("ascii").strip(
+                " \x00\t")
             palname = palname.lower() + ".pal"
             palpath = self.look_for(palname, "pal")
             if palpath is not None:
@@ -90,7 +91,7 @@ class MATReader:
     def read_pxls(self, pxls_chunk):
         self.pixels = array.array(
             'B', [0 for x in range(self.img_width * self.img_height * 4)])
-        palpixels = array.array("B", pxls_chunk["data"])
+        palpixels = pxls_chunk["data"]  # Indexing gives an int either way
 
         def modify_pixels(start, end):
             # One byte references a colour in the palette
@@ -122,7 +123,7 @@ class MATReader:
     def read_pxls_flipped(self, pxls_chunk):
         self.pixels = array.array(
             'B', [0 for x in range(self.img_width * self.img_height * 4)])
-        palpixels = array.array("B", pxls_chunk["data"])
+        palpixels = pxls_chunk["data"]
 
         def modify_rows(start_row, end_row):
             # For reader threads
@@ -162,41 +163,38 @@ class MATReader:
                 "<B", alph_chunk["data"], apxl)[0])
 
     def read(self, blender=False):
-        root_form = self.iff_reader.read_data()
-        if root_form["name"] == b"BITM":
-            inner_rform = self.iff_reader.read_data()
-            if inner_rform["name"] == b"FRAM":
-                inner_rform_read = 4
+        events = self.iff_reader.walk()
+        root_form = next(events)
+        if root_form.name == b"BITM":
+            inner_rform = next(events)
+            if inner_rform.name == b"FRAM":
 
-                while inner_rform_read < inner_rform["length"]:
+                for mat_data in events:
+                    if mat_data.path == "BITM/FRAM/INFO":
+                        self.read_info(mat_data.read())
 
-                    mat_data = self.iff_reader.read_data()
-                    if (mat_data["type"] == "chunk" and
-                            mat_data["name"] == b"INFO"):
-                        self.read_info(mat_data)
+                    elif mat_data.path in ("BITM/FRAM/PAL/CMAP",
+                                           "BITM/FRAM/PAL/NAME"):
+                        self.read_palette(mat_data.read())
 
-                    elif (mat_data["type"] == "form" and
-                            mat_data["name"] == b"PAL "):
-                        self.read_palette(self.iff_reader.read_data())
-
-                    elif (mat_data["type"] == "chunk" and
-                            mat_data["name"] == b"PXLS"):
+                    elif mat_data.path == "BITM/FRAM/PXLS":
                         if blender:
-                            self.read_pxls_flipped(mat_data)
+                            self.read_pxls_flipped(mat_data.read())
                         else:
-                            self.read_pxls(mat_data)
+                            self.read_pxls(mat_data.read())
 
-                    elif (mat_data["type"] == "chunk" and
-                            mat_data["name"] == b"ALPH"):
-                        self.read_alph(mat_data)
+                    elif mat_data.path == "BITM/FRAM/ALPH":
+                        self.read_alph(mat_data.read())
 
-                    inner_rform_read += mat_data["length"] + 8
+                    elif (mat_data.kind == "enter" and
+                            mat_data.name != b"PAL "):
+                        mat_data.skip()
             else:
                 raise TypeError("Invalid texture! (root form is {})".format(
-                                inner_rform["name"]))
+                                inner_rform.name))
         else:
             raise TypeError("Invalid texture! (root form is {})".format(
-                            root_form["name"]))
+                            root_form.name))
         self.iff_reader.close()
 
     def flip_y(self):
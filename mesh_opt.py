@@ -0,0 +1,469 @@
+# -*- coding: utf8 -*-
+# Blender WCP IFF mesh import/export script by Kevin Caccamo
+# Copyright © 2013-2016 Kevin Caccamo
+# E-mail: kevin@ciinet.org
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# <pep8-80 compliant>
+
+# Optimizations for the geometry of exported LODs.
+#
+# The functions in this module work on the VERT, VTNM, FVRT, and FACE records
+# of a LOD, as they are given to iff_mesh.MeshLODForm: verts and normals are
+# lists of (x, y, z) tuples, fvrts is a list of (vert_idx, vtnm_idx, uv_x,
+# uv_y) tuples, and faces is a list of (vtnm_idx, dplane, texnum, fvrt_idx,
+# num_verts, light_flags, alt_mat) tuples.
+import array
+from collections import OrderedDict
+from math import floor, sin, sqrt
+
+# Size of the simulated post-transform vertex cache
+CACHE_SIZE = 32
+
+# Vertex scoring constants for the vertex cache optimizer. These are the
+# values suggested by Tom Forsyth in "Linear-Speed Vertex Cache
+# Optimisation".
+CACHE_DECAY_POWER = 1.5
+LAST_FACE_SCORE = 0.75
+VALENCE_BOOST_SCALE = 2.0
+VALENCE_BOOST_POWER = 0.5
+
+
+def face_verts(fvrts, faces):
+    "Get the vertex indices of each face, as a list of tuples."
+    return [tuple(fvrts[fvrt_idx][0]
+                  for fvrt_idx in range(face[3], face[3] + face[4]))
+            for face in faces]
+
+
+def cache_misses(polys, cache_size=CACHE_SIZE):
+    """Count the vertex cache misses for drawing polygons in the given order.
+
+    The cache is simulated as a FIFO, like the post-transform vertex cache
+    of most graphics hardware."""
+    cache = []
+    cached = set()
+    misses = 0
+    for poly in polys:
+        for vidx in poly:
+            if vidx not in cached:
+                misses += 1
+                cache.append(vidx)
+                cached.add(vidx)
+                if len(cache) > cache_size:
+                    cached.discard(cache.pop(0))
+    return misses
+
+
+def acmr(polys, cache_size=CACHE_SIZE):
+    """Get the average cache miss ratio (cache misses per triangle) for
+    drawing polygons in the given order."""
+    num_tris = sum(len(poly) - 2 for poly in polys)
+    if num_tris <= 0:
+        return 0.0
+    return cache_misses(polys, cache_size) / num_tris
+
+
+def order_polys(polys, cache_size=CACHE_SIZE):
+    """Find an order for drawing polygons which uses the vertex cache well.
+
+    This is Tom Forsyth's "Linear-Speed Vertex Cache Optimisation"
+    algorithm, adapted to polygons. Returns a list of polygon indices."""
+    num_polys = len(polys)
+    if num_polys == 0:
+        return []
+    num_verts = max(vidx for poly in polys for vidx in poly) + 1
+
+    vert_polys = [[] for vidx in range(num_verts)]
+    for pidx, poly in enumerate(polys):
+        for vidx in poly:
+            vert_polys[vidx].append(pidx)
+
+    cache_scores = [LAST_FACE_SCORE] * 3 + [
+        (1.0 - (pos - 3) / (cache_size - 3)) ** CACHE_DECAY_POWER
+        for pos in range(3, cache_size)]
+    valence_scores = {}
+
+    def vert_score(pos, valence):
+        if valence == 0:
+            return -1.0
+        valence_score = valence_scores.get(valence)
+        if valence_score is None:
+            valence_score = VALENCE_BOOST_SCALE * (
+                valence ** -VALENCE_BOOST_POWER)
+            valence_scores[valence] = valence_score
+        if pos < 0:
+            return valence_score
+        return cache_scores[pos] + valence_score
+
+    cache_pos = [-1] * num_verts
+    vert_scores = [vert_score(-1, len(vpolys)) for vpolys in vert_polys]
+    poly_scores = [sum(vert_scores[vidx] for vidx in poly) for poly in polys]
+    added = [False] * num_polys
+
+    order = []
+    cache = []
+    next_poly = 0  # Used to find a polygon when the cache has none left.
+    best = max(range(num_polys), key=poly_scores.__getitem__)
+    while best is not None:
+        order.append(best)
+        added[best] = True
+        poly = polys[best]
+        for vidx in poly:
+            vert_polys[vidx].remove(best)
+
+        # The vertices of the polygon go to the front of the cache, and the
+        # vertices at the back of the cache are pushed out of it.
+        poly_set = set(poly)
+        new_cache = list(OrderedDict.fromkeys(poly))
+        new_cache.extend(vidx for vidx in cache if vidx not in poly_set)
+        changed = new_cache
+        cache = new_cache[:cache_size]
+        for vidx in new_cache[cache_size:]:
+            cache_pos[vidx] = -1
+        for pos, vidx in enumerate(cache):
+            cache_pos[vidx] = pos
+
+        for vidx in changed:
+            score = vert_score(cache_pos[vidx], len(vert_polys[vidx]))
+            delta = score - vert_scores[vidx]
+            if delta != 0.0:
+                vert_scores[vidx] = score
+                for pidx in vert_polys[vidx]:
+                    poly_scores[pidx] += delta
+
+        best = None
+        best_score = None
+        for vidx in cache:
+            for pidx in vert_polys[vidx]:
+                if best_score is None or poly_scores[pidx] > best_score:
+                    best = pidx
+                    best_score = poly_scores[pidx]
+
+        if best is None:
+            while next_poly < num_polys and added[next_poly]:
+                next_poly += 1
+            if next_poly < num_polys:
+                best = next_poly
+    return order
+
+
+def reorder_lod(verts, normals, fvrts, faces, cache_size=CACHE_SIZE):
+    """Reorder the faces of a LOD to make it faster to draw.
+
+    Faces are grouped by texture number, so the texture is switched as few
+    times as possible. The faces of each group are put in an order which
+    uses the vertex cache well (see order_polys). The FVRTs are rewritten in
+    the new face order, and the vertices and normals are renumbered in the
+    order they are first used. Vertices and normals which are not used are
+    removed.
+
+    Returns new (verts, normals, fvrts, faces) lists."""
+    polys = face_verts(fvrts, faces)
+    texnum_faces = OrderedDict()
+    for face_idx, face in enumerate(faces):
+        texnum_faces.setdefault(face[2], []).append(face_idx)
+
+    order = []
+    for tx_faces in texnum_faces.values():
+        tx_order = order_polys([polys[face_idx] for face_idx in tx_faces],
+                               cache_size)
+        order.extend(tx_faces[pidx] for pidx in tx_order)
+
+    vert_map = {}  # Old vertex index -> new vertex index
+    norm_map = {}  # Old normal index -> new normal index
+    new_fvrts = []
+    new_faces = []
+    for face_idx in order:
+        face = faces[face_idx]
+        face_norm = norm_map.setdefault(face[0], len(norm_map))
+        first_fvrt = len(new_fvrts)
+        for vert_idx, vtnm_idx, uv_x, uv_y in fvrts[face[3]:face[3] + face[4]]:
+            new_fvrts.append((vert_map.setdefault(vert_idx, len(vert_map)),
+                              norm_map.setdefault(vtnm_idx, len(norm_map)),
+                              uv_x, uv_y))
+        new_faces.append((face_norm, face[1], face[2], first_fvrt) +
+                         tuple(face[4:]))
+
+    new_verts = [None] * len(vert_map)
+    for old_idx, new_idx in vert_map.items():
+        new_verts[new_idx] = verts[old_idx]
+    new_normals = [None] * len(norm_map)
+    for old_idx, new_idx in norm_map.items():
+        new_normals[new_idx] = normals[old_idx]
+
+    return new_verts, new_normals, new_fvrts, new_faces
+
+
+def weld_points(points, epsilon):
+    """Merge points which are at most epsilon apart.
+
+    Each point is merged into the first point before it that is close enough,
+    if there is one. The points are hashed into a grid of cubes with sides of
+    length epsilon, so only the points in the 27 cubes around each point
+    need to be checked. If epsilon is 0, only identical points are merged.
+
+    Returns a (merged_points, point_map) tuple, where point_map is a list of
+    the index of each point in merged_points."""
+    merged_points = []
+    point_map = []
+    if epsilon <= 0.0:
+        point_idxs = {}
+        for point in points:
+            point = tuple(point)
+            point_idx = point_idxs.get(point)
+            if point_idx is None:
+                point_idx = point_idxs[point] = len(merged_points)
+                merged_points.append(point)
+            point_map.append(point_idx)
+        return merged_points, point_map
+
+    max_dist = epsilon * epsilon
+    cells = {}  # Grid cell -> indices of merged points in that cell
+    for x, y, z in points:
+        cx, cy, cz = (int(floor(x / epsilon)), int(floor(y / epsilon)),
+                      int(floor(z / epsilon)))
+        point_idx = None
+        for nx in (cx - 1, cx, cx + 1):
+            for ny in (cy - 1, cy, cy + 1):
+                for nz in (cz - 1, cz, cz + 1):
+                    for other_idx in cells.get((nx, ny, nz), ()):
+                        ox, oy, oz = merged_points[other_idx]
+                        if ((x - ox) ** 2 + (y - oy) ** 2 +
+                                (z - oz) ** 2 <= max_dist):
+                            if point_idx is None or other_idx < point_idx:
+                                point_idx = other_idx
+        if point_idx is None:
+            point_idx = len(merged_points)
+            merged_points.append((x, y, z))
+            cells.setdefault((cx, cy, cz), []).append(point_idx)
+        point_map.append(point_idx)
+    return merged_points, point_map
+
+
+def pool_normals(normals, tolerance, face_refs, fvrt_refs):
+    """Merge normals which point in nearly the same direction.
+
+    normals is a sequence of (x, y, z) unit vectors, and face_refs and
+    fvrt_refs are the indices in normals of the normal of each face and
+    each FVRT. Normals are merged if the angle between them is at most
+    tolerance (in radians). If tolerance is 0, only normals which are the
+    same at single precision (as they are written to the VTNM chunk) are
+    merged.
+
+    Returns a (pooled_normals, face_idxs, fvrt_idxs) tuple, where face_idxs
+    and fvrt_idxs are array.array("i")s with the index in pooled_normals of
+    the normal of each face and FVRT."""
+    coords = array.array("f", [coord for normal in normals
+                               for coord in normal])
+    normals = list(zip(coords[0::3], coords[1::3], coords[2::3]))
+    # Two unit vectors are this far apart when the angle between them is
+    # tolerance.
+    pooled_normals, norm_map = weld_points(normals, 2 * sin(tolerance / 2))
+    return (pooled_normals,
+            array.array("i", [norm_map[ref] for ref in face_refs]),
+            array.array("i", [norm_map[ref] for ref in fvrt_refs]))
+
+
+def poly_plane(verts, poly):
+    """Get the plane of a polygon as a (nx, ny, nz, d) tuple.
+
+    The normal is calculated using Newell's method, and d is the D-Plane, as
+    calculated by face_planes, but for the centroid of the polygon rather
+    than its first vertex. Returns None if the polygon is
+    degenerate."""
+    nx = ny = nz = 0.0
+    cx = cy = cz = 0.0
+    prev_x, prev_y, prev_z = verts[poly[-1]]
+    for vidx in poly:
+        x, y, z = verts[vidx]
+        nx += (prev_y - y) * (prev_z + z)
+        ny += (prev_z - z) * (prev_x + x)
+        nz += (prev_x - x) * (prev_y + y)
+        cx += x
+        cy += y
+        cz += z
+        prev_x, prev_y, prev_z = x, y, z
+    nlen = sqrt(nx * nx + ny * ny + nz * nz)
+    if nlen == 0.0:
+        return None
+    nx /= nlen
+    ny /= nlen
+    nz /= nlen
+    num_verts = len(poly)
+    return (nx, ny, nz,
+            -(nx * cx + ny * cy + nz * cz) / num_verts)
+
+
+def poly_area(coords):
+    "Get the area of a polygon, given its vertex coordinates."
+    nx = ny = nz = 0.0
+    prev_x, prev_y, prev_z = coords[-1]
+    for x, y, z in coords:
+        nx += (prev_y - y) * (prev_z + z)
+        ny += (prev_z - z) * (prev_x + x)
+        nz += (prev_x - x) * (prev_y + y)
+        prev_x, prev_y, prev_z = x, y, z
+    return sqrt(nx * nx + ny * ny + nz * nz) / 2
+
+
+def face_planes(verts, fvrt_verts, first_fvrts, num_verts, normals=None,
+                planar_eps=None):
+    """Calculate the normals and D-Planes of several faces.
+
+    verts is a sequence of (x, y, z) vertex coordinates, and fvrt_verts is
+    a sequence of the vertex index of each FVRT. first_fvrts and num_verts
+    are sequences of the index of the first FVRT, and the number of FVRTs,
+    of each face.
+
+    If normals, a sequence of the normal of each face, is not given, the
+    normals are calculated using Newell's method. If it is given, and
+    planar_eps is not None, the normals of polygons which have a vertex more
+    than planar_eps away from their plane are recalculated using Newell's
+    method, which gives the best fitting normal for non-planar polygons.
+
+    The D-Plane is used by the VISION engine for backface culling, and it is
+    calculated using the first vertex of the face. Thanks to gr1mre4per
+    from CIC for the algorithm!
+
+    Returns a (normals, dplanes) tuple of lists."""
+    face_normals = []
+    dplanes = []
+    for face_idx, (first_fvrt, face_verts) in enumerate(
+            zip(first_fvrts, num_verts)):
+        poly = fvrt_verts[first_fvrt:first_fvrt + face_verts]
+        fx, fy, fz = verts[poly[0]]
+        normal = None
+        if normals is not None:
+            normal = nx, ny, nz = tuple(normals[face_idx])
+            if planar_eps is not None and face_verts > 3:
+                dplane = -(nx * fx + ny * fy + nz * fz)
+                for vidx in poly:
+                    x, y, z = verts[vidx]
+                    if abs(nx * x + ny * y + nz * z + dplane) > planar_eps:
+                        normal = None
+                        break
+        if normal is None:
+            plane = poly_plane(verts, poly)
+            normal = (0.0, 0.0, 0.0) if plane is None else plane[:3]
+        nx, ny, nz = normal
+        face_normals.append(normal)
+        dplanes.append(-(nx * fx + ny * fy + nz * fz))
+    return face_normals, dplanes
+
+
+def face_dplane(verts, normals, face, first_vert):
+    "Calculate the D-Plane of a face, given the index of its first vertex."
+    nx, ny, nz = normals[face[0]]
+    x, y, z = verts[first_vert]
+    return -(nx * x + ny * y + nz * z)
+
+
+def weld_lod(verts, normals, fvrts, faces, epsilon):
+    """Merge near-duplicate vertices of a LOD.
+
+    Vertices which are at most epsilon apart are merged (see weld_points),
+    and the FVRTs are changed to use the merged ones. Faces which end up
+    with the same vertex twice in a row lose the extra FVRT, and faces with
+    less than 3 vertices left are removed. The D-Plane of each face is
+    recalculated, since its first vertex may have moved.
+
+    epsilon is a distance, so it is not used for the normals, which are
+    left as they are. Use pool_normals to merge normals.
+
+    Returns new (verts, normals, fvrts, faces) lists."""
+    verts, vert_map = weld_points(verts, epsilon)
+
+    new_fvrts = []
+    new_faces = []
+    for face in faces:
+        face_fvrts = []
+        for vert_idx, vtnm_idx, uv_x, uv_y in fvrts[face[3]:face[3] + face[4]]:
+            vert_idx = vert_map[vert_idx]
+            if len(face_fvrts) == 0 or face_fvrts[-1][0] != vert_idx:
+                face_fvrts.append((vert_idx, vtnm_idx, uv_x, uv_y))
+        while (len(face_fvrts) > 1 and
+               face_fvrts[-1][0] == face_fvrts[0][0]):
+            face_fvrts.pop()
+        if len(face_fvrts) < 3:
+            continue
+        new_faces.append(
+            (face[0], face_dplane(verts, normals, face, face_fvrts[0][0]),
+             face[2], len(new_fvrts), len(face_fvrts)) + tuple(face[5:]))
+        new_fvrts.extend(face_fvrts)
+
+    return verts, normals, new_fvrts, new_faces
+
+
+def share_fvrts(verts, normals, fvrts, faces):
+    """Let faces share identical FVRTs.
+
+    Since each face uses a range of FVRTs, FVRTs can only be shared by
+    faces whose ranges overlap. Faces with the same FVRTs as an earlier face
+    use the FVRTs of that face. Otherwise, if a face has the same FVRT as the
+    last one of the face before it, the vertices of the face are rotated to
+    start at that FVRT, and the face's range starts there. Faces which don't
+    share an FVRT with the face before them are rotated to end with an FVRT
+    of the face after them, if they can be. The D-Plane of a rotated face is
+    recalculated for its new first vertex.
+
+    This works best after faces which share vertices have been put close
+    to each other by reorder_lod. Returns new (fvrts, faces) lists."""
+    new_fvrts = []
+    new_faces = []
+    # FVRTs of a face, before and after rotating it -> Index of the first FVRT
+    fvrt_ranges = {}
+    for face_idx, face in enumerate(faces):
+        face_fvrts = orig_fvrts = tuple(fvrts[face[3]:face[3] + face[4]])
+        first_fvrt = fvrt_ranges.get(face_fvrts)
+        if first_fvrt is not None:
+            # The earlier face may have been rotated.
+            dplane = face_dplane(
+                verts, normals, face, new_fvrts[first_fvrt][0])
+            new_faces.append((face[0], dplane, face[2], first_fvrt) +
+                             tuple(face[4:]))
+            continue
+
+        rotation = 0
+        if len(new_fvrts) > 0 and new_fvrts[-1] in face_fvrts:
+            rotation = face_fvrts.index(new_fvrts[-1])
+            first_fvrt = len(new_fvrts) - 1
+        elif face_idx + 1 < len(faces):
+            next_face = faces[face_idx + 1]
+            next_fvrts = set(fvrts[next_face[3]:next_face[3] + next_face[4]])
+            for fvrt_rot in range(len(face_fvrts)):
+                if face_fvrts[fvrt_rot - 1] in next_fvrts:
+                    rotation = fvrt_rot
+                    break
+
+        if rotation > 0:
+            face_fvrts = face_fvrts[rotation:] + face_fvrts[:rotation]
+            face = ((face[0], face_dplane(
+                verts, normals, face, face_fvrts[0][0])) + tuple(face[2:]))
+        if first_fvrt is None:
+            first_fvrt = len(new_fvrts)
+            new_fvrts.extend(face_fvrts)
+        else:
+            new_fvrts.extend(face_fvrts[1:])
+        fvrt_ranges.setdefault(orig_fvrts, first_fvrt)
+        fvrt_ranges.setdefault(face_fvrts, first_fvrt)
+        new_faces.append(face[:3] + (first_fvrt,) + tuple(face[4:]))
+    return new_fvrts, new_faces
+
+
+def texture_switches(faces):
+    "Count how many times the texture changes when drawing faces in order."
+    return sum(1 for face_a, face_b in zip(faces, faces[1:])
+               if face_a[2] != face_b[2])
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# Blender WCP IFF mesh import/export script by Kevin Caccamo
+# Copyright © 2013-2016 Kevin Caccamo
+# E-mail: kevin@ciinet.org
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# <pep8-80 compliant>
+# -*- coding: utf8 -*-
+
+# Most of the add-on's modules use relative imports, so they can only be
+# imported as part of a package. The add-on's __init__ imports bpy, so a bare
+# package is created for them instead.
+import importlib
+import os
+import sys
+import types
+
+PACKAGE_NAME = "wcp_addon"
+
+
+def import_module(name):
+    "Import one of the add-on's modules, without Blender."
+    if PACKAGE_NAME not in sys.modules:
+        package = types.ModuleType(PACKAGE_NAME)
+        package.__path__ = [
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__)))]
+        sys.modules[PACKAGE_NAME] = package
+    return importlib.import_module(PACKAGE_NAME + "." + name)
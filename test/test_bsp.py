@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# Blender WCP IFF mesh import/export script by Kevin Caccamo
+# Copyright © 2013-2016 Kevin Caccamo
+# E-mail: kevin@ciinet.org
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# <pep8-80 compliant>
+# -*- coding: utf8 -*-
+
+import unittest
+from addon_modules import import_module
+
+
+class TestBSPTree(unittest.TestCase):
+
+    def setUp(self):
+        self.bsp = import_module("bsp")
+        self.mesh_opt = import_module("mesh_opt")
+        # Two crossing grids of quads, so some of them have to be split.
+        self.verts = []
+        self.polys = []
+        for axis in range(2):
+            first_vert = len(self.verts)
+            for row in range(5):
+                for col in range(5):
+                    coord = [col - 2.0, row - 2.0, 0.3]
+                    coord[axis], coord[2] = coord[2], coord[axis]
+                    self.verts.append(tuple(coord))
+            for row in range(4):
+                for col in range(4):
+                    vidx = first_vert + row * 5 + col
+                    self.polys.append((vidx, vidx + 1, vidx + 6, vidx + 5))
+        self.tree = self.bsp.BSPTree(self.verts, self.polys)
+
+    def tree_polys(self):
+        for node in self.tree.nodes:
+            for poly_idx in range(node[6], node[6] + node[7]):
+                first_vert, num_verts, src_idx = self.tree.polys[poly_idx]
+                coords = [self.tree.verts[vidx] for vidx in
+                          self.tree.poly_verts[first_vert:
+                                               first_vert + num_verts]]
+                yield node, coords, src_idx
+
+    def test_covers_polys(self):
+        "Test whether the tree polygons cover the source polygons"
+        areas = [0.0] * len(self.polys)
+        for node, coords, src_idx in self.tree_polys():
+            areas[src_idx] += self.mesh_opt.poly_area(coords)
+        for src_idx, poly in enumerate(self.polys):
+            coords = [self.verts[vidx] for vidx in poly]
+            self.assertAlmostEqual(
+                areas[src_idx], self.mesh_opt.poly_area(coords), 5,
+                'BSPTree is splitting polygons incorrectly!')
+
+    def test_planes(self):
+        "Test whether the tree polygons lie on their node planes"
+        for node, coords, src_idx in self.tree_polys():
+            nx, ny, nz, d = node[:4]
+            for x, y, z in coords:
+                self.assertAlmostEqual(
+                    nx * x + ny * y + nz * z + d, 0.0, 4,
+                    'BSPTree is assigning polygons to nodes incorrectly!')
+
+    def test_sides(self):
+        "Test whether each subtree is on the correct side of its parent"
+        def subtree_coords(node_idx):
+            work = [node_idx]
+            while len(work) > 0:
+                node = self.tree.nodes[work.pop()]
+                for poly_idx in range(node[6], node[6] + node[7]):
+                    first_vert, num_verts, _ = self.tree.polys[poly_idx]
+                    for vidx in self.tree.poly_verts[
+                            first_vert:first_vert + num_verts]:
+                        yield self.tree.verts[vidx]
+                work.extend(child for child in node[4:6] if child >= 0)
+
+        eps = self.tree.PLANE_EPSILON
+        for node in self.tree.nodes:
+            nx, ny, nz, d = node[:4]
+            for child_idx, sign in zip(node[4:6], (1, -1)):
+                if child_idx < 0:
+                    continue
+                for x, y, z in subtree_coords(child_idx):
+                    self.assertGreaterEqual(
+                        sign * (nx * x + ny * y + nz * z + d), -eps,
+                        'BSPTree is putting polygons on the wrong side!')
+
+    def test_form(self):
+        "Test the BSP form"
+        form = self.tree.to_form()
+        self.assertEqual(
+            ["VERT", "PIDX", "POLY", "NODE"],
+            [member._name for member in form._members],
+            'BSPTree is making the form incorrectly!')
+        self.assertEqual(
+            len(self.tree.nodes) * 32, form._members[3].get_length(),
+            'BSPTree is making the NODE chunk incorrectly!')
+
+
+class TestBlockmap(unittest.TestCase):
+
+    def setUp(self):
+        self.bsp = import_module("bsp")
+
+    def test_triangle_cells(self):
+        "Test the cells of a triangle which crosses several rows of cells"
+        tree = self.bsp.BSPTree(
+            [(0.0, 0.0, 0.0), (2.5, 0.0, 0.0), (0.0, 2.5, 0.0)], [(0, 1, 2)])
+        blockmap = self.bsp.Blockmap(tree, 1.0)
+        self.assertEqual((3, 3, 1), blockmap.dims,
+                         'Blockmap is sizing the grid incorrectly!')
+        for cx in range(3):
+            for cy in range(3):
+                self.assertEqual(
+                    [0] if cx + cy <= 2 else [],
+                    blockmap.get_cell_polys(cx + 0.5, cy + 0.5, 0.0),
+                    'Blockmap is assigning polygons to cells incorrectly!')
+
+    def test_round_trip(self):
+        "Test whether points on the polygons are in cells with them"
+        verts = []
+        polys = []
+        for idx in range(40):
+            x, y, z = idx % 5 * 1.3, idx // 5 % 4 * 0.7, idx // 20 * 2.1
+            verts.extend(((x, y, z), (x + 1.9, y + 0.4, z + 0.8),
+                          (x + 0.3, y + 1.7, z - 0.6)))
+            polys.append((idx * 3, idx * 3 + 1, idx * 3 + 2))
+        tree = self.bsp.BSPTree(verts, polys)
+        blockmap = self.bsp.Blockmap(tree, 0.5)
+
+        for poly_idx, coords in enumerate(blockmap.polys):
+            # The vertices and centroid of the polygon, and points close to
+            # each vertex and edge.
+            points = list(coords)
+            centroid = [sum(axis) / len(coords) for axis in zip(*coords)]
+            points.append(centroid)
+            for vert_idx, coord in enumerate(coords):
+                next_coord = coords[(vert_idx + 1) % len(coords)]
+                points.append([(a + b) / 2 for a, b in
+                               zip(coord, next_coord)])
+                points.append([a * 0.9 + b * 0.1 for a, b in
+                               zip(coord, centroid)])
+            for point in points:
+                self.assertIn(
+                    poly_idx, blockmap.get_cell_polys(*point),
+                    'Blockmap is missing polygons from cells!')
+
+            # No cell outside of the bounding box of the polygon should have
+            # the polygon.
+            lows = [min(axis) for axis in zip(*coords)]
+            highs = [max(axis) for axis in zip(*coords)]
+            for cell_idx, cell in enumerate(blockmap.cells):
+                if poly_idx not in cell:
+                    continue
+                cell_coords = (
+                    cell_idx // (blockmap.dims[1] * blockmap.dims[2]),
+                    cell_idx // blockmap.dims[2] % blockmap.dims[1],
+                    cell_idx % blockmap.dims[2])
+                for axis, cell_coord in enumerate(cell_coords):
+                    cell_low = (blockmap.origin[axis] +
+                                cell_coord * blockmap.cell_size)
+                    self.assertTrue(
+                        cell_low <= highs[axis] and
+                        cell_low + blockmap.cell_size >= lows[axis],
+                        'Blockmap is putting polygons in far cells!')
+
+
+if __name__ == '__main__':
+    unittest.main()
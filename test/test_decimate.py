@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# Blender WCP IFF mesh import/export script by Kevin Caccamo
+# Copyright © 2013-2016 Kevin Caccamo
+# E-mail: kevin@ciinet.org
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# <pep8-80 compliant>
+# -*- coding: utf8 -*-
+
+import unittest
+from math import sin, cos
+from addon_modules import import_module
+
+
+class TestPointTriDist(unittest.TestCase):
+
+    def setUp(self):
+        self.decimate = import_module("decimate")
+
+    def test_triangle(self):
+        "Test the distance between a point and a triangle"
+        tri = ((0.0, 0.0, 0.0), (2.0, 0.0, 0.0), (0.0, 2.0, 0.0))
+        for point, dist in (((0.5, 0.5, 3.0), 3.0), ((-3.0, -4.0, 0.0), 5.0),
+                            ((1.0, -2.0, 0.0), 2.0), ((2.0, 2.0, 0.0),
+                                                      2.0 ** 0.5)):
+            self.assertAlmostEqual(
+                dist, self.decimate.point_tri_dist(point, tri), 9,
+                'point_tri_dist is calculating distances incorrectly!')
+
+    def test_degenerate(self):
+        "Test the distance between a point and a degenerate triangle"
+        a, b, c = (0.0, 0.0, 0.0), (2.0, 0.0, 0.0), (4.0, 0.0, 0.0)
+        for tri in ((a, a, c), (a, c, c), (c, a, c), (a, b, c), (b, c, a)):
+            for point, dist in (((1.0, 3.0, 0.0), 3.0),
+                                ((7.0, 0.0, 4.0), 5.0),
+                                ((-3.0, 0.0, 0.0), 3.0)):
+                self.assertAlmostEqual(
+                    dist, self.decimate.point_tri_dist(point, tri), 9,
+                    'point_tri_dist is handling degenerate triangles '
+                    'incorrectly!')
+        self.assertAlmostEqual(
+            5.0, self.decimate.point_tri_dist((3.0, 4.0, 0.0), (a, a, a)), 9,
+            'point_tri_dist is handling degenerate triangles incorrectly!')
+
+    def test_mesh_distance(self):
+        "Test the distance between meshes with degenerate triangles"
+        verts = [(0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (1.0, 1.0, 0.0),
+                 (1.0, 1.0, 0.0)]
+        other_verts = [(x, y, 0.5) for x, y, z in verts]
+        tris = [(0, 1, 2), (1, 2, 3)]
+        self.assertAlmostEqual(
+            0.5, self.decimate.mesh_distance(verts, tris, other_verts, tris),
+            9, 'mesh_distance is handling degenerate triangles incorrectly!')
+
+
+class TestDecimator(unittest.TestCase):
+
+    def setUp(self):
+        self.decimate = import_module("decimate")
+        # A bumpy grid
+        size = 16
+        self.verts = []
+        for row in range(size + 1):
+            for col in range(size + 1):
+                self.verts.append((col, row, sin(col * 0.9) * cos(row * 0.7)))
+        self.faces = []
+        for row in range(size):
+            for col in range(size):
+                vidx = row * (size + 1) + col
+                self.faces.append((vidx, vidx + 1, vidx + size + 2,
+                                   vidx + size + 1))
+
+    def test_decimate(self):
+        "Test whether the mesh is decimated"
+        decimator = self.decimate.Decimator(self.verts, self.faces)
+        self.assertEqual(128, decimator.decimate(128),
+                         'Decimator is decimating meshes incorrectly!')
+        verts, tris, uvs, tri_faces = decimator.to_mesh()
+        self.assertEqual(128, len(tris),
+                         'Decimator is decimating meshes incorrectly!')
+
+    def test_max_error(self):
+        "Test the error of the decimated mesh"
+        decimator = self.decimate.Decimator(self.verts, self.faces)
+        decimator.decimate(128)
+        verts, tris, uvs, tri_faces = decimator.to_mesh()
+        tri_coords = [[verts[vidx] for vidx in tri] for tri in tris]
+
+        # The vertices of the decimated mesh are vertices of the original
+        # mesh, so the error is the greatest distance between a vertex of
+        # the original mesh and the decimated mesh.
+        error = max(min(self.decimate.point_tri_dist(vert, coords)
+                        for coords in tri_coords) for vert in self.verts)
+        self.assertGreater(error, 0.0,
+                           'Decimator is decimating meshes incorrectly!')
+        self.assertAlmostEqual(
+            error, decimator.max_error(), 9,
+            'Decimator is measuring the error incorrectly!')
+
+
+class TestLODRanges(unittest.TestCase):
+
+    def setUp(self):
+        self.decimate = import_module("decimate")
+
+    def test_fill(self):
+        "Test filling in missing LOD ranges"
+        dranges = [0.0, None, 150.0, None]
+        self.decimate.fill_lod_ranges(dranges, [0.0, 1.0, 2.0, 3.0], 100.0)
+        self.assertEqual([0.0, 100.0, 150.0, 300.0], dranges,
+                         'fill_lod_ranges is computing ranges incorrectly!')
+
+    def test_unset_ranges(self):
+        "Test LOD ranges after several unset ranges"
+        dranges = [0.0, None, None, 5.0]
+        self.decimate.fill_lod_ranges(dranges, [0.0, 0.1, 0.2, 0.3], 10.0)
+        self.assertEqual([0.0, 1.0, 2.0, 5.0], dranges,
+                         'fill_lod_ranges is computing ranges incorrectly!')
+
+        # Computed ranges which are out of order are left unset.
+        dranges = [0.0, None, None, 5.0, None]
+        self.decimate.fill_lod_ranges(dranges, [0.0, 1.0, 0.2, 0.3, 0.4],
+                                      10.0)
+        self.assertEqual([0.0, None, 2.0, 5.0, None], dranges,
+                         'fill_lod_ranges is computing ranges incorrectly!')
+
+    def test_screen_error(self):
+        "Test the on-screen error of LODs at their ranges"
+        from math import radians, tan
+        fov, resolution = radians(90.0), 480
+        self.assertAlmostEqual(
+            1.2, self.decimate.screen_error(0.5, 100.0, fov, resolution),
+            msg='screen_error is computing on-screen errors incorrectly!')
+
+        # The range of LOD 2 is set by the user, and the others are
+        # computed for an on-screen error of 0.75 pixels.
+        pixel_dist = resolution / (2 * tan(fov / 2) * 0.75)
+        lod_errors = [0.0, 0.25, 2.0, 3.0]
+        dranges = [0.0, None, 150.0, None]
+        self.decimate.fill_lod_ranges(dranges, lod_errors, pixel_dist)
+        self.assertAlmostEqual(
+            3.2, self.decimate.screen_error(
+                lod_errors[2], dranges[2], fov, resolution),
+            msg='screen_error is computing on-screen errors incorrectly!')
+        for lod in (1, 3):
+            self.assertAlmostEqual(
+                0.75, self.decimate.screen_error(
+                    lod_errors[lod], dranges[lod], fov, resolution),
+                msg='fill_lod_ranges is computing ranges incorrectly!')
+
+
+if __name__ == '__main__':
+    unittest.main()
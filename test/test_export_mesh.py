@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# Blender WCP IFF mesh import/export script by Kevin Caccamo
+# Copyright © 2013-2016 Kevin Caccamo
+# E-mail: kevin@ciinet.org
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# <pep8-80 compliant>
+# -*- coding: utf8 -*-
+
+import unittest
+import array
+import os
+import random
+import tempfile
+from unittest import mock
+from addon_modules import import_module
+
+
+def random_mesh(export_mesh, num_verts=30, num_faces=60, seed=1):
+    """Make an ExportMesh with random triangles and quads.
+
+    Every other face is smooth shaded, and every third face has an
+    image."""
+    rng = random.Random(seed)
+    emesh = export_mesh.ExportMesh()
+    emesh.materials = ["red", "blue"]
+    for vidx in range(num_verts):
+        emesh.add_vert([rng.uniform(-4, 4) for axis in range(3)],
+                       [rng.uniform(-1, 1) for axis in range(3)])
+    for face_idx in range(num_faces):
+        verts = rng.sample(range(num_verts), rng.choice((3, 4)))
+        if verts[-1] == 0:
+            # Blender does this for the tessellated faces, so that it can
+            # tell quads and triangles apart.
+            verts = verts[-1:] + verts[:-1]
+        emesh.add_face(
+            verts, [(rng.random(), rng.random()) for vert in verts],
+            [rng.uniform(-1, 1) for axis in range(3)], face_idx % 2,
+            face_idx % 2 == 0,
+            "tex{}.png".format(face_idx % 3) if face_idx % 3 == 0 else None)
+    return emesh
+
+
+def old_lod_form(iff_mesh, emesh, lod_lev, name, cntradi, texnums,
+                 light_flags):
+    """Convert an ExportMesh to a MeshLODForm one face at a time, like
+    ModelManager.export did before ExportMesh was added."""
+    def vector(values, idx):
+        return (values[idx * 3] * -1, values[idx * 3 + 1],
+                values[idx * 3 + 2])
+
+    ilodm = iff_mesh.MeshLODForm(lod_lev)
+    ilodm.set_name(name)
+    ilodm.set_cntradi(cntradi)
+    for vidx in range(emesh.num_verts):
+        ilodm.add_vertex(*vector(emesh.coords, vidx))
+
+    unique_normals = {}
+    fvrt_idx = 0
+    for face_idx in range(emesh.num_faces):
+        start = emesh.loop_start[face_idx]
+        face_verts = emesh.loop_verts[start:start + emesh.loop_total[face_idx]]
+        smooth = emesh.face_smooth[face_idx]
+        if smooth:
+            for vert in face_verts:
+                vnrm = vector(emesh.vert_normals, vert)
+                key = array.array("f", vnrm).tobytes()
+                if key not in unique_normals:
+                    unique_normals[key] = len(unique_normals)
+                    ilodm.add_vert_normal(*vnrm)
+        fnrm = vector(emesh.face_normals, face_idx)
+        fkey = array.array("f", fnrm).tobytes()
+        if fkey not in unique_normals:
+            unique_normals[fkey] = len(unique_normals)
+            ilodm.add_face_normal(*fnrm)
+
+        for loop in range(start + len(face_verts) - 1, start - 1, -1):
+            vert = emesh.loop_verts[loop]
+            nrm = vector(emesh.vert_normals, vert) if smooth else fnrm
+            ilodm.add_fvrt(vert, unique_normals[array.array(
+                "f", nrm).tobytes()], emesh.loop_uvs[loop * 2],
+                1 - emesh.loop_uvs[loop * 2 + 1])
+
+        x, y, z = vector(emesh.coords, face_verts[-1])
+        dplane = -((fnrm[0] * x) + (fnrm[1] * y) + (fnrm[2] * z))
+        ilodm.add_face(unique_normals[fkey], dplane, texnums[face_idx],
+                       fvrt_idx, len(face_verts), light_flags[face_idx])
+        fvrt_idx += len(face_verts)
+    return ilodm
+
+
+class StubCollection(list):
+    "A list which can be read like a bpy collection, with foreach_get."
+
+    def foreach_get(self, attr, values):
+        flat = []
+        for item in self:
+            value = getattr(item, attr)
+            if isinstance(value, (list, tuple)):
+                flat.extend(value)
+            else:
+                flat.append(value)
+        if len(flat) != len(values):
+            raise ValueError("Wrong number of values for {}!".format(attr))
+        values[:] = array.array(values.typecode, flat)
+
+
+class Stub:
+    "An object with the given attributes, like a piece of Blender data."
+
+    def __init__(self, **attrs):
+        self.__dict__.update(attrs)
+
+
+class StubModel:
+    """A model for write_models, which fails to convert if its filename
+    starts with "bad"."""
+
+    def __init__(self, filename, data=b"IFF data"):
+        self.filename = filename
+        self.data = data
+
+    def content_hash(self):
+        return repr(self.data)
+
+    def to_model_iff(self):
+        if os.path.basename(self.filename).startswith("bad"):
+            raise ValueError(self.filename)
+        return self
+
+    def write_file_bin(self):
+        with open(self.filename + ".iff", "wb") as fd:
+            fd.write(self.data)
+
+
+class TestExportMesh(unittest.TestCase):
+
+    def setUp(self):
+        self.export_mesh = import_module("export_mesh")
+        self.iff_mesh = import_module("iff_mesh")
+        self.mesh_opt = import_module("mesh_opt")
+
+    def test_add_face_errors(self):
+        "Test adding invalid faces"
+        emesh = self.export_mesh.ExportMesh()
+        for vidx in range(3):
+            emesh.add_vert((vidx, 0.0, 0.0), (0.0, 0.0, 1.0))
+        for verts, uvs in (([0, 1], [(0, 0)] * 2), ([0, 1, 2], [(0, 0)]),
+                           ([0, 1, 3], [(0, 0)] * 3)):
+            with self.assertRaises(ValueError):
+                emesh.add_face(verts, uvs, (0.0, 0.0, 1.0))
+
+    def test_from_bpy(self):
+        "Test reading a Blender mesh with triangles and quads"
+        emesh = random_mesh(self.export_mesh)
+        verts = StubCollection(
+            Stub(co=list(emesh.coords[vidx * 3:vidx * 3 + 3]),
+                 normal=list(emesh.vert_normals[vidx * 3:vidx * 3 + 3]))
+            for vidx in range(emesh.num_verts))
+        tessfaces = StubCollection()
+        tfuvs = StubCollection()
+        for face_idx in range(emesh.num_faces):
+            start = emesh.loop_start[face_idx]
+            total = emesh.loop_total[face_idx]
+            face_verts = list(emesh.loop_verts[start:start + total])
+            uvs = list(emesh.loop_uvs[start * 2:(start + total) * 2])
+            image = emesh.face_images[face_idx]
+            # Blender pads the vertices and UVs of triangles to four, and
+            # never puts vertex 0 last in a quad.
+            tessfaces.append(Stub(
+                vertices_raw=face_verts + [0] * (4 - total),
+                normal=list(emesh.face_normals[
+                    face_idx * 3:face_idx * 3 + 3]),
+                material_index=emesh.face_mtls[face_idx],
+                use_smooth=bool(emesh.face_smooth[face_idx])))
+            tfuvs.append(Stub(
+                uv_raw=uvs + [0.0] * (8 - total * 2),
+                image=Stub(filepath=image) if image is not None else None))
+        mesh = Stub(
+            vertices=verts, tessfaces=tessfaces,
+            tessface_uv_textures=Stub(active=Stub(data=tfuvs)),
+            materials=[Stub(name=name) for name in emesh.materials])
+
+        bpy_mesh = self.export_mesh.ExportMesh.from_bpy(mesh)
+        for attr in vars(emesh):
+            self.assertEqual(getattr(emesh, attr), getattr(bpy_mesh, attr),
+                             'from_bpy is reading {} incorrectly!'
+                             .format(attr))
+        self.assertEqual(
+            [None] * emesh.num_faces,
+            self.export_mesh.ExportMesh.from_bpy(mesh, False).face_images,
+            'from_bpy is reading images when it should not!')
+
+    def test_lod_records(self):
+        "Test the winding and normals of the LOD records"
+        emesh = self.export_mesh.ExportMesh()
+        emesh.materials = ["red"]
+        # A quad facing up in Blender, flat shaded, and a triangle facing
+        # the other way, smooth shaded.
+        for co in ((0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0)):
+            emesh.add_vert(co, (0.0, 0.6, 0.8))
+        emesh.add_face([0, 1, 2, 3], [(0, 0), (1, 0), (1, 1), (0, 1)],
+                       (0.0, 0.0, 1.0))
+        emesh.add_face([0, 2, 1], [(0, 0), (1, 1), (1, 0)],
+                       (0.0, 0.0, -1.0), smooth=True)
+        verts, normals, fvrts, faces = emesh.lod_records([5, 6], [0, 2])
+
+        self.assertEqual([(-0.0, 0.0, 0.0), (-1.0, 0.0, 0.0),
+                          (-1.0, 1.0, 0.0), (-0.0, 1.0, 0.0)], verts,
+                         'lod_records is converting vertices incorrectly!')
+        self.assertEqual(
+            [(-0.0, 0.0, 1.0), (-0.0, 0.6, 0.8), (-0.0, 0.0, -1.0)],
+            [tuple(round(coord, 6) for coord in normal)
+             for normal in normals],
+            'lod_records is converting normals incorrectly!')
+        # The FVRTs of each face are in reverse order, and the V coordinate
+        # is flipped.
+        self.assertEqual(
+            [(3, 0, 0.0, 0.0), (2, 0, 1.0, 0.0), (1, 0, 1.0, 1.0),
+             (0, 0, 0.0, 1.0), (1, 1, 1.0, 1.0), (2, 1, 1.0, 0.0),
+             (0, 1, 0.0, 1.0)], fvrts,
+            'lod_records is converting FVRTs incorrectly!')
+        self.assertEqual(
+            [(0, -0.0, 5, 0, 4, 0), (2, 0.0, 6, 4, 3, 2)],
+            [face[:6] for face in faces],
+            'lod_records is converting faces incorrectly!')
+
+        # The FVRTs wind counterclockwise around the face normals.
+        fvrt_verts = [fvrt[0] for fvrt in fvrts]
+        newell_normals = self.mesh_opt.face_planes(
+            verts, fvrt_verts, [0, 4], [4, 3])[0]
+        for face, newell in zip(faces, newell_normals):
+            self.assertGreater(
+                sum(a * b for a, b in zip(normals[face[0]], newell)), 0.99,
+                'lod_records is winding faces the wrong way!')
+
+    def test_lod_form(self):
+        "Test the LOD form against the old conversion"
+        emesh = random_mesh(self.export_mesh)
+        texnums, light_flags = emesh.face_texnums(
+            {"red": (0, None, 22000), "blue": (2, None, 22001)},
+            {"tex0.png": 22002})
+        cntradi = self.iff_mesh.Sphere(1.0, 2.0, 3.0, 4.0)
+        new_form = emesh.to_lod_form(0, "thing", cntradi, texnums,
+                                     light_flags)
+        old_form = old_lod_form(self.iff_mesh, emesh, 0, "thing", cntradi,
+                                texnums, light_flags)
+        self.assertEqual(old_form.to_bytes(), new_form.to_bytes(),
+                         'to_lod_form is converting meshes incorrectly!')
+
+
+class TestWriteModels(unittest.TestCase):
+
+    def setUp(self):
+        self.export_mesh = import_module("export_mesh")
+
+    def test_order(self):
+        "Test whether the filenames are returned in order"
+        models = [StubModel("model{}".format(idx)) for idx in range(6)]
+        for parallel in (False, True):
+            self.assertEqual(
+                [model.filename for model in models],
+                self.export_mesh.write_models(models, True, parallel),
+                'write_models is returning filenames out of order!')
+
+    def test_errors(self):
+        "Test whether the first error is raised"
+        models = [StubModel(fname) for fname in
+                  ("model0", "bad1", "model2", "bad3", "model4")]
+        for parallel in (False, True):
+            with self.assertRaises(ValueError) as context:
+                self.export_mesh.write_models(models, True, parallel)
+            self.assertEqual(
+                "bad1", str(context.exception),
+                'write_models is raising errors out of order!')
+
+    def test_no_fork_on_macos(self):
+        "Test whether models are written one at a time on macOS"
+        models = [StubModel("model{}".format(idx)) for idx in range(3)]
+        with mock.patch.object(self.export_mesh.sys, "platform", "darwin"), \
+                mock.patch.object(self.export_mesh, "ProcessPoolExecutor",
+                                  side_effect=AssertionError):
+            self.assertEqual(
+                [model.filename for model in models],
+                self.export_mesh.write_models(models, True, True),
+                'write_models is forking on macOS!')
+
+
+class TestExportManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.export_mesh = import_module("export_mesh")
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.models = [StubModel(os.path.join(self.tmpdir.name, fname))
+                       for fname in ("model0", "model1")]
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, test_run=False):
+        return self.export_mesh.write_models(
+            self.models, test_run,
+            manifest=self.export_mesh.ExportManifest(self.tmpdir.name))
+
+    def test_skip_unchanged(self):
+        "Test whether unchanged models are skipped"
+        fnames = [model.filename for model in self.models]
+        self.assertEqual(fnames, self.write(),
+                         'write_models is skipping new models!')
+        self.assertEqual([], self.write(),
+                         'write_models is writing unchanged models!')
+
+        self.models[1].data = b"New IFF data"
+        self.assertEqual(fnames[1:], self.write(),
+                         'write_models is skipping changed models!')
+        with open(fnames[0] + ".iff", "ab") as fd:
+            fd.write(b"Modified")
+        self.assertEqual(fnames[:1], self.write(),
+                         'write_models is skipping modified files!')
+
+    def test_test_run(self):
+        "Test whether a test run leaves the manifest alone"
+        self.assertEqual([model.filename for model in self.models],
+                         self.write(True),
+                         'write_models is skipping new models!')
+        self.assertEqual([], os.listdir(self.tmpdir.name),
+                         'write_models is writing files in a test run!')
+
+
+if __name__ == '__main__':
+    unittest.main()
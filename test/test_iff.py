@@ -128,6 +128,97 @@ class TestIFFFormAndChunk(unittest.TestCase):
             b'\x00\x00\x04EMPT',
             self.ifff.to_bytes(), 'Form FONG is outputting incorrectly!')
 
+    def test_form_length_updates(self):
+        "Check that form lengths follow changes to their members"
+        import iff
+        self.iffc_gone.add_member("!")
+        self.assertEqual(
+            96, self.ifff.get_length(),
+            'Form FONG length does not follow changes to chunk GONE!')
+        iffc_odd = iff.IffChunk("ODD")
+        self.ifff_empty.add_member(iffc_odd)
+        iffc_odd.add_member("x")
+        self.assertEqual(
+            106, self.ifff.get_length(),
+            'Form FONG length does not follow changes to form EMPT!')
+        self.ifff.remove_member(self.iffc_frst)
+        self.assertEqual(
+            74, self.ifff.get_length(),
+            'Form FONG length is wrong after removing chunk FRST!')
+        self.assertEqual(self.ifff.get_length() + 8,
+                         len(self.ifff.to_bytes()),
+                         'Form FONG length does not match its contents!')
+
+    def test_new_unchecked(self):
+        "Check FORMs and CHUNKs created by new_unchecked()"
+        import iff
+        iffc_num = iff.IffChunk.new_unchecked("NUM ", [1, 2.5])
+        ifff_nums = iff.IffForm.new_unchecked("NUMS", [iffc_num])
+        self.assertEqual(
+            b'FORM\x00\x00\x00\x14NUMSNUM \x00\x00\x00\x08\x01\x00\x00\x00'
+            b'\x00\x00\x20\x40', ifff_nums.to_bytes(),
+            'Form NUMS is outputting incorrectly!')
+        with self.assertRaises(AttributeError,
+                               msg='Chunk NUM has a __dict__!'):
+            iffc_num.extra = 1
+
+    def test_new_unchecked_length(self):
+        "new_unchecked() computes lengths without validating members"
+        import iff
+        from unittest import mock
+        members = [1, "Fibonacci", 2.5]
+        iffc_checked = iff.IffChunk("DESC", list(members))
+        with mock.patch.object(iff.IffChunk, "is_member_valid",
+                               side_effect=AssertionError):
+            iffc_desc = iff.IffChunk.new_unchecked("DESC", list(members))
+        self.assertEqual(
+            18, iffc_desc.get_length(),
+            'Chunk DESC length is wrong after new_unchecked()!')
+        self.assertEqual(
+            iffc_checked.to_bytes(), iffc_desc.to_bytes(),
+            'Chunk DESC is outputting incorrectly after new_unchecked()!')
+        ifff_desc = iff.IffForm.new_unchecked("TEXT", [iffc_desc])
+        self.assertEqual(
+            len(ifff_desc.to_bytes()), ifff_desc.get_length() + 8,
+            'Form TEXT length does not match its contents!')
+
+
+class TestIFFRecordChunk(unittest.TestCase):
+
+    def setUp(self):
+        import iff
+        self.iffc_fvrt = iff.IffRecordChunk("FVRT", "iiff")
+        self.iffc_fvrt.add_member((0, 1, 0.5, 0.25))
+        self.iffc_fvrt.extend([(2, 3, 1.0, 0.0), (4, 5, 0.0, 1.0)])
+
+    def test_record_chunk(self):
+        "Check record chunk length and content"
+        import iff
+        import array
+        iffc_plain = iff.IffChunk("FVRT", [0, 1, 0.5, 0.25, 2, 3, 1.0, 0.0,
+                                           4, 5, 0.0, 1.0])
+        self.assertEqual(3, self.iffc_fvrt.get_num_members(),
+                         'Chunk FVRT has the wrong number of records!')
+        self.assertEqual(48, self.iffc_fvrt.get_length(),
+                         'Chunk FVRT is wrong length!')
+        self.assertEqual(iffc_plain.to_bytes(), self.iffc_fvrt.to_bytes(),
+                         'Chunk FVRT is outputting incorrectly!')
+        self.assertEqual(iffc_plain.to_xmf(), self.iffc_fvrt.to_xmf(),
+                         'Chunk FVRT is outputting XMF incorrectly!')
+        self.assertEqual((2, 3, 1.0, 0.0), self.iffc_fvrt.get_record(1),
+                         'Chunk FVRT is not unpacking records correctly!')
+
+        iffc_vert = iff.IffRecordChunk("VERT", "fff")
+        iffc_vert.frombytes(array.array("f", [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]))
+        self.assertEqual([(1.0, 2.0, 3.0), (4.0, 5.0, 6.0)],
+                         list(iffc_vert.records()),
+                         'Chunk VERT is not reading packed records properly!')
+
+        # Exception testing.
+        self.assertRaises(TypeError, self.iffc_fvrt.add_member,
+                          (0.5, 1, 0.5, 0.25))
+        self.assertRaises(ValueError, iffc_vert.frombytes, b"\x00\x00")
+
 
 class TestIFFFile(unittest.TestCase):
 
@@ -157,6 +248,78 @@ class TestIFFFile(unittest.TestCase):
             b'32-bit integers.', self.iffl.to_bytes(),
             'The IFF is outputting incorrectly!')
 
+    def test_write(self):
+        "IffFile.write() streams the same data as IffFile.to_bytes()"
+        from io import BytesIO
+        iff_stream = BytesIO()
+        iff_stream.write(b"JUNK")
+        self.iffl.write(iff_stream)
+        self.assertEqual(
+            b"JUNK" + self.iffl.to_bytes(), iff_stream.getvalue(),
+            'The IFF is not being written to a stream correctly!')
+
+    def test_write_file(self):
+        "IffFile.write_file_bin() replaces the file without leftovers"
+        import os
+        from tempfile import TemporaryDirectory
+        with TemporaryDirectory() as tmp_dir:
+            self.iffl.filename = os.path.join(tmp_dir, "test")
+            with open(self.iffl.filename + ".iff", "wb") as iff_file:
+                iff_file.write(b"Old data")
+            self.iffl.write_file_bin()
+            with open(self.iffl.filename + ".iff", "rb") as iff_file:
+                self.assertEqual(
+                    self.iffl.to_bytes(), iff_file.read(),
+                    'The IFF file was not written correctly!')
+            self.assertEqual(
+                ["test.iff"], os.listdir(tmp_dir),
+                'A temporary file was left behind!')
+
+
+class TestXMFCompiler(unittest.TestCase):
+
+    def setUp(self):
+        import iff
+        iffl = iff.IffForm("TEST")
+
+        iffc_desc = iff.IffChunk("DESC")
+        iffc_desc.add_member("Fibonacci sequence")
+        iffl.add_member(iffc_desc)
+
+        ifff_fib = iff.IffForm("FIB")
+        ifff_fib.add_member(iff.IffChunk("NUMS", [1, 2.5, -3]))
+        ifff_fib.add_member(
+            iff.IffRecordChunk("FVRT", "iiff", [(0, 1, 0.5, 0.25)]))
+        iffl.add_member(ifff_fib)
+
+        self.iffl = iff.IffFile(iffl)
+
+    def test_round_trip(self):
+        "XMFCompiler compiles the XMF of an IFF file back to the same bytes"
+        from io import BytesIO, StringIO
+        from util.xmf2iff import XMFCompiler
+        iff_stream = BytesIO()
+        XMFCompiler(StringIO(self.iffl.to_xmf()), iff_stream).compile()
+        self.assertEqual(
+            self.iffl.to_bytes(), iff_stream.getvalue(),
+            'XMFCompiler is not compiling XMF correctly!')
+
+    def test_long_bases(self):
+        "XMFCompiler reads longs as decimal, or hexadecimal with 0x"
+        from io import BytesIO, StringIO
+        from util.xmf2iff import XMFCompiler
+        import iff
+        xmf = ('FORM "TEST"\n{\n\tCHUNK "NUMS"\n\t{\n'
+               '\t\tlong 007\n\t\tlong 0x10\n\t\tlong -0X2\n'
+               '\t\tlong 0xFFFFFFFF\n\t}\n}\n')
+        iff_stream = BytesIO()
+        XMFCompiler(StringIO(xmf), iff_stream).compile()
+        iffl = iff.IffForm("TEST")
+        iffl.add_member(iff.IffChunk("NUMS", [7, 16, -2, -1]))
+        self.assertEqual(
+            iff.IffFile(iffl).to_bytes(), iff_stream.getvalue(),
+            'XMFCompiler is reading long values incorrectly!')
+
 
 class TestIFFReader(unittest.TestCase):
 
@@ -194,6 +357,76 @@ class TestIFFReader(unittest.TestCase):
             iff_read.IffReader(self.iff_data),
             'IffReader is unable to read from bytes or bytearrays!')
 
+    def test_mmap(self):
+        "IffReader returns memoryviews of CHUNK data when asked to."
+        import iff_read
+        iffr = iff_read.IffReader(self.iff_data, True)
+        iffr.read_data()  # Root form
+        desc = iffr.read_data()
+        self.assertIsInstance(desc["data"], memoryview,
+                              'IffReader is copying CHUNK data!')
+        self.assertEqual(b"Fibonacci sequence\x00", desc["data"],
+                         'IffReader is not reading CHUNK data properly!')
+        self.assertEqual(b"FIB ", iffr.read_data()["name"],
+                         'IffReader is not skipping to the next FORM!')
+        iffr.close()
+
+    def test_index(self):
+        "IffReader indexes FORMs and CHUNKs by path."
+        import iff_read
+        iffr = iff_read.IffReader(self.iff_data)
+        iffi = iffr.build_index()
+        self.assertEqual(5, len(iffi.entries),
+                         'IffIndex has the wrong number of entries!')
+        fib_chunk = iffi.find("TEST/FIB/FIB")
+        self.assertEqual(40 + 12 + 12, fib_chunk["offset"],
+                         'IffIndex has the wrong offset for TEST/FIB/FIB!')
+        fib_members = [e["name"] for e in iffi.children("TEST/FIB")]
+        self.assertEqual([b"NUM ", b"FIB "], fib_members,
+                         'IffIndex lists the members of TEST/FIB wrongly!')
+        self.assertIsNone(iffi.find("TEST/NUM"),
+                          'IffIndex found a CHUNK that does not exist!')
+        self.assertEqual(b"\x07\x00\x00\x00", iffr.read_entry(
+            iffi.find("TEST/FIB/NUM"))["data"],
+            'IffReader.read_entry() is reading the wrong data!')
+
+    def test_walk(self):
+        "IffReader.walk() generates events in order, and skips FORMs."
+        import iff_read
+        iffr = iff_read.IffReader(self.iff_data)
+        events = [(ev.kind, ev.path, ev.depth) for ev in iffr.walk()]
+        self.assertEqual([
+            ("enter", "TEST", 0), ("chunk", "TEST/DESC", 1),
+            ("enter", "TEST/FIB", 1), ("chunk", "TEST/FIB/NUM", 2),
+            ("chunk", "TEST/FIB/FIB", 2), ("exit", "TEST/FIB", 1),
+            ("exit", "TEST", 0)], events,
+            'IffReader.walk() is generating the wrong events!')
+
+        events = []
+        for ev in iffr.walk():
+            if ev.kind == "enter" and ev.name == b"FIB ":
+                ev.skip()
+            elif ev.kind == "chunk":
+                events.append(bytes(ev.data()))
+        self.assertEqual([b"Fibonacci sequence\x00"], events,
+                         'IffReader.walk() is not skipping FORMs properly!')
+
+        # Invalid and truncated data raise the same errors as read_data().
+        bad_data = self.iff_data.replace(b"DESC", b"DE\x01C")
+        with self.assertRaises(ValueError,
+                               msg='IffReader.walk() accepts invalid IDs!'):
+            list(iff_read.IffReader(bad_data).walk())
+        with self.assertRaises(ValueError,
+                               msg='IffReader.read_data() accepts invalid '
+                               'IDs!'):
+            iffr = iff_read.IffReader(bad_data)
+            iffr.read_data()
+            iffr.read_data()
+        with self.assertRaises(TypeError,
+                               msg='IffReader.walk() accepts truncated '
+                               'data!'):
+            list(iff_read.IffReader(self.iff_data[:-30]).walk())
+
     def test_skip(self):
         "IffReader skips CHUNKs and FORMs properly."
         import iff_read
@@ -213,7 +446,8 @@ class TestIFFReader(unittest.TestCase):
 class TestIFFMetadata(unittest.TestCase):
 
     def setUp(self):
-        import iff_mesh
+        from addon_modules import import_module
+        iff_mesh = import_module("iff_mesh")
         self.sphere = iff_mesh.Sphere(100, 0, 50, 30)
         self.hardpoint = iff_mesh.Hardpoint(
             [[1, 0, 0], [0, 1, 0], [0, 0, 1]], [0, -0.5, 3], "fgun01")
@@ -237,7 +471,8 @@ class TestIFFMetadata(unittest.TestCase):
 class TestIFFMesh(unittest.TestCase):
 
     def setUp(self):
-        import iff_mesh
+        from addon_modules import import_module
+        iff_mesh = import_module("iff_mesh")
         self.cube_mesh = iff_mesh.ModelIff("box", True)
 
         cube_lod = iff_mesh.MeshLODForm(0)
@@ -265,5 +500,206 @@ class TestIFFMesh(unittest.TestCase):
         self.cube_mesh.add_lod(empty_lod, 1000)
 
 
+
+def min_sphere_radius(points):
+    """Get the radius of the smallest sphere enclosing points by brute force.
+
+    The smallest enclosing sphere is the circumsphere of 1 to 4 of the
+    points, so this tries every subset of up to 4 points."""
+    from itertools import combinations
+    best = None
+    for size in range(1, 5):
+        for subset in combinations(points, size):
+            p0 = subset[0]
+            edges = [[c - c0 for c, c0 in zip(p, p0)] for p in subset[1:]]
+            # Solve for the circumcenter p0 + sum(l[i] * edges[i])
+            rows = [[2 * sum(a * b for a, b in zip(ei, ej)) for ej in edges] +
+                    [sum(a * a for a in ei)] for ei in edges]
+            for col in range(len(rows)):
+                pivot = max(range(col, len(rows)),
+                            key=lambda row: abs(rows[row][col]))
+                if abs(rows[pivot][col]) < 1e-9:
+                    break  # Degenerate subset
+                rows[col], rows[pivot] = rows[pivot], rows[col]
+                for row in range(len(rows)):
+                    if row != col:
+                        f = rows[row][col] / rows[col][col]
+                        rows[row] = [a - f * b
+                                     for a, b in zip(rows[row], rows[col])]
+            else:
+                lambdas = [row[-1] / row[i] for i, row in enumerate(rows)]
+                center = [c0 + sum(l * e[axis]
+                                   for l, e in zip(lambdas, edges))
+                          for axis, c0 in enumerate(p0)]
+                radius = max(sum((a - b) ** 2 for a, b in zip(p, center))
+                             for p in points) ** 0.5
+                if best is None or radius < best:
+                    best = radius
+    return best
+
+
+class TestSphere(unittest.TestCase):
+
+    def setUp(self):
+        from addon_modules import import_module
+        self.iff_mesh = import_module("iff_mesh")
+
+    def check_sphere(self, points, name):
+        sphere = self.iff_mesh.Sphere.from_points(points)
+        center = (sphere.x, sphere.y, sphere.z)
+        for point in points:
+            dist = sum((a - b) ** 2 for a, b in zip(point, center)) ** 0.5
+            self.assertLessEqual(
+                dist, sphere.r * (1 + 1e-9) + 1e-9,
+                'Sphere.from_points is not enclosing {} points!'.format(name))
+        return sphere
+
+    def test_collinear(self):
+        "Sphere.from_points handles collinear points"
+        points = [(t, 2.0 * t, -t) for t in (3.0, -1.0, 0.5, 2.0, 1.0)]
+        sphere = self.check_sphere(points, "collinear")
+        self.assertAlmostEqual(
+            sphere.r, 2.0 * 6.0 ** 0.5,
+            msg='Sphere.from_points is handling collinear points '
+            'incorrectly!')
+        for axis, coord in enumerate((1.0, 2.0, -1.0)):
+            self.assertAlmostEqual(
+                sphere.to_tuple()[axis], coord,
+                msg='Sphere.from_points is handling collinear points '
+                'incorrectly!')
+
+    def test_coplanar(self):
+        "Sphere.from_points handles coplanar points"
+        import random
+        rng = random.Random(1)
+        square = [(x, y, 4.0) for x in (-2.0, 2.0) for y in (-2.0, 2.0)]
+        sphere = self.check_sphere(square + [(0.0, 0.0, 4.0)], "coplanar")
+        self.assertAlmostEqual(
+            sphere.r, 8.0 ** 0.5,
+            msg='Sphere.from_points is handling coplanar points '
+            'incorrectly!')
+        points = [(rng.uniform(-5, 5), rng.uniform(-5, 5), 0.0)
+                  for _ in range(9)]
+        sphere = self.check_sphere(points, "coplanar")
+        self.assertLessEqual(
+            sphere.r, min_sphere_radius(points) * (1 + 1e-9),
+            'Sphere.from_points is making spheres around coplanar points '
+            'which are too big!')
+
+    def test_duplicates(self):
+        "Sphere.from_points handles duplicate points"
+        sphere = self.check_sphere([(1.0, 2.0, 3.0)] * 5, "duplicate")
+        self.assertEqual(
+            (1.0, 2.0, 3.0, 0.0), sphere.to_tuple(),
+            'Sphere.from_points is handling a single point incorrectly!')
+        points = [(0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (0.0, 1.0, 0.0),
+                  (0.0, 0.0, 1.0)]
+        sphere = self.check_sphere(points * 3, "duplicate")
+        self.assertAlmostEqual(
+            sphere.r, min_sphere_radius(points),
+            msg='Sphere.from_points is handling duplicate points '
+            'incorrectly!')
+
+    def test_random(self):
+        "Sphere.from_points makes the smallest sphere around random points"
+        import random
+        rng = random.Random(2)
+        for _ in range(20):
+            points = [tuple(rng.uniform(-10, 10) for axis in range(3))
+                      for _ in range(rng.randint(5, 10))]
+            sphere = self.check_sphere(points, "random")
+            self.assertLessEqual(
+                sphere.r, min_sphere_radius(points) * (1 + 1e-9),
+                'Sphere.from_points is making spheres which are too big!')
+        points = [tuple(rng.gauss(0, 10) for axis in range(3))
+                  for _ in range(5000)]
+        self.check_sphere(points, "random")
+
+
+class TestMeshLODForm(unittest.TestCase):
+
+    def setUp(self):
+        from addon_modules import import_module
+        self.iff = import_module("iff")
+        self.iff_mesh = import_module("iff_mesh")
+        self.verts = [(1.0, 1.0, 1.0), (-1.0, 1.0, 1.0), (1.0, -1.0, 1.0)]
+        self.fvrts = [(0, 0, 0.0, 0.0), (1, 0, 1.0, 0.0), (2, 0, 0.0, 1.0)]
+        self.faces = [(0, -1.0, 22000, 0, 3, 0, 0x7F0096FF)]
+
+        self.lod = self.iff_mesh.MeshLODForm(0)
+        for vert in self.verts:
+            self.lod.add_vertex(*vert)
+        self.lod.add_vert_normal(0.0, 0.0, 1.0)
+        for fvrt in self.fvrts:
+            self.lod.add_fvrt(*fvrt)
+        for face in self.faces:
+            self.lod.add_face(*face)
+
+    def bulk_lod(self, verts, norms, fvrts, faces):
+        lod = self.iff_mesh.MeshLODForm(0)
+        lod.add_vertices(verts)
+        lod.add_vert_normals(norms)
+        lod.add_fvrts(fvrts)
+        lod.add_faces(faces)
+        return lod
+
+    def test_bulk_setters(self):
+        "The bulk setters add the same records as the single ones"
+        import array
+        self.assertEqual(
+            self.lod.to_bytes(),
+            self.bulk_lod(self.verts, [(0.0, 0.0, 1.0)], self.fvrts,
+                          self.faces).to_bytes(),
+            'MeshLODForm bulk setters are adding sequences incorrectly!')
+        self.assertEqual(
+            self.lod.to_bytes(),
+            self.bulk_lod((vert for vert in self.verts),
+                          (norm for norm in [(0.0, 0.0, 1.0)]),
+                          (fvrt for fvrt in self.fvrts),
+                          (face for face in self.faces)).to_bytes(),
+            'MeshLODForm bulk setters are adding generators incorrectly!')
+
+        fvrt_data = self.iff.IffRecordChunk("FVRT", "iiff", self.fvrts)
+        face_data = self.iff.IffRecordChunk("FACE", "ifiiiii", self.faces)
+        self.assertEqual(
+            self.lod.to_bytes(),
+            self.bulk_lod(array.array("f", [c for v in self.verts for c in v]),
+                          array.array("f", [0.0, 0.0, 1.0]),
+                          fvrt_data.to_bytes()[8:],
+                          face_data.to_bytes()[8:]).to_bytes(),
+            'MeshLODForm bulk setters are adding packed records '
+            'incorrectly!')
+
+    def test_bulk_setter_errors(self):
+        "The bulk setters reject negative indices"
+        lod = self.iff_mesh.MeshLODForm(0)
+        bad_fvrts = [(0, 0, 0.0, 0.0), (-1, 0, 1.0, 0.0)]
+        self.assertRaises(ValueError, lod.add_fvrts, bad_fvrts)
+        self.assertRaises(ValueError, lod.add_fvrts,
+                          (fvrt for fvrt in bad_fvrts))
+        self.assertRaises(
+            ValueError, lod.add_fvrts,
+            self.iff.IffRecordChunk("FVRT", "iiff", bad_fvrts).to_bytes()[8:])
+        self.assertRaises(ValueError, lod.add_faces,
+                          [(0, -1.0, 22000, 0, -3, 0, 0)])
+
+    def test_bulk_setter_buffers(self):
+        "The bulk setters read strided buffers, and reject 8-byte numbers"
+        import array
+        coords = [c for v in self.verts for c in v]
+        # Every other float of this array is a vertex coordinate
+        padded = array.array("f", [x for c in coords for x in (c, 9.0)])
+        self.assertEqual(
+            self.lod.to_bytes(),
+            self.bulk_lod(memoryview(padded)[::2],
+                          array.array("f", [0.0, 0.0, 1.0]),
+                          self.fvrts, self.faces).to_bytes(),
+            'MeshLODForm bulk setters are adding strided buffers '
+            'incorrectly!')
+        lod = self.iff_mesh.MeshLODForm(0)
+        self.assertRaises(TypeError, lod.add_vertices,
+                          array.array("d", coords))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# Blender WCP IFF mesh import/export script by Kevin Caccamo
+# Copyright © 2013-2016 Kevin Caccamo
+# E-mail: kevin@ciinet.org
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# <pep8-80 compliant>
+# -*- coding: utf8 -*-
+
+import unittest
+from math import sin, cos, radians
+from addon_modules import import_module
+
+ALT_MAT = 0x7F0096FF
+
+
+def grid_lod(size=6, texnums=(0, 1)):
+    """Make the records of a LOD for a bumpy grid of quads.
+
+    Each vertex has its own normal, and the faces alternate between the
+    given texture numbers by column."""
+    verts = []
+    normals = []
+    for row in range(size + 1):
+        for col in range(size + 1):
+            verts.append((float(col), float(row),
+                          sin(col * 0.8) * cos(row * 0.6) * 0.25))
+            ny = sin(col * 0.3) * 0.2
+            normals.append((0.0, ny, (1 - ny * ny) ** 0.5))
+    fvrts = []
+    faces = []
+    for row in range(size):
+        for col in range(size):
+            vidx = row * (size + 1) + col
+            first_fvrt = len(fvrts)
+            for corner in (vidx, vidx + 1, vidx + size + 2, vidx + size + 1):
+                fvrts.append((corner, corner, (corner % 7) / 7,
+                              (corner % 5) / 5))
+            normals.append((0.0, 0.0, 1.0))
+            x, y, z = verts[vidx]
+            faces.append((len(normals) - 1, -z, texnums[col % len(texnums)],
+                          first_fvrt, 4, 0, ALT_MAT))
+    return verts, normals, fvrts, faces
+
+
+def face_cycles(verts, normals, fvrts, faces, digits=None):
+    """Get the texture number, face normal, and (vertex, normal, UV) cycle
+    of each face.
+
+    Each cycle is rotated to start at its smallest corner, so that faces
+    which only start at a different corner are the same. If digits is not
+    None, the coordinates are rounded to that many digits."""
+    def coords(values):
+        if digits is None:
+            return tuple(values)
+        return tuple(round(value, digits) for value in values)
+
+    cycles = []
+    for face in faces:
+        cycle = [(coords(verts[vert_idx]), coords(normals[vtnm_idx]),
+                  coords((uv_x, uv_y)))
+                 for vert_idx, vtnm_idx, uv_x, uv_y
+                 in fvrts[face[3]:face[3] + face[4]]]
+        cycle = min(cycle[rot:] + cycle[:rot] for rot in range(len(cycle)))
+        cycles.append((face[2], coords(normals[face[0]]), tuple(cycle)))
+    return cycles
+
+
+def face_dplanes(verts, normals, fvrts, faces):
+    "Get the D-Plane of each face, for its normal and first vertex."
+    dplanes = []
+    for face in faces:
+        nx, ny, nz = normals[face[0]]
+        x, y, z = verts[fvrts[face[3]][0]]
+        dplanes.append(-(nx * x + ny * y + nz * z))
+    return dplanes
+
+
+class TestReorderLOD(unittest.TestCase):
+
+    def setUp(self):
+        self.mesh_opt = import_module("mesh_opt")
+        self.lod = grid_lod()
+
+    def test_faces(self):
+        "Test whether the faces are the same after reordering"
+        new_lod = self.mesh_opt.reorder_lod(*self.lod)
+        self.assertEqual(
+            sorted(face_cycles(*self.lod)), sorted(face_cycles(*new_lod)),
+            'reorder_lod is changing the faces!')
+        self.assertEqual(
+            face_dplanes(*new_lod),
+            [face[1] for face in new_lod[3]],
+            'reorder_lod is changing the D-Planes!')
+
+    def test_texnum_groups(self):
+        "Test whether the faces are grouped by texture"
+        new_lod = self.mesh_opt.reorder_lod(*self.lod)
+        self.assertEqual(
+            1, self.mesh_opt.texture_switches(new_lod[3]),
+            'reorder_lod is not grouping faces by texture!')
+
+
+class TestWeldLOD(unittest.TestCase):
+
+    def setUp(self):
+        self.mesh_opt = import_module("mesh_opt")
+        self.lod = grid_lod()
+        # Give each face its own copy of its vertices, a little apart from
+        # the others.
+        verts, normals, fvrts, faces = self.lod
+        split_verts = []
+        split_fvrts = []
+        for vert_idx, vtnm_idx, uv_x, uv_y in fvrts:
+            x, y, z = verts[vert_idx]
+            offset = len(split_verts) % 3 * 1e-5
+            split_fvrts.append((len(split_verts), vtnm_idx, uv_x, uv_y))
+            split_verts.append((x + offset, y - offset, z + offset))
+        self.split_lod = split_verts, normals, split_fvrts, faces
+
+    def test_weld(self):
+        "Test whether the vertices are welded"
+        new_lod = self.mesh_opt.weld_lod(*self.split_lod, 1e-3)
+        self.assertEqual(len(self.lod[0]), len(new_lod[0]),
+                         'weld_lod is welding vertices incorrectly!')
+        self.assertEqual(
+            face_cycles(*self.lod, digits=3),
+            face_cycles(*new_lod, digits=3),
+            'weld_lod is changing the faces!')
+        self.assertEqual(
+            face_dplanes(*new_lod), [face[1] for face in new_lod[3]],
+            'weld_lod is calculating the D-Planes incorrectly!')
+
+    def test_normals(self):
+        "Test whether normals are left alone by weld_lod"
+        verts, normals, fvrts, faces = self.split_lod
+        normals = list(normals)
+        # Normals which are closer than the weld distance, but not the same
+        normals[0] = (0.0, 0.0005, 1.0)
+        normals[1] = (0.0, 0.0, 1.0)
+        new_lod = self.mesh_opt.weld_lod(verts, normals, fvrts, faces, 1e-3)
+        self.assertEqual(normals, new_lod[1],
+                         'weld_lod is welding normals!')
+        self.assertEqual(
+            [fvrt[1] for fvrt in fvrts], [fvrt[1] for fvrt in new_lod[2]],
+            'weld_lod is changing the normals of the FVRTs!')
+
+    def test_degenerate(self):
+        "Test whether faces which are welded into lines are removed"
+        verts = [(0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (1.0, 1.0, 0.0),
+                 (1.0, 1.0005, 0.0)]
+        normals = [(0.0, 0.0, 1.0)]
+        fvrts = [(vidx, 0, 0.0, 0.0) for vidx in (0, 1, 2, 1, 2, 3)]
+        faces = [(0, 0.0, 0, 0, 3, 0, ALT_MAT), (0, 0.0, 0, 3, 3, 0, ALT_MAT)]
+        new_lod = self.mesh_opt.weld_lod(verts, normals, fvrts, faces, 1e-3)
+        self.assertEqual(1, len(new_lod[3]),
+                         'weld_lod is keeping degenerate faces!')
+        self.assertEqual(3, len(new_lod[2]),
+                         'weld_lod is keeping degenerate faces!')
+
+
+class TestShareFVRTs(unittest.TestCase):
+
+    def setUp(self):
+        self.mesh_opt = import_module("mesh_opt")
+        self.lod = self.mesh_opt.reorder_lod(*grid_lod())
+
+    def test_share(self):
+        "Test whether faces share FVRTs, and keep their vertex cycles"
+        verts, normals, fvrts, faces = self.lod
+        # Use the same normal for every FVRT, so more of them are the same.
+        fvrts = [(vert_idx, 0, uv_x, uv_y)
+                 for vert_idx, vtnm_idx, uv_x, uv_y in fvrts]
+        new_fvrts, new_faces = self.mesh_opt.share_fvrts(
+            verts, normals, fvrts, faces)
+        self.assertLess(len(new_fvrts), len(fvrts),
+                        'share_fvrts is not sharing FVRTs!')
+        self.assertEqual(
+            face_cycles(verts, normals, fvrts, faces),
+            face_cycles(verts, normals, new_fvrts, new_faces),
+            'share_fvrts is changing the faces!')
+        self.assertEqual(
+            face_dplanes(verts, normals, new_fvrts, new_faces),
+            [face[1] for face in new_faces],
+            'share_fvrts is calculating the D-Planes incorrectly!')
+
+    def test_same_faces(self):
+        "Test whether identical faces use the same FVRTs"
+        verts, normals, fvrts, faces = self.lod
+        faces = faces + faces[:2]
+        new_fvrts, new_faces = self.mesh_opt.share_fvrts(
+            verts, normals, fvrts, faces)
+        self.assertEqual(new_faces[:2], new_faces[-2:],
+                         'share_fvrts is not sharing identical faces!')
+
+
+class TestPoolNormals(unittest.TestCase):
+
+    def setUp(self):
+        self.mesh_opt = import_module("mesh_opt")
+        self.lod = grid_lod()
+
+    def pooled_lod(self, tolerance):
+        verts, normals, fvrts, faces = self.lod
+        pooled, face_nrms, fvrt_nrms = self.mesh_opt.pool_normals(
+            normals, tolerance, [face[0] for face in faces],
+            [fvrt[1] for fvrt in fvrts])
+        new_fvrts = [(vert_idx, vtnm_idx, uv_x, uv_y)
+                     for (vert_idx, _, uv_x, uv_y), vtnm_idx
+                     in zip(fvrts, fvrt_nrms)]
+        new_faces = [(vtnm_idx,) + face[1:]
+                     for face, vtnm_idx in zip(faces, face_nrms)]
+        return verts, pooled, new_fvrts, new_faces
+
+    def test_exact(self):
+        "Test pooling identical normals"
+        new_lod = self.pooled_lod(0.0)
+        # The vertex normals are different for each of the 7 columns of
+        # vertices, and the face normals are the same as the vertex normals
+        # of the first column.
+        self.assertEqual(7, len(new_lod[1]),
+                         'pool_normals is pooling normals incorrectly!')
+        self.assertEqual(
+            face_cycles(*self.lod, digits=6),
+            face_cycles(*new_lod, digits=6),
+            'pool_normals is changing the faces!')
+
+    def test_tolerance(self):
+        "Test pooling normals within an angular tolerance"
+        tolerance = radians(5)
+        new_lod = self.pooled_lod(tolerance)
+        self.assertLess(len(new_lod[1]), 7,
+                        'pool_normals is not pooling similar normals!')
+
+        old_cycles = face_cycles(*self.lod)
+        new_cycles = face_cycles(*new_lod)
+        min_cos = cos(tolerance) - 1e-6
+        for (old_tx, old_nrm, old_cycle), (new_tx, new_nrm, new_cycle) in zip(
+                old_cycles, new_cycles):
+            self.assertEqual(
+                (old_tx, [(vert, uv) for vert, nrm, uv in old_cycle]),
+                (new_tx, [(vert, uv) for vert, nrm, uv in new_cycle]),
+                'pool_normals is changing the faces!')
+            for old_vec, new_vec in [(old_nrm, new_nrm)] + [
+                    (old[1], new[1]) for old, new in zip(old_cycle,
+                                                         new_cycle)]:
+                self.assertGreaterEqual(
+                    sum(a * b for a, b in zip(old_vec, new_vec)), min_cos,
+                    'pool_normals is pooling dissimilar normals!')
+
+
+class TestFacePlanes(unittest.TestCase):
+
+    def setUp(self):
+        self.mesh_opt = import_module("mesh_opt")
+        self.verts, self.normals, fvrts, self.faces = grid_lod()
+        self.fvrt_verts = [fvrt[0] for fvrt in fvrts]
+        self.first_fvrts = [face[3] for face in self.faces]
+        self.num_verts = [face[4] for face in self.faces]
+
+    def test_newell(self):
+        "Test calculating face normals from the vertices"
+        normals, dplanes = self.mesh_opt.face_planes(
+            self.verts, self.fvrt_verts, self.first_fvrts, self.num_verts)
+        for face_idx, (nx, ny, nz) in enumerate(normals):
+            # The faces wind counterclockwise around their normals.
+            self.assertGreater(nz, 0.5,
+                               'face_planes is calculating normals for the '
+                               'wrong side!')
+            self.assertAlmostEqual(1.0, nx * nx + ny * ny + nz * nz, 6,
+                                   'face_planes is not normalizing normals!')
+            x, y, z = self.verts[self.fvrt_verts[self.first_fvrts[face_idx]]]
+            self.assertAlmostEqual(
+                -(nx * x + ny * y + nz * z), dplanes[face_idx], 9,
+                'face_planes is calculating the D-Planes incorrectly!')
+
+    def test_given_normals(self):
+        "Test using the given normals of planar and non-planar faces"
+        face_normals = [self.normals[face[0]] for face in self.faces]
+        normals, dplanes = self.mesh_opt.face_planes(
+            self.verts, self.fvrt_verts, self.first_fvrts, self.num_verts,
+            face_normals)
+        self.assertEqual(face_normals, normals,
+                         'face_planes is not using the given normals!')
+        self.assertEqual([face[1] for face in self.faces], dplanes,
+                         'face_planes is calculating the D-Planes '
+                         'incorrectly!')
+
+        # The grid is bumpy, so most of its quads are not planar.
+        normals, dplanes = self.mesh_opt.face_planes(
+            self.verts, self.fvrt_verts, self.first_fvrts, self.num_verts,
+            face_normals, 1e-4)
+        newell_normals = self.mesh_opt.face_planes(
+            self.verts, self.fvrt_verts, self.first_fvrts,
+            self.num_verts)[0]
+        for normal, given, newell in zip(normals, face_normals,
+                                         newell_normals):
+            self.assertIn(normal, (given, newell),
+                          'face_planes is calculating normals incorrectly!')
+        self.assertNotEqual(face_normals, normals,
+                            'face_planes is not recalculating the normals '
+                            'of non-planar faces!')
+
+
+if __name__ == '__main__':
+    unittest.main()
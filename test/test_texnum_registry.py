@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# Blender WCP IFF mesh import/export script by Kevin Caccamo
+# Copyright © 2013-2016 Kevin Caccamo
+# E-mail: kevin@ciinet.org
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# <pep8-80 compliant>
+# -*- coding: utf8 -*-
+
+import unittest
+import contextlib
+import io
+import json
+import os
+import tempfile
+from addon_modules import import_module
+
+
+class TestTexnumRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.texnum_registry = import_module("texnum_registry")
+        self.registry = self.texnum_registry.TexnumRegistry()
+
+    def test_allocate(self):
+        "Test allocating texture numbers"
+        self.assertEqual(22000, self.registry.texnum_for("a", 22000),
+                         'TexnumRegistry is allocating texnums incorrectly!')
+        self.assertEqual(22001, self.registry.texnum_for("b", 22000),
+                         'TexnumRegistry is allocating texnums incorrectly!')
+        self.assertEqual(22000, self.registry.texnum_for("a", 22000),
+                         'TexnumRegistry is forgetting texnums!')
+
+    def test_reserve(self):
+        "Test reserving the texture numbers of numeric textures"
+        self.registry.texnum_for("a", 22000)
+        self.registry.reserve(22001)
+        self.assertEqual(22002, self.registry.texnum_for("b", 22000),
+                         'TexnumRegistry is allocating reserved texnums!')
+        self.assertEqual("a", self.registry.reserve(22000),
+                         'TexnumRegistry is not displacing images!')
+        self.assertEqual(22003, self.registry.texnum_for("a", 22000),
+                         'TexnumRegistry is not displacing images!')
+
+    def test_reuse(self):
+        "Test reusing released texture numbers"
+        for img in "abcd":
+            self.registry.texnum_for(img, 22000)
+        self.registry.release_unused(lambda img: img not in "bc")
+        self.assertEqual(22001, self.registry.texnum_for("e", 22000),
+                         'TexnumRegistry is not reusing the lowest texnum!')
+        # Released texture numbers below start_texnum are kept for later.
+        self.assertEqual(30000, self.registry.texnum_for("f", 30000),
+                         'TexnumRegistry is reusing texnums below the '
+                         'start!')
+        self.assertEqual(22002, self.registry.texnum_for("g", 22000),
+                         'TexnumRegistry is losing released texnums!')
+        self.registry.release("e")
+        self.registry.reserve(22001)
+        self.assertEqual([], self.registry.free,
+                         'TexnumRegistry is keeping reserved texnums free!')
+        self.assertEqual(30001, self.registry.texnum_for("h", 22000),
+                         'TexnumRegistry is allocating texnums incorrectly!')
+
+    def test_free_order(self):
+        "Test reusing released texture numbers from start_texnum on"
+        for img in range(10):
+            self.registry.texnum_for(img, 22000)
+        for img in (7, 2, 5, 8):
+            self.registry.release(img)
+        self.assertEqual(22005, self.registry.texnum_for("a", 22003),
+                         'TexnumRegistry is not reusing the lowest texnum '
+                         'from the start!')
+        self.assertEqual(22002, self.registry.texnum_for("b", 22000),
+                         'TexnumRegistry is not reusing the lowest texnum!')
+        self.assertEqual([22007, 22008], self.registry.free,
+                         'TexnumRegistry is keeping free texnums unsorted!')
+
+class TestTexnumRegistryFile(unittest.TestCase):
+
+    def setUp(self):
+        self.texnum_registry = import_module("texnum_registry")
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, "texnums.json")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_round_trip(self):
+        "Test saving and loading a registry"
+        registry = self.texnum_registry.TexnumRegistry(self.filename)
+        img_path = os.path.join(self.tmpdir.name, "textures", "hull.png")
+        img = registry.image_key(img_path)
+        self.assertEqual("textures/hull.png", img,
+                         'TexnumRegistry is not using relative paths!')
+        self.assertEqual(os.path.normpath(img_path), registry.image_path(img),
+                         'TexnumRegistry is converting paths incorrectly!')
+        registry.texnum_for(img, 22000)
+        registry.texnum_for("other.png", 22000)
+        registry.release("other.png")
+        registry.reserve(22005)
+        registry.save()
+
+        loaded = self.texnum_registry.TexnumRegistry(self.filename)
+        for attr in ("texnums", "reserved", "free", "next_texnum"):
+            self.assertEqual(getattr(registry, attr), getattr(loaded, attr),
+                             'TexnumRegistry is saving {} incorrectly!'
+                             .format(attr))
+
+    def test_bad_files(self):
+        "Test loading malformed and foreign files"
+        for data in ("{not json", json.dumps([1, 2, 3]),
+                     json.dumps({"version": 1, "texnums": {"a": "b"}}),
+                     json.dumps({"name": "something else"})):
+            with open(self.filename, "w") as fd:
+                fd.write(data)
+            with contextlib.redirect_stdout(io.StringIO()) as output:
+                registry = self.texnum_registry.TexnumRegistry(
+                    self.filename)
+            self.assertIn("Could not read", output.getvalue(),
+                          'TexnumRegistry is not warning about bad files!')
+            self.assertEqual({}, registry.texnums,
+                             'TexnumRegistry is reading bad files!')
+            # The file is left alone.
+            self.assertIsNone(registry.filename,
+                              'TexnumRegistry would overwrite bad files!')
+            self.assertEqual(22000, registry.texnum_for("a", 22000),
+                             'TexnumRegistry is unusable after a bad file!')
+
+
+if __name__ == '__main__':
+    unittest.main()
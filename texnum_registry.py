@@ -0,0 +1,175 @@
+# -*- coding: utf8 -*-
+# Blender WCP IFF mesh import/export script by Kevin Caccamo
+# Copyright © 2013-2016 Kevin Caccamo
+# E-mail: kevin@ciinet.org
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+#
+# <pep8-80 compliant>
+
+# Persistent texture numbers for the exporter.
+import json
+import os
+from bisect import bisect_left, insort
+
+
+class TexnumRegistry:
+    """A mapping from texture image filenames to texture numbers.
+
+    The registry can be kept in a JSON file, so that every export which uses
+    the same file gives each image the same texture number. The images are
+    kept as paths relative to the folder of the file (see image_key), so the
+    file can be moved along with the images. Texture numbers of numeric
+    textures (like 22000.png) are reserved, so they are never given to other
+    images. Texture numbers of released images are reused, lowest first,
+    before new ones are allocated."""
+
+    VERSION = 1
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.texnums = {}  # Image filename -> texnum
+        self.reserved = set()  # Texnums of numeric textures
+        self.free = []  # Released texnums, sorted
+        self.next_texnum = 0
+        self._owners = {}  # Texnum -> image filename, or None if reserved
+
+        if filename is None:
+            return
+        try:
+            with open(filename, "r", encoding="utf-8") as fd:
+                registry = json.load(fd)
+            if (not isinstance(registry, dict) or
+                    registry.get("version") != self.VERSION):
+                raise ValueError("Not a texture number registry")
+            texnums = {str(img): int(texnum) for img, texnum
+                       in registry.get("texnums", {}).items()}
+            reserved = set(map(int, registry.get("reserved", [])))
+            free = list(map(int, registry.get("free", [])))
+            next_texnum = int(registry.get("next_texnum", 0))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, TypeError, AttributeError):
+            # The file is not overwritten, since it may be something else.
+            print("Could not read the texture number registry {}! The "
+                  "texture numbers will not be kept.".format(filename))
+            self.filename = None
+            return
+
+        self.texnums = texnums
+        self.reserved = reserved
+        self.next_texnum = next_texnum
+        self._owners = {texnum: img for img, texnum in self.texnums.items()}
+        self._owners.update(dict.fromkeys(self.reserved))
+        self.free = sorted(set(free).difference(self._owners))
+
+    def image_key(self, img_path):
+        """Get the key for the image at img_path in this registry.
+
+        This is the path of the image relative to the folder of the registry
+        file, with forward slashes, so it is the same on every system. If the
+        registry has no file, or the image is on another drive, it is the
+        absolute path of the image."""
+        img_path = os.path.abspath(img_path)
+        if self.filename is not None:
+            try:
+                img_path = os.path.relpath(
+                    img_path, os.path.dirname(os.path.abspath(self.filename)))
+            except ValueError:
+                pass
+        return img_path.replace(os.sep, "/")
+
+    def image_path(self, img):
+        "Get the absolute path of the image with the key img."
+        img = img.replace("/", os.sep)
+        if self.filename is not None:
+            img = os.path.join(os.path.dirname(os.path.abspath(
+                self.filename)), img)
+        return os.path.normpath(img)
+
+    def reserve(self, texnum):
+        """Reserve the texture number of a numeric texture.
+
+        If the texture number was given to an image, that image loses it,
+        and gets a new texture number the next time it is looked up.
+        Returns the filename of that image, or None."""
+        img = self._owners.get(texnum)
+        free_idx = bisect_left(self.free, texnum)
+        if free_idx < len(self.free) and self.free[free_idx] == texnum:
+            del self.free[free_idx]
+        self.reserved.add(texnum)
+        self._owners[texnum] = None
+        if img is not None:
+            del self.texnums[img]
+        return img
+
+    def texnum_for(self, img, start_texnum=0):
+        """Get the texture number for an image, allocating it if necessary.
+
+        The lowest released texture number from start_texnum on is reused
+        first. Otherwise, the image gets the lowest unused texture number from
+        the larger of start_texnum and the number after the last one that was
+        allocated."""
+        texnum = self.texnums.get(img)
+        if texnum is not None:
+            return texnum
+
+        free_idx = bisect_left(self.free, start_texnum)
+        if free_idx < len(self.free):
+            texnum = self.free.pop(free_idx)
+        else:
+            texnum = max(self.next_texnum, start_texnum)
+            while texnum in self._owners:
+                texnum += 1
+            self.next_texnum = texnum + 1
+
+        self.texnums[img] = texnum
+        self._owners[texnum] = img
+        return texnum
+
+    def release(self, img):
+        "Release the texture number of an image, so it can be reused."
+        texnum = self.texnums.pop(img)
+        del self._owners[texnum]
+        insort(self.free, texnum)
+
+    def release_unused(self, is_used):
+        """Release the texture numbers of images for which is_used is False.
+
+        Returns a list of the images which were released."""
+        unused = [img for img in self.texnums if not is_used(img)]
+        for img in unused:
+            self.release(img)
+        return unused
+
+    def save(self):
+        "Write the registry to its file."
+        if self.filename is None:
+            raise ValueError("This registry has no filename!")
+        tmp_fname = "{}.{}.tmp".format(self.filename, os.getpid())
+        try:
+            with open(tmp_fname, "w", encoding="utf-8") as fd:
+                json.dump({"version": self.VERSION,
+                           "texnums": self.texnums,
+                           "reserved": sorted(self.reserved),
+                           "free": self.free,
+                           "next_texnum": self.next_texnum},
+                          fd, indent=1, sort_keys=True)
+                fd.flush()
+                os.fsync(fd.fileno())
+            os.replace(tmp_fname, self.filename)
+        except BaseException:
+            if os.path.exists(tmp_fname):
+                os.remove(tmp_fname)
+            raise
@@ -34,7 +34,7 @@ class IffPalReader:
 
     def __init__(self, iff_fname):
         from iff_read import IffReader
-        self.iff = IffReader(iff_fname)
+        self.iff = IffReader(iff_fname, True)
         self.pal = None
         self.pxld = array.array("B")
 
@@ -97,7 +97,9 @@ def print_iff_data(iffthing):
     print("name:", iffthing["name"])
     print("length:", iffthing["length"])
     print("offset:", iffthing["offset"])
-    print("data:", iffthing.get("data", "None"))
+    # The data is a memoryview when the file is memory-mapped.
+    data = iffthing.get("data")
+    print("data:", bytes(data) if data is not None else None)
 
 if __name__ == '__main__':
 
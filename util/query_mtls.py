@@ -33,32 +33,11 @@ class IffMeshReader:
 
     def __init__(self, iff_fname):
         from iff_read import IffReader
-        self.iff = IffReader(iff_fname)
+        self.iff = IffReader(iff_fname, True)
         # self.out_mode = out_mode
         self.lods = {}
         self.hardpoints = []
 
-    def parse_deta_form(self, deta_form):
-        deta_read = 4
-        while deta_read < deta_form["length"]:
-
-            mdata = self.iff.read_data()
-
-            if mdata["type"] == "chunk" and mdata["name"] == b"RANG":
-                self.parse_rang_chunk(mdata)
-            elif mdata["type"] == "form" and mdata["name"] == b"MESH":
-                self.parse_major_mesh_form(mdata)
-            elif mdata["type"] == "form" and mdata["name"] == b"HARD":
-                self.parse_hard_form(mdata)
-            elif mdata["type"] == "form" and mdata["name"] == b"COLL":
-                self.parse_coll_form(mdata)
-            elif mdata["type"] == "chunk" and mdata["name"] == b"FAR ":
-                self.parse_far_chunk(mdata)
-
-            deta_read += 8 + mdata["length"]
-            # Don't add bytes read if type of data is form
-            # if mdata["type"] == "chunk": deta_read += 8
-
     def parse_rang_chunk(self, rang_data):
         if rang_data["length"] % 4 != 0:
             raise TypeError("RANG chunk length must be a multiple of 4!")
@@ -68,80 +47,30 @@ class IffMeshReader:
         ranges = struct.unpack("<" + ("f" * num_ranges), rang_data["data"])
         return ranges
 
-    def parse_major_mesh_form(self, mesh_form):
-        mjrmsh_read = 4
-
-        while mjrmsh_read < mesh_form["length"]:
-
-            lod_form = self.iff.read_data()
-            # print("LOD FORM offset:", lod_form["offset"])
-            # print("LOD FORM name:", lod_form["name"])
-            # print("LOD FORM length:", lod_form["length"])
-            lod_lev = int(lod_form["name"].decode("ascii"))
-            mnrmsh = self.iff.read_data()  # Minor MESH form
-
-            if mnrmsh["type"] == "form" and mnrmsh["name"] == b"MESH":
-                self.parse_minor_mesh_form(mnrmsh, lod_lev)
-            else:
-                print_iff_data(mnrmsh)
-
-            mjrmsh_read += 8 + lod_form["length"]  # Header and data bytes
-            # print("mjrmsh_read:", mjrmsh_read, "of", mesh_form["length"])
-
-    def parse_minor_mesh_form(self, mesh_form, lod_lev=0):
-
-        if lod_lev not in self.lods:
-            self.lods[lod_lev] = {}
-            self.lods[lod_lev]["mats"] = []
-            self.lods[lod_lev]["altmats"] = []
-            self.lods[lod_lev]["lightflags"] = []
-
-        vers_form = self.iff.read_data()
-        mesh_vers = int(vers_form["name"].decode("ascii"))
-        self.lods[lod_lev]["version"] = mesh_vers
-        mnrmsh_read = 16  # Bytes for version form header
-
-        while mnrmsh_read < mesh_form["length"]:
-            mdat = self.iff.read_data()
-
-            mnrmsh_read += 8 + mdat["length"]
-            mnrmsh_read += 1 if mdat["length"] % 2 == 1 else 0
-
-            if mdat["name"] == b"NAME":
-                self.lods[lod_lev]["name"] = (
-                    self.parse_cstr(mdat["data"], 0))
-            elif mdat["name"] == b"FACE":
-
-                # This isn't part of Wing Blender, so I'm using features
-                # from newer versions of Python 3.
-                for f in struct.iter_unpack(self.FACE_FMT, mdat["data"]):
-                    if f[2] not in self.lods[lod_lev]["mats"]:
-                        self.lods[lod_lev]["mats"].append(f[2])
-                    if f[5] not in self.lods[lod_lev]["lightflags"]:
-                        self.lods[lod_lev]["lightflags"].append(f[5])
-                    if f[6] not in self.lods[lod_lev]["altmats"]:
-                        self.lods[lod_lev]["altmats"].append(f[6])
-
-    def parse_hard_form(self, hard_form):
-        hard_read = 4
-        while hard_read < hard_form["length"]:
-            hard_chunk = self.iff.read_data()
-
-            hard_name_offset = struct.calcsize(self.HARD_FMT)
-
-            hard_read += 8 + hard_chunk["length"]
-            hard_read += 1 if hard_chunk["length"] % 2 == 1 else 0
-
-            hard_name = self.parse_cstr(hard_chunk["data"], hard_name_offset)
-            hard_xfm = struct.unpack_from(self.HARD_FMT, hard_chunk["data"])
-
-            hard_matrix = (
-                (hard_xfm[0], hard_xfm[1], hard_xfm[2]),
-                (hard_xfm[4], hard_xfm[5], hard_xfm[6]),
-                (hard_xfm[8], hard_xfm[9], hard_xfm[10])
-            )
-            hard_loc = (hard_xfm[3], hard_xfm[7], hard_xfm[11])
-            self.hardpoints.append({"rot": hard_matrix, "loc": hard_loc})
+    def parse_face_chunk(self, face_chunk, lod_lev):
+        # This isn't part of Wing Blender, so I'm using features
+        # from newer versions of Python 3.
+        for f in struct.iter_unpack(self.FACE_FMT, face_chunk["data"]):
+            if f[2] not in self.lods[lod_lev]["mats"]:
+                self.lods[lod_lev]["mats"].append(f[2])
+            if f[5] not in self.lods[lod_lev]["lightflags"]:
+                self.lods[lod_lev]["lightflags"].append(f[5])
+            if f[6] not in self.lods[lod_lev]["altmats"]:
+                self.lods[lod_lev]["altmats"].append(f[6])
+
+    def parse_hard_chunk(self, hard_chunk):
+        hard_name_offset = struct.calcsize(self.HARD_FMT)
+
+        hard_name = self.parse_cstr(hard_chunk["data"], hard_name_offset)
+        hard_xfm = struct.unpack_from(self.HARD_FMT, hard_chunk["data"])
+
+        hard_matrix = (
+            (hard_xfm[0], hard_xfm[1], hard_xfm[2]),
+            (hard_xfm[4], hard_xfm[5], hard_xfm[6]),
+            (hard_xfm[8], hard_xfm[9], hard_xfm[10])
+        )
+        hard_loc = (hard_xfm[3], hard_xfm[7], hard_xfm[11])
+        self.hardpoints.append({"rot": hard_matrix, "loc": hard_loc})
 
     def parse_far_chunk(self, far_data):
         pass
@@ -156,14 +85,59 @@ class IffMeshReader:
             offset += 1
         return cstr.decode("ascii", "ignore")
 
-    def read(self):
-        root_form = self.iff.read_data()
-        root_read = 4
+    def read_lod(self, lod_lev):
+        """Read the name and FACE chunk of a single LOD.
 
-        if root_form["name"] == b"DETA":
-            self.parse_deta_form(root_form)
-        elif root_form["name"] == b"MESH":
-            self.parse_minor_mesh_form(root_form)
+        The rest of the file is skipped."""
+        index = self.iff.build_index()
+        if index.find("DETA") is not None:
+            mesh_path = "DETA/MESH/{:04d}/MESH".format(lod_lev)
+        elif lod_lev == 0:
+            mesh_path = "MESH"
+        else:
+            return
+
+        for vers_form in index.children(mesh_path):
+            self.lods[lod_lev] = {
+                "mats": [], "altmats": [], "lightflags": [],
+                "version": int(vers_form["name"].decode("ascii"))
+            }
+            name_chunk = index.find(vers_form["path"] + "/NAME")
+            if name_chunk is not None:
+                self.lods[lod_lev]["name"] = self.parse_cstr(
+                    self.iff.read_entry(name_chunk)["data"], 0)
+            face_chunk = index.find(vers_form["path"] + "/FACE")
+            if face_chunk is not None:
+                self.parse_face_chunk(
+                    self.iff.read_entry(face_chunk), lod_lev)
+
+    def read(self):
+        lod_lev = 0
+        vers_path = None  # Path of the current mesh version form
+
+        for mdata in self.iff.walk():
+            if mdata.kind == "exit":
+                continue
+
+            parent_path, _, name = mdata.path.rpartition("/")
+            if mdata.kind == "enter" and parent_path == "DETA/MESH":
+                lod_lev = int(name)
+            elif mdata.kind == "enter" and parent_path in (
+                    "DETA/MESH/{:04d}/MESH".format(lod_lev), "MESH"):
+                vers_path = mdata.path
+                self.lods[lod_lev] = {
+                    "mats": [], "altmats": [], "lightflags": [],
+                    "version": int(name)
+                }
+            elif parent_path == vers_path and name == "NAME":
+                self.lods[lod_lev]["name"] = (
+                    self.parse_cstr(mdata.data(), 0))
+            elif parent_path == vers_path and name == "FACE":
+                self.parse_face_chunk(mdata.read(), lod_lev)
+            elif mdata.path == "DETA/HARD/HARD":
+                self.parse_hard_chunk(mdata.read())
+            elif mdata.kind == "enter" and mdata.path == "DETA/COLL":
+                mdata.skip()
 
 
 def print_iff_data(iffthing):
@@ -172,7 +146,9 @@ def print_iff_data(iffthing):
     print("name:", iffthing["name"])
     print("length:", iffthing["length"])
     print("offset:", iffthing["offset"])
-    print("data:", iffthing.get("data", "None"))
+    # The data is a memoryview when the file is memory-mapped.
+    data = iffthing.get("data")
+    print("data:", bytes(data) if data is not None else None)
 
 if __name__ == '__main__':
 
@@ -206,7 +182,10 @@ if __name__ == '__main__':
             model_data.append({"name": modelf})
 
         model_reader = IffMeshReader(modelf)
-        model_reader.read()
+        if for_lod is not None:
+            model_reader.read_lod(for_lod)
+        else:
+            model_reader.read()
 
         if out_mode == "tty":
             for lod_lev, lod_dat in model_reader.lods.items():
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# XMF to IFF compiler for Wing Blender
+# Copyright © 2013-2016 Kevin Caccamo
+# E-mail: kevin@ciinet.org
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+# -*- coding: utf8 -*-
+
+import argparse
+import re
+import struct
+from os.path import splitext
+
+
+class XMFCompiler:
+    """Compiles XMF (IFF source) text, as written by iff.IffFile.to_xmf, to a
+    binary IFF file.
+
+    The source is tokenized one line at a time, and the IFF data is written
+    straight to the output file. FORM and CHUNK lengths are patched into
+    their headers once their contents have been written."""
+
+    # Comment, string, brace, or word
+    TOKEN_RE = re.compile(r'//.*|"([^"\n]*)"|([{}])|([^\s{}"]+)')
+
+    # Struct format character for each numeric XMF data type
+    NUM_FMTS = {"long": "l", "float": "f"}
+
+    def __init__(self, xmf_file, iff_file):
+        self.xmf = xmf_file  # Text file object for the XMF source
+        self.iff = iff_file  # Seekable binary file object for the IFF
+        self.tokens = self.tokenize()
+        self.structs = {}  # (data type, count) -> struct.Struct
+
+    def tokenize(self):
+        """Generate (kind, value, line number) tuples from the XMF source.
+
+        kind is either "string", "brace", or "word"."""
+        for lineno, line in enumerate(self.xmf, 1):
+            for tkmatch in self.TOKEN_RE.finditer(line):
+                string, brace, word = tkmatch.groups()
+                if string is not None:
+                    yield "string", string, lineno
+                elif brace is not None:
+                    yield "brace", brace, lineno
+                elif word is not None:
+                    yield "word", word, lineno
+
+    def next_token(self, kind=None, value=None):
+        "Get the next token, and make sure it is of the given kind and value."
+        try:
+            token = next(self.tokens)
+        except StopIteration:
+            raise ValueError("Unexpected end of XMF source!")
+        if ((kind is not None and token[0] != kind) or
+                (value is not None and token[1] != value)):
+            raise ValueError("Line {}: Expected {}, but found {!r}!".format(
+                token[2], value or kind, token[1]))
+        return token
+
+    def write_header(self, iff_id, name=b""):
+        """Write a FORM or CHUNK header with a placeholder length.
+
+        Returns the offset of the header, for patch_length."""
+        hdr_offset = self.iff.tell()
+        self.iff.write(iff_id + b"\x00\x00\x00\x00" + name)
+        return hdr_offset
+
+    def patch_length(self, hdr_offset):
+        "Patch the length of the FORM or CHUNK at hdr_offset."
+        end_offset = self.iff.tell()
+        self.iff.seek(hdr_offset + 4)
+        self.iff.write(struct.pack(">l", end_offset - hdr_offset - 8))
+        self.iff.seek(end_offset)
+        # IFF Chunks and FORMs are aligned at even offsets
+        if (end_offset - hdr_offset) % 2 == 1:
+            self.iff.write(b"\x00")
+
+    def iff_id(self, name):
+        "Convert a FORM or CHUNK name to a 4-byte IFF ID."
+        return name.strip()[:4].upper().ljust(4).encode("ascii")
+
+    def compile(self):
+        "Compile the XMF source."
+        _, keyword, lineno = self.next_token("word")
+        if keyword == "IFF":
+            self.next_token("string")  # Output filename; ignored.
+            self.next_token("brace", "{")
+            _, keyword, lineno = self.next_token("word")
+            self.compile_form(keyword, lineno)
+            self.next_token("brace", "}")
+        else:
+            self.compile_form(keyword, lineno)
+
+    def compile_form(self, keyword, lineno):
+        "Compile a FORM, starting after the FORM keyword."
+        if keyword != "FORM":
+            raise ValueError("Line {}: Expected FORM, but found {!r}!".format(
+                lineno, keyword))
+        name = self.iff_id(self.next_token("string")[1])
+        hdr_offset = self.write_header(b"FORM", name)
+        self.next_token("brace", "{")
+
+        while True:
+            kind, keyword, lineno = self.next_token()
+            if kind == "brace" and keyword == "}":
+                break
+            elif kind == "word" and keyword == "FORM":
+                self.compile_form(keyword, lineno)
+            elif kind == "word" and keyword == "CHUNK":
+                self.compile_chunk()
+            else:
+                raise ValueError("Line {}: Expected FORM or CHUNK, but found "
+                                 "{!r}!".format(lineno, keyword))
+
+        self.patch_length(hdr_offset)
+
+    def compile_chunk(self):
+        "Compile a CHUNK, starting after the CHUNK keyword."
+        name = self.iff_id(self.next_token("string")[1])
+        hdr_offset = self.write_header(name)
+        self.next_token("brace", "{")
+
+        # Consecutive values of the same type are packed together.
+        run_type = None
+        run_values = []
+
+        while True:
+            kind, data_type, lineno = self.next_token()
+            if kind == "brace" and data_type == "}":
+                break
+            elif kind != "word" or (data_type not in self.NUM_FMTS and
+                                    data_type != "cstring"):
+                raise ValueError("Line {}: Invalid data type {!r}!".format(
+                    lineno, data_type))
+
+            if data_type != run_type:
+                self.write_run(run_type, run_values)
+                run_type = data_type
+                run_values = []
+
+            if data_type == "cstring":
+                run_values.append(self.next_token("string")[1])
+            else:
+                value = self.next_token("word")[1]
+                try:
+                    if data_type == "float":
+                        run_values.append(float(value))
+                    else:
+                        # Decimal, as to_xmf writes it, or hexadecimal
+                        # with an explicit 0x prefix.
+                        if value.lstrip("+-").lower().startswith("0x"):
+                            value = int(value, 16)
+                        else:
+                            value = int(value, 10)
+                        # Allow unsigned values, like texture numbers.
+                        if value > 0x7FFFFFFF:
+                            value -= 0x100000000
+                        run_values.append(value)
+                except ValueError:
+                    raise ValueError("Line {}: Invalid {} value {!r}!".format(
+                        lineno, data_type, value))
+
+        self.write_run(run_type, run_values)
+        self.patch_length(hdr_offset)
+
+    def write_run(self, data_type, values):
+        "Write several values of the same type."
+        if len(values) == 0:
+            return
+        if data_type == "cstring":
+            self.iff.write(b"\x00".join(
+                value.encode("ascii", "replace") for value in values) +
+                b"\x00")
+            return
+
+        run_struct = self.structs.get((data_type, len(values)))
+        if run_struct is None:
+            run_struct = struct.Struct("<{}{}".format(
+                len(values), self.NUM_FMTS[data_type]))
+            self.structs[(data_type, len(values))] = run_struct
+        try:
+            self.iff.write(run_struct.pack(*values))
+        except struct.error:
+            raise ValueError("A {} value is out of range!".format(data_type))
+
+
+if __name__ == '__main__':
+
+    argp = argparse.ArgumentParser(
+        description="Compile XMF (IFF source) to a binary IFF file.")
+
+    argp.add_argument('xmf', action='store', nargs='+', metavar='mesh.pas',
+                      help="The XMF source file(s) to compile.")
+
+    argp.add_argument('-o', '--out-file', action='store', nargs='?',
+                      metavar='FILE', dest='out_file', required=False,
+                      help="The file to write the IFF data to. Only valid "
+                      "when compiling a single file.")
+
+    args = argp.parse_args()
+
+    xmffs = getattr(args, 'xmf')
+    out_fname = getattr(args, 'out_file')
+
+    if out_fname is not None and len(xmffs) > 1:
+        argp.error("--out-file can only be used with a single XMF file.")
+
+    for xmff in xmffs:
+        iff_fname = out_fname or splitext(xmff)[0] + ".iff"
+        with open(xmff, "r") as xmf_file, open(iff_fname, "wb") as iff_file:
+            XMFCompiler(xmf_file, iff_file).compile()
+        print("{} --> {}".format(xmff, iff_fname))